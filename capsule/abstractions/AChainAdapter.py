@@ -0,0 +1,47 @@
+import abc
+import sys
+
+if sys.version_info >= (3, 4):
+    ABC = abc.ABC
+else:
+    ABC = abc.ABCMeta('ABC', (), {})
+
+
+class AChainAdapter(ABC):
+    """AChainAdapter is how a Deployer reaches a chain for the calls which differ
+    between chain families or transports. Anything else, such as simulating a tx
+    or fetching an account, goes through the Deployer's LCD client."""
+
+    @abc.abstractmethod
+    async def query_smart(self, contract_addr: str, query_msg: dict):
+        """query_smart should run a smart query on a contract
+        and return the decoded JSON result."""
+        pass
+
+    @abc.abstractmethod
+    async def code_info(self, code_id: int):
+        """code_info should return the {"code_id", "creator", "data_hash", "instantiate_permission"}
+        info of a stored code object, with data_hash as hex, without downloading its code.
+        None when there is no such code."""
+        pass
+
+    @abc.abstractmethod
+    async def code_bytes(self, code_id: int) -> bytes:
+        """code_bytes should download the wasm of a stored code object"""
+        pass
+
+    @abc.abstractmethod
+    async def broadcast_sync(self, tx):
+        """broadcast_sync should submit a signed Tx, returning
+        a SyncTxBroadcastResult once it has passed CheckTx."""
+        pass
+
+    @abc.abstractmethod
+    async def broadcast_async(self, tx):
+        """broadcast_async should submit a signed Tx, returning
+        an AsyncTxBroadcastResult as soon as the node has it."""
+        pass
+
+    async def close(self) -> None:
+        """close should release any connections the adapter holds of its own"""
+        pass
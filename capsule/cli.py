@@ -1,26 +1,36 @@
-
 import sys
 
-from capsule.cmds import AVAILABLE_COMMANDS, DeployCmd
+from capsule.cmds import AVAILABLE_COMMANDS, get_command
 from capsule.lib.logging_handler import LOG
 from capsule.parser import get_main_parser, get_subcommmand_parser
 
 
+def selected_command(argv):
+    """The name of the subcommand given on the command line, the first argument which isn't an option"""
+    return next((arg for arg in argv if not arg.startswith("-")), None)
+
+
 def main():
     """This is the main entrypoint
     for the capsule tool.
     To comment briefly on its structure:
     - A main parser is established. This becomes the main router when a user enters the `capsule` command.
     - A subparser is added to the main parser. This becomes the keeper of each command
-    - Each command is initialized with the subparser as a parent.
+    - The user-specified command is imported and initialized with the subparser as a parent.
+      Every other command is only listed by name and help so that starting capsule doesn't import them all.
     - The main parse has all of its args parsed. Doing this after the above steps ensures we have all needed args for the help menu.
     """
     main_parser = get_main_parser()
 
     sub_parser = get_subcommmand_parser(main_parser)
     LOG.debug(AVAILABLE_COMMANDS)
-    for cmd in AVAILABLE_COMMANDS:
-        cmd.__init__(cmd, sub_parser=sub_parser)
+    chosen = get_command(selected_command(sys.argv[1:]))
+    cmd = chosen.load() if chosen else None
+    for descriptor in AVAILABLE_COMMANDS:
+        if descriptor is chosen:
+            cmd.__init__(cmd, sub_parser=sub_parser)
+        else:
+            sub_parser.add_parser(descriptor.name, help=descriptor.help)
     
     try:
         # Parse the arguments
@@ -33,12 +43,5 @@ def main():
         main_parser.print_help()
         sys.exit()
 
-    # Loop the commands again searching for the user-specified command
-    for cmd in AVAILABLE_COMMANDS: 
-        # If one of the available commands is the specified one       
-        if cmd.CMD_NAME == args.cmd:
-            # Run it with the provided args
-            cmd.run_command(cmd, args)
-
-    
-        
\ No newline at end of file
+    # Run the user-specified command with the provided args
+    cmd.run_command(cmd, args)
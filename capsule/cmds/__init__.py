@@ -1,8 +1,49 @@
-from .deploy import DeployCmd
-from .execute import ExecuteCmd
-from .local import LocalCmd
-from .new import NewCmd
-from .query import QueryCmd
-from .verify import VerifyCmd
-
-AVAILABLE_COMMANDS:list = [DeployCmd, LocalCmd, QueryCmd, ExecuteCmd,VerifyCmd, NewCmd]
+"""The registry of capsule's commands.
+
+Command modules pull in terra_sdk, git and friends when imported, so the
+registry only holds a lightweight descriptor of each. A command's module is
+imported when it is chosen, see `CommandDescriptor.load`.
+"""
+import importlib
+from typing import NamedTuple
+
+
+class CommandDescriptor(NamedTuple):
+    """Everything the main parser needs to list a command without importing it"""
+    name: str
+    help: str
+    module: str
+    class_name: str
+
+    def load(self):
+        """Import the command's module
+
+        Returns:
+            ACmd: The command class
+        """
+        return getattr(importlib.import_module(self.module, __name__), self.class_name)
+
+
+AVAILABLE_COMMANDS:list = [
+    CommandDescriptor("deploy", "Deploy a wasm contract artifact to a specified Terra Chain", ".deploy", "DeployCmd"),
+    CommandDescriptor("local", "Attempt to setup a local chain instance using Git and Docker.", ".local", "LocalCmd"),
+    CommandDescriptor("query", "Attempt to perform a query on a given contract address.", ".query", "QueryCmd"),
+    CommandDescriptor("execute", "Attempt to execute an action on a given contract address.", ".execute", "ExecuteCmd"),
+    CommandDescriptor("verify", "Attempt to perform a smart contract verification against a given code id. Attempts to perform a deterministic comparison by compiling the provided contract into an optmized wasm and then comparing its checksum with the code_hash of the provided code ID code object. Note if you are running an M1 Mac or an ARM based machine you will not get perfect matches on verification as most production deployments are done from a Intel based machine.", ".verify", "VerifyCmd"),
+    CommandDescriptor("new", "Simple command to create a new cosmwasm smart contract. Unless specified, will use x", ".new", "NewCmd"),
+    CommandDescriptor("index", "Build a local index of on chain data, such as which code ids hold which wasm.", ".index", "IndexCmd"),
+    CommandDescriptor("serve", "Run a daemon which keeps warm connections to each network so query and execute respond in milliseconds.", ".serve", "ServeCmd"),
+]
+
+
+def get_command(name: str) -> CommandDescriptor:
+    """Find a command's descriptor by its name, None if there is no such command"""
+    return next((cmd for cmd in AVAILABLE_COMMANDS if cmd.name == name), None)
+
+
+def __getattr__(name):
+    # Keep `from capsule.cmds import DeployCmd` working, importing only that command
+    for cmd in AVAILABLE_COMMANDS:
+        if cmd.class_name == name:
+            return cmd.load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
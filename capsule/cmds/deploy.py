@@ -4,19 +4,136 @@ import json
 import pathlib
 import sys
 
-import requests
-from terra_sdk.client.lcd import LCDClient
-from terra_sdk.core import Coins
-
 from capsule.abstractions import ACmd
-from capsule.lib.config_handler import get_config, get_networks
-from capsule.lib.deployer import Deployer
-from capsule.lib.logging_handler import LOG
+from capsule.lib.chains import SupportedChains, chain_family
+from capsule.lib.code_registry import CodeRegistry
+from capsule.lib.config_handler import get_networks, validate_network
+from capsule.lib.logging_handler import LOG, format_table
+from capsule.lib.manifest import deploy_manifest, deploy_order, load_manifest
+from capsule.lib.session import DeploySession
+from capsule.lib.transport import AsyncTransport
 
 sys.path.append(pathlib.Path(__file__).parent.resolve())
 
 DEFAULT_TESTNET_CHAIN = "bombay-12"
 
+
+def parse_chains(chains: str) -> list:
+    """Split a comma separated list of chains, e.g `columbus-5,bombay-12`, dropping blanks and repeats"""
+    return list(dict.fromkeys(name.strip() for name in chains.split(",") if name.strip()))
+
+
+async def deploy_to_chain(chain_to_use: str, args, contracts: dict = None, code_registry: CodeRegistry = None,
+                          transport: AsyncTransport = None, result: dict = None) -> dict:
+    """Store and instantiate the package, or every contract of the manifest, on one chain
+
+    Args:
+        chain_to_use (str): The network in the config to deploy to
+        args (Namespace): The deploy command's args
+        contracts (dict, optional): The contracts of a manifest to deploy instead of the package. Defaults to None.
+        code_registry (CodeRegistry, optional): The registry of stored code to use, chains deployed to at once
+            must share one. Defaults to a new CodeRegistry unless --forcestore was passed.
+        transport (AsyncTransport, optional): A pooled transport shared with other chains. Defaults to the session's own.
+        result (dict, optional): Filled in as the deploy goes, so a failed deploy still shows how far it got. Defaults to a new dict.
+
+    Returns:
+        dict: The manifest's address map, or the package's code_id and address
+    """
+    result = {} if result is None else result
+    # Reuse the code id of an identical artifact we already stored unless told not to
+    if code_registry is None and not args.forcestore:
+        code_registry = CodeRegistry()
+    session = DeploySession(chain_to_use, code_registry=code_registry, transport=transport, close_transport=transport is None)
+    async with session as deployer:
+        if contracts is not None:
+            result.update(await deploy_manifest(deployer, contracts, upload_only=bool(args.uploadonly)))
+            return result
+        # # Attempt to store the provided package as a code object, the response will be a code ID if successful
+        result["code_id"] = args.codeid
+        if args.package and not args.codeid:
+
+            result["code_id"] = await deployer.store_contract(contract_name="test", contract_path=args.package)
+            LOG.info(f"Successfully uploaded and stored the WASM @ {args.package} to network {chain_to_use} with a resultant stored code ID of {result['code_id']}")
+        # Instantiate a contract using the stored code ID for our contract bundle
+        # and an init msg which will be different depending on the contract.
+        if not args.uploadonly:
+            result["address"] = await deployer.instantiate_contract(result["code_id"], init_msg=json.loads(args.initmsg), label=args.label if args.label else None)
+            LOG.info(f"Successfully deployed contract artifact located at {args.package} to network {chain_to_use}. Contract address of instantiated contract is {result['address']}")
+    return result
+
+
+async def deploy_to_chains(chains: list, args, contracts: dict = None) -> dict:
+    """Deploy to every chain at once, each with its own session and so its own client and fees
+
+    Args:
+        chains (list): The networks in the config to deploy to
+        args (Namespace): The deploy command's args
+        contracts (dict, optional): The contracts of a manifest to deploy instead of the package. Defaults to None.
+
+    Returns:
+        dict: (result, error) per chain, the error being None when the chain's deploy succeeded
+    """
+    # Check every chain first so a typo doesn't leave a release deployed to only some of them
+    networks = await get_networks()
+    unknown = [chain_to_use for chain_to_use in chains if chain_to_use not in networks]
+    if unknown:
+        raise ValueError(f"There is no network {', '.join(repr(name) for name in unknown)} in the config, the configured networks are: {', '.join(networks)}")
+    for chain_to_use in chains:
+        validate_network(chain_to_use, networks[chain_to_use])
+    # The deploy key is derived the Terra way, coin type 330 with terra1 addresses, which other families' chains reject
+    not_terra = [chain_to_use for chain_to_use in chains if chain_family(chain_to_use, networks[chain_to_use]) != SupportedChains.TERRA]
+    if not_terra:
+        raise ValueError(f"--chains only deploys to Terra networks as the deploy key is derived for Terra (coin type 330, terra1 addresses), "
+                         f"which can't sign for {', '.join(repr(name) for name in not_terra)}")
+
+    # One registry so chains recording their uploads at once don't overwrite each other's entries
+    code_registry = None if args.forcestore else CodeRegistry()
+    transport = AsyncTransport()
+    results = {chain_to_use: {} for chain_to_use in chains}
+    try:
+        errors = await asyncio.gather(*[
+            deploy_to_chain(chain_to_use, args, contracts, code_registry=code_registry, transport=transport, result=results[chain_to_use])
+            for chain_to_use in chains
+        ], return_exceptions=True)
+    finally:
+        await transport.close()
+    return {
+        chain_to_use: (results[chain_to_use], error if isinstance(error, BaseException) else None)
+        for chain_to_use, error in zip(chains, errors)
+    }
+
+
+def chain_outcome(result: dict, error: BaseException, manifest: bool = False) -> str:
+    """Sum up one chain's deploy as OK or FAILED with the reasons, for the results table"""
+    if error is not None:
+        return f"FAILED {error}"
+    failed = [f"{name}: {deployed['error']}" for name, deployed in result.items() if "error" in deployed] if manifest else []
+    return f"FAILED {'; '.join(failed)}" if failed else "OK"
+
+
+def chain_results_table(outcomes: dict, manifest: bool = False) -> str:
+    """Lay the outcome of a multi chain deploy out as a table, one row per chain
+
+    Args:
+        outcomes (dict): (result, error) per chain as returned by deploy_to_chains
+        manifest (bool, optional): Whether the results are the address maps of a manifest. Defaults to False.
+
+    Returns:
+        str: The table
+    """
+    if manifest:
+        rows = [
+            [chain_to_use, f"{len([deployed for deployed in result.values() if 'error' not in deployed])}/{len(result)}", chain_outcome(result, error, manifest=True)]
+            for chain_to_use, (result, error) in outcomes.items()
+        ]
+        return format_table(["CHAIN", "DEPLOYED", "RESULT"], rows)
+    rows = [
+        [chain_to_use, result.get("code_id") or "-", result.get("address") or "-", chain_outcome(result, error)]
+        for chain_to_use, (result, error) in outcomes.items()
+    ]
+    return format_table(["CHAIN", "CODE ID", "ADDRESS", "RESULT"], rows)
+
+
 class DeployCmd(ACmd):
 
     CMD_NAME = "deploy"
@@ -25,7 +142,9 @@ class DeployCmd(ACmd):
     $ capsule deploy -p ./my_contract.wasm -c columbus-5
     $ capsule deploy --path ./artifacts/my_contract.wasm --chain tequila-0004
     $ capsule deploy -p artifacts/capsule_test.wasm -i '{"count":17}' -c bombay-12
-    $ capsule deploy -p artifacts/capsule_test.wasm -u "true" -c columbus-5"""
+    $ capsule deploy -p artifacts/capsule_test.wasm -u "true" -c columbus-5
+    $ capsule deploy --manifest deploy.toml -c columbus-5
+    $ capsule deploy -p artifacts/capsule_test.wasm -m '{"count":17}' --chains columbus-5,bombay-12"""
     CMD_DESCRIPTION = "Helper tool which enables you to programatically deploy a Wasm contract artifact to a chain as a code object and instantiate it"
 
     def initialise(self):
@@ -53,6 +172,11 @@ class DeployCmd(ACmd):
                                  type=str,
                                  default="",
                                  help="(Optional) A chain to deploy too. Defaults to localterra")
+
+        self.parser.add_argument("--chains",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Comma separated chains to deploy to concurrently instead of --chain, e.g columbus-5,bombay-12. Only Terra networks are supported. Ends with a table of each chain's result")
         
         
         self.parser.add_argument("-l", "--label",
@@ -66,6 +190,15 @@ class DeployCmd(ACmd):
                                  default="",
                                  help="(Optional) Pass this when you only want to store code IDs and not instantiate also")
 
+        self.parser.add_argument("--forcestore",
+                                 action="store_true",
+                                 help="(Optional) Always upload the package, even when the same wasm is already stored on the chain")
+
+        self.parser.add_argument("--manifest",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Path to a deploy.toml manifest of many contracts to deploy. Independent contracts are deployed concurrently and the resulting address map is printed as JSON")
+
 
         
         
@@ -86,36 +219,30 @@ class DeployCmd(ACmd):
             Return success. 
         """
         LOG.info("Starting deployment from local")
-        network_info = asyncio.run(get_networks())
+        contracts = None
+        if args.manifest:
+            # Read the manifest up front so a malformed one fails before any network calls
+            contracts = load_manifest(args.manifest)
+            LOG.info(f"Deploying {len(contracts)} contracts in {len(deploy_order(contracts))} dependent steps from {args.manifest}")
+        if args.chains:
+            chains = parse_chains(args.chains)
+            LOG.info(f"Deploying to {len(chains)} chains at once: {', '.join(chains)}")
+            outcomes = asyncio.run(deploy_to_chains(chains, args, contracts))
+            if contracts is not None:
+                address_maps = {chain_to_use: {"error": str(error)} if error else result for chain_to_use, (result, error) in outcomes.items()}
+                sys.stdout.write(json.dumps(address_maps, indent=2) + "\n")
+            LOG.info("\n" + chain_results_table(outcomes, manifest=contracts is not None))
+            failed = [chain_to_use for chain_to_use, (result, error) in outcomes.items()
+                      if chain_outcome(result, error, manifest=contracts is not None) != "OK"]
+            LOG.info(f"Multi Chain Deploy Finished. {len(chains) - len(failed)} succeeded, {len(failed)} failed.")
+            if failed:
+                sys.exit(1)
+            return
         # By default, fall back to a Terra testnet network, in this case the bombay-12 network. This could be anything in theory. But its the best option at the time
         chain_to_use = args.chain or DEFAULT_TESTNET_CHAIN
- 
-        # # TODO: Review setting up a list of urls in project rather than just depending on settings in config
-        chain_url = network_info.get(chain_to_use).get("chain_url")
-        chain_fcd_url = network_info.get(chain_to_use).get("chain_fcd_url")
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
         # TODO: Validate Init_msg is wellformed json 
-
-        deployer = Deployer(client=LCDClient(
-            url=chain_url, 
-            chain_id=chain_to_use,
-            gas_prices=Coins(requests.get(f"{chain_fcd_url}/v1/txs/gas_prices").json()),
-            gas_adjustment=network_info.get(chain_to_use).get("gas_adjustment", 3)))
-        # # Attempt to store the provided package as a code object, the response will be a code ID if successful
-        if args.package and not args.codeid:
-
-            stored_code_id = asyncio.run(deployer.store_contract(contract_name="test", contract_path=args.package))
-            LOG.info(f"Successfully uploaded and stored the WASM @ {args.package} to network {args.chain} with a resultant stored code ID of {stored_code_id}")
-        # Instantiate a contract using the stored code ID for our contract bundle
-        # and an init msg which will be different depending on the contract.
-        if not args.uploadonly:
-            instantiation_result = asyncio.run(deployer.instantiate_contract(args.codeid or stored_code_id, init_msg=json.loads(args.initmsg), label=args.label if args.label else None))
-            LOG.info(f"Successfully deployed contract artifact located at {args.package}. Contract address of instantiated contract is {instantiation_result}")
-
-
-
-    
-
-        
+        result = asyncio.run(deploy_to_chain(chain_to_use, args, contracts))
+        if contracts is not None:
+            sys.stdout.write(json.dumps(result, indent=2) + "\n")
+            failures = len([deployed for deployed in result.values() if "error" in deployed])
+            LOG.info(f"Manifest Deploy Finished. {len(result) - failures} succeeded, {failures} failed.")
@@ -5,13 +5,9 @@ import os
 import pathlib
 import sys
 
-import requests
-from terra_sdk.client.lcd import LCDClient
-from terra_sdk.core import Coins
-
 from capsule.abstractions import ACmd
-from capsule.lib.config_handler import get_networks
-from capsule.lib.deployer import Deployer
+from capsule.lib.batching import DEFAULT_MAX_MSGS_PER_TX, read_batch_file
+from capsule.lib.daemon_client import forward_to_daemon
 from capsule.lib.logging_handler import LOG
 
 sys.path.append(pathlib.Path(__file__).parent.resolve())
@@ -29,7 +25,9 @@ class ExecuteCmd(ACmd):
     CMD_NAME = "execute"
     CMD_HELP = "Attempt to execute an action on a given contract address."
     CMD_USAGE = """
-    $ capsule execute --contract <addr> --chain <chain> --msg <msg>"""
+    $ capsule execute --contract <addr> --chain <chain> --msg <msg>
+    $ capsule execute --batch msgs.jsonl --chain <chain>
+    $ capsule execute --batch msgs.jsonl --lanes 8 --fund 1000000uluna --chain <chain>"""
     CMD_DESCRIPTION = "Helper tool which exposes the ability to prepare and sending ExecuteMsg's on chain specific contract addresses"
 
     def initialise(self):
@@ -53,32 +51,79 @@ class ExecuteCmd(ACmd):
                                  default="",
                                  help="(Optional) A chain to deploy too. Defaults to localterra")
 
+        self.parser.add_argument("-b", "--batch",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Path to a .jsonl file with one {\"address\": ..., \"msg\": ..., \"coins\": ...} per line. The msgs are packed into as few txs as possible")
+
+        self.parser.add_argument("--maxmsgs",
+                                 type=int,
+                                 default=DEFAULT_MAX_MSGS_PER_TX,
+                                 help="(Optional) The max number of msgs to pack into a single tx when using --batch")
+
+        self.parser.add_argument("--lanes",
+                                 type=int,
+                                 default=0,
+                                 help="(Optional) Spread --batch executions round-robin over this many sub-accounts derived from the mnemonic. Defaults to 0, only the main account")
+
+        self.parser.add_argument("--fund",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Top every lane up to this balance from the main account before executing, e.g 1000000uluna")
+
+        self.parser.add_argument("--nodaemon",
+                                 action='store_true',
+                                 help="(Optional) Sign and send the execution here even when a `capsule serve` daemon is running")
+
     def run_command(self, args):
         """
             
         """
-        LOG.info(f"Performing msg exectution on contract addr {args.address}")
-        network_info = asyncio.run(get_networks())
+        executions = None
+        if args.batch:
+            LOG.info(f"Performing batched msg execution from {args.batch}")
+            # Read the batch up front so a malformed file fails before any network calls
+            executions = read_batch_file(args.batch)
+        else:
+            LOG.info(f"Performing msg exectution on contract addr {args.address}")
         # By default, fall back to a Terra testnet network, in this case the bombay-12 network. This could be anything in theory. But its the best option at the time
         chain_to_use = args.chain or DEFAULT_TESTNET_CHAIN
- 
-        # # TODO: Review setting up a list of urls in project rather than just depending on settings in config
-        chain_url = network_info.get(chain_to_use).get("chain_url")
-        chain_fcd_url = network_info.get(chain_to_use).get("chain_fcd_url")
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        if not (args.batch or args.nodaemon):
+            served, exe_result = forward_to_daemon("execute", chain=chain_to_use, address=args.address, msg=json.loads(args.msg))
+            if served:
+                LOG.info(f"Execute Result {exe_result} \n\n Execute Finished.")
+                return
+
+        # The SDK is only imported once it's clear no daemon is serving the execution
+        from capsule.lib.session import DeploySession
+
         # TODO: Validate Init_msg is wellformed json 
+        asyncio.run(execute_in_session(DeploySession(chain_to_use), args, executions))
 
-        deployer = Deployer(client=LCDClient(
-            url=chain_url, 
-            chain_id=chain_to_use,
-            gas_prices=Coins(requests.get(f"{chain_fcd_url}/v1/txs/gas_prices").json())))
 
-        exe_result = asyncio.run(deployer.execute_contract(args.address, json.loads(args.msg)))
-        LOG.info(f"Execute Result {exe_result} \n\n Execute Finished.")
-        
+async def execute_in_session(session, args, executions: list = None) -> None:
+    """Run the execution, or batch of executions, of the args within a DeploySession"""
+    async with session as deployer:
+        if executions is not None:
+            batch_results = await run_batch(deployer, executions, args)
+            for result in batch_results:
+                LOG.info(json.dumps(result))
+            failures = len([result for result in batch_results if not result["success"]])
+            LOG.info(f"Batch Execute Finished. {len(batch_results) - failures} succeeded, {failures} failed.")
+            return
 
+        exe_result = await deployer.execute_contract(args.address, json.loads(args.msg))
+        LOG.info(f"Execute Result {exe_result} \n\n Execute Finished.")
 
 
-   
\ No newline at end of file
+async def run_batch(deployer, executions, args):
+    """Run a batch on the main account, or over a pool of lanes when --lanes is set"""
+    if not args.lanes:
+        return await deployer.execute_batch(executions, max_msgs_per_tx=args.maxmsgs)
+    # Imported here as it pulls in the SDK, see ExecuteCmd.run_command
+    from capsule.lib.wallet_pool import WalletPool
+    pool = WalletPool(deployer, lanes=args.lanes)
+    if args.fund:
+        await pool.fund(args.fund)
+    return await pool.execute_batch(executions, max_msgs_per_tx=args.maxmsgs)
@@ -0,0 +1,66 @@
+"""Index command -- Used to build local indexes of on chain data"""
+import asyncio
+import pathlib
+import sys
+
+from capsule.abstractions import ACmd
+from capsule.lib.code_index import DEFAULT_CRAWL_PAGE_SIZE, CodeIndex
+from capsule.lib.logging_handler import LOG
+from capsule.lib.session import DeploySession
+
+sys.path.append(pathlib.Path(__file__).parent.resolve())
+
+DEFAULT_TESTNET_CHAIN = "bombay-12"
+
+
+async def crawl_in_session(session: DeploySession, index: CodeIndex, page_size: int) -> int:
+    """Crawl the session's chain into the index"""
+    async with session as deployer:
+        return await index.crawl(deployer, page_size=page_size)
+
+
+class IndexCmd(ACmd):
+    """
+        Index command -- Used to build local indexes of on chain data
+    """
+
+    CMD_NAME = "index"
+    CMD_HELP = "Build a local index of on chain data, such as which code ids hold which wasm."
+    CMD_USAGE = """
+    $ capsule index codes --chain columbus-5"""
+    CMD_DESCRIPTION = "Helper tool which crawls the code infos of a chain into a local SQLite index at ~/.capsule/code_index.sqlite. Each run carries on from the last code id it saw. Once indexed, `capsule verify --find artifact.wasm` tells you which code ids hold a wasm without touching the network"
+
+    def initialise(self):
+        # Define usage and description
+        self.parser.usage = self.CMD_USAGE
+        self.parser.description = self.CMD_DESCRIPTION
+
+        # Add any positional or optional arguments here
+        self.parser.add_argument("target",
+                                 choices=["codes"],
+                                 help="What to index")
+
+        self.parser.add_argument("-c", "--chain",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) The chain to index. Defaults to bombay-12")
+
+        self.parser.add_argument("--pagesize",
+                                 type=int,
+                                 default=DEFAULT_CRAWL_PAGE_SIZE,
+                                 help="(Optional) How many code infos to request at a time")
+
+    def run_command(self, args):
+        """
+            Crawl every code info stored since the last run into the local index
+        """
+        chain_to_use = args.chain or DEFAULT_TESTNET_CHAIN
+        # Indexing never sends a tx so only use gas prices we already have locally
+        session = DeploySession(chain_to_use, cached_gas_prices=True)
+
+        index = CodeIndex()
+        try:
+            indexed = asyncio.run(crawl_in_session(session, index, args.pagesize))
+            LOG.info(f"Index Finished. Indexed {indexed} new codes, {chain_to_use} is indexed up to code ID {index.last_code_id(chain_to_use)}")
+        finally:
+            index.close()
@@ -5,13 +5,9 @@ import os
 import pathlib
 import sys
 
-import requests
-from terra_sdk.client.lcd import LCDClient
-from terra_sdk.core import Coins
-
 from capsule.abstractions import ACmd
-from capsule.lib.config_handler import get_networks
-from capsule.lib.deployer import Deployer
+from capsule.lib.batching import fan_out, read_batch_file
+from capsule.lib.daemon_client import forward_to_daemon
 from capsule.lib.logging_handler import LOG
 
 sys.path.append(pathlib.Path(__file__).parent.resolve())
@@ -20,6 +16,50 @@ DEFAULT_TESTNET_CHAIN = "bombay-12"
 DEFAULT_CLONE_PATH = os.path.expanduser(
     os.path.join("~", ".capsule", "localterra-clones"))
 DEFAULT_TESTNET_CHAIN = "bombay-12"
+# Number of batch queries in flight at once when --concurrency is not given
+DEFAULT_BATCH_CONCURRENCY = 16
+
+
+async def stream_batch_queries(deployer: "Deployer", queries: list, concurrency: int, ordered: bool = False) -> int:
+    """Fan a batch of queries out over the deployer's shared client,
+    writing one NDJSON line per query to stdout as results arrive
+
+    Args:
+        deployer (Deployer): The deployer whose client performs the queries
+        queries (list): dicts of the form {"address": str, "query": dict}
+        concurrency (int): Max queries in flight at once
+        ordered (bool, optional): Write results in input order instead of completion order. Defaults to False.
+
+    Returns:
+        int: The number of queries which failed
+    """
+    failures = 0
+
+    async def run_query(entry):
+        return await deployer.query_contract(entry["address"], entry["query"])
+
+    async for index, result, error in fan_out(queries, run_query, concurrency, ordered=ordered):
+        line = {"index": index, "address": queries[index]["address"]}
+        if error is None:
+            line["result"] = result
+        else:
+            failures += 1
+            line["error"] = str(error)
+        sys.stdout.write(json.dumps(line) + "\n")
+        sys.stdout.flush()
+    return failures
+
+
+async def query_in_session(session, args, queries: list = None) -> None:
+    """Run the query, or batch of queries, of the args within a DeploySession"""
+    async with session as deployer:
+        if queries is not None:
+            failures = await stream_batch_queries(deployer, queries, args.concurrency, ordered=args.ordered)
+            LOG.info(f"Batch Query Finished. {len(queries) - failures} succeeded, {failures} failed.")
+            return
+
+        query_result = await deployer.query_contract(args.address, json.loads(args.query))
+        LOG.info(f"Query Result {query_result} \n\n Query Finished.")
 
 
 class QueryCmd(ACmd):
@@ -30,7 +70,8 @@ class QueryCmd(ACmd):
     CMD_NAME = "query"
     CMD_HELP = "Attempt to perform a query on a given contract address."
     CMD_USAGE = """
-    $ capsule query --contract <addr> --chain=<> --query=<query>"""
+    $ capsule query --contract <addr> --chain=<> --query=<query>
+    $ capsule query --batch queries.jsonl --concurrency 32 --chain=<>"""
     CMD_DESCRIPTION = "Helper tool which exposes the ability to perform queries on chain specific contract addresses"
 
     def initialise(self):
@@ -54,31 +95,63 @@ class QueryCmd(ACmd):
                                  default="",
                                  help="(Optional) A chain to deploy too. Defaults to localterra")
 
+        self.parser.add_argument("--max-staleness",
+                                 type=float,
+                                 default=None,
+                                 help="(Optional) Let a `capsule serve` daemon answer from its cache of queries at the latest block height, trusting the height it last saw for this many seconds. 0 still asks the chain for its height before every query, so a hit only saves the query itself. Within a --batch, identical queries are cached the same way. Caching is off unless this is passed")
+
+        self.parser.add_argument("-b", "--batch",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Path to a .jsonl file with one {\"address\": ..., \"query\": ...} per line. Results are streamed to stdout as NDJSON")
+
+        self.parser.add_argument("--concurrency",
+                                 type=int,
+                                 default=DEFAULT_BATCH_CONCURRENCY,
+                                 help="(Optional) The max number of batch queries in flight at once")
+
+        self.parser.add_argument("--ordered",
+                                 action='store_true',
+                                 help="(Optional) Stream batch results in the order of the batch file rather than as they complete")
+
+        self.parser.add_argument("--nodaemon",
+                                 action='store_true',
+                                 help="(Optional) Run the query here even when a `capsule serve` daemon is running")
+
     def run_command(self, args):
         """
             
         """
-        LOG.info(f"Performing query on contract addr {args.address}")
-        network_info = asyncio.run(get_networks())
+        queries = None
+        if args.batch:
+            LOG.info(f"Performing batched queries from {args.batch}")
+            # Read the batch up front so a malformed file fails before any network calls
+            queries = read_batch_file(args.batch, required_keys=("address", "query"))
+        else:
+            LOG.info(f"Performing query on contract addr {args.address}")
         # By default, fall back to a Terra testnet network, in this case the bombay-12 network. This could be anything in theory. But its the best option at the time
         chain_to_use = args.chain or DEFAULT_TESTNET_CHAIN
- 
-        # # TODO: Review setting up a list of urls in project rather than just depending on settings in config
-        chain_url = network_info.get(chain_to_use).get("chain_url")
-        chain_fcd_url = network_info.get(chain_to_use).get("chain_fcd_url")
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        # TODO: Validate Init_msg is wellformed json 
-
-        deployer = Deployer(client=LCDClient(
-            url=chain_url, 
-            chain_id=chain_to_use,
-            gas_prices=Coins(requests.get(f"{chain_fcd_url}/v1/txs/gas_prices").json())))
-        query_result = asyncio.run(deployer.query_contract(args.address, json.loads(args.query)))
-        LOG.info(f"Query Result {query_result} \n\n Query Finished.")
-        
+        if not (args.batch or args.nodaemon):
+            # Only a long lived daemon has a cache worth asking for, so the bound goes along with the query
+            staleness = {} if args.max_staleness is None else {"max_staleness": args.max_staleness}
+            served, query_result = forward_to_daemon("query", chain=chain_to_use, address=args.address, query=json.loads(args.query), **staleness)
+            if served:
+                LOG.info(f"Query Result {query_result} \n\n Query Finished.")
+                return
 
+        # The SDK is only imported once it's clear no daemon is serving the query
+        from capsule.lib.query_cache import QueryCache
+        from capsule.lib.session import DeploySession
+        from capsule.lib.transport import AsyncTransport
 
-
-   
\ No newline at end of file
+        # TODO: Validate Init_msg is wellformed json 
+        session = DeploySession(
+            chain_to_use,
+            # Queries never send a tx so only use gas prices we already have locally
+            cached_gas_prices=True,
+            # A single query run here can never hit a cache, only a batch repeating queries can
+            query_cache=QueryCache(max_staleness=args.max_staleness) if args.batch and args.max_staleness is not None else None,
+            # Let every concurrent batch query have its own pooled connection to the LCD
+            transport=AsyncTransport(limit_per_host=args.concurrency))
+        asyncio.run(query_in_session(session, args, queries))
@@ -0,0 +1,63 @@
+"""Serve command -- Used to run a long lived daemon which other commands forward to"""
+import asyncio
+import pathlib
+import sys
+
+from capsule.abstractions import ACmd
+from capsule.lib.daemon import CapsuleDaemon
+from capsule.lib.daemon_client import DaemonClient, DaemonUnavailable
+from capsule.lib.logging_handler import LOG
+
+sys.path.append(pathlib.Path(__file__).parent.resolve())
+
+
+class ServeCmd(ACmd):
+    """
+        Serve command -- Used to run a long lived daemon which other commands forward to
+    """
+
+    CMD_NAME = "serve"
+    CMD_HELP = "Run a daemon which keeps warm connections to each network so query and execute respond in milliseconds."
+    CMD_USAGE = """
+    $ capsule serve
+    $ capsule serve --status
+    $ capsule serve --stop"""
+    CMD_DESCRIPTION = "Helper tool which runs capsule as a daemon listening on a Unix socket at ~/.capsule/capsule.sock. While it runs, `capsule query` and `capsule execute` hand their work to it instead of starting from scratch, as long as they use the same config and mnemonic. Batches and --lanes always run in the command itself, as does anything passed --nodaemon. A query with --max-staleness N may be answered from the daemon's cache of queries at the latest block height, trusting the height it last saw for N seconds"
+
+    def initialise(self):
+        # Define usage and description
+        self.parser.usage = self.CMD_USAGE
+        self.parser.description = self.CMD_DESCRIPTION
+
+        # Add any positional or optional arguments here
+        self.parser.add_argument("--socket",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) The Unix socket to listen on. Defaults to ~/.capsule/capsule.sock or $CAPSULE_SOCKET_FILE")
+
+        self.parser.add_argument("--status",
+                                 action='store_true',
+                                 help="(Optional) Report whether a daemon is running and which networks it has warmed up")
+
+        self.parser.add_argument("--stop",
+                                 action='store_true',
+                                 help="(Optional) Stop the running daemon")
+
+    def run_command(self, args):
+        """
+            Serve until stopped, or report on or stop a running daemon
+        """
+        if args.status or args.stop:
+            client = DaemonClient(args.socket or None)
+            try:
+                if args.stop:
+                    client.call("shutdown")
+                    LOG.info(f"Stopped the daemon on {client.socket_path}")
+                else:
+                    status = client.call("ping")
+                    LOG.info(f"Daemon {status['pid']} is serving on {client.socket_path}, warm networks: {', '.join(status['chains']) or 'none yet'}")
+            except DaemonUnavailable:
+                LOG.info(f"No daemon is running on {client.socket_path}")
+            return
+
+        asyncio.run(CapsuleDaemon(args.socket or None).serve())
@@ -1,38 +1,50 @@
 import asyncio
-import base64
 import code
-import hashlib
 import json
 import os
 import pathlib
-import platform
-import subprocess
 import sys
 from email.mime import base
 
-import requests
-from terra_sdk.client.lcd import LCDClient
-from terra_sdk.core import Coins
-
 from capsule.abstractions import ACmd
-from capsule.lib.config_handler import get_config
-from capsule.lib.deployer import Deployer
-from capsule.lib.logging_handler import LOG
+from capsule.lib.artifacts import prepare_wasm
+from capsule.lib.builder import optimized_build
+from capsule.lib.bytecode_cache import BytecodeCache
+from capsule.lib.code_index import CodeIndex
+from capsule.lib.logging_handler import LOG, format_table
+from capsule.lib.session import DeploySession
+from capsule.lib.verification import (parse_code_ids, read_checksums,
+                                      verify_code_ids)
 
 sys.path.append(pathlib.Path(__file__).parent.resolve())
 
 DEFAULT_TESTNET_CHAIN = "bombay-12"
-# TODO: This enum is also in deployer, move to one place 
-import enum
-from enum import auto 
-class SupportedChains(enum.Enum):
-   TERRA = auto()
-   JUNO = auto()
-   OSMOSIS = auto()
-
-# TODO: IS there a better way to handle theres network names ? Probably
-IS_TERRA = lambda network: network in ["columbus-5", "bombay-12"]
-IS_JUNO = lambda network: network in ["juno", "uni"]
+
+
+async def verify_in_session(session: DeploySession, code_ids: list, checksums: dict) -> list:
+    """Verify the code ids against the checksums on the session's chain"""
+    async with session as deployer:
+        return await verify_code_ids(deployer, code_ids, checksums)
+
+
+def find_in_index(artifact_path: str, chain_id: str) -> list:
+    """Look an artifact up in the local code index of a chain, logging the code ids holding it"""
+    checksum = prepare_wasm(artifact_path, compress=False).checksum
+    index = CodeIndex()
+    try:
+        if not index.last_code_id(chain_id):
+            LOG.info(f"No codes of {chain_id} have been indexed yet, run `capsule index codes --chain {chain_id}` first")
+            return []
+        code_ids = index.find(chain_id, checksum)
+        if code_ids:
+            LOG.info(f"[Find]: {artifact_path} ({checksum}) is stored on {chain_id} as code IDs {', '.join(str(code_id) for code_id in code_ids)}")
+        else:
+            LOG.info(f"[Find]: {artifact_path} ({checksum}) is not stored on {chain_id} as of code ID {index.last_code_id(chain_id)}")
+        return code_ids
+    finally:
+        index.close()
+
+
 class VerifyCmd(ACmd):
 
     CMD_NAME = "verify"
@@ -40,7 +52,9 @@ class VerifyCmd(ACmd):
     CMD_USAGE = """
     $ capsule verify -p ./<path_to_my_contracts_root> -c columbus-5 -i 3
     $ capsule verify --path ./<path_to_my_contracts_root> --chain tequila-0004
-    $ capsule verify -p <path_to_my_contracts_root> -c bombay-12 -i 300"""
+    $ capsule verify -p <path_to_my_contracts_root> -c bombay-12 -i 300
+    $ capsule verify -p <path_to_my_workspace_root> -c columbus-5 --codeids 12,15,88-95 --nobuild
+    $ capsule verify --find artifacts/my_contract.wasm -c columbus-5"""
     CMD_DESCRIPTION = "Helper tool which enables you to perform a Smart Contract Verification (SCV) by providing the path to a single smart-contract repo and providing a code id. The project path is passed either to `cargo run-script optimize` or to a custom docker invocation for ARM64 to create an optmized production wasm of the contract for comparison. The code id is used to query a stored code object's byte_code on the respective chain. Once the byte_code is gathered we get the SHA256 of this to compare to our locally prepared optimized wasm. If the SHA265 of on chain code object matches the SHA256 checksum on the optimized build we have verified the contact. Note: The outputted SHA256 and locally build optimized build will be different on ARM vs Intel. An ARM machine can only really be used to verify images which were built and uploaded from an ARM machine"
 
     def initialise(self):
@@ -59,6 +73,11 @@ class VerifyCmd(ACmd):
                                  default=0,
                                  help="The code_id to compare the provided contract against")
 
+        self.parser.add_argument("--codeids",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Many code ids to verify at once against the workspace's artifacts, e.g 12,15,88-95")
+
         self.parser.add_argument("-c", "--chain",
                                  type=str,
                                  default="",
@@ -68,6 +87,28 @@ class VerifyCmd(ACmd):
                                  action='store_true',
                                  help="(Optional) Skip the building and go right to comparing the onchain code with your own. This assumes you already ran an optimized build and saves you rebuilding each time you run verify command")
 
+        self.parser.add_argument("--rebuild",
+                                 action='store_true',
+                                 help="(Optional) Run the optimizer even when the sources haven't changed since a previous build whose artifacts could be reused")
+
+        self.parser.add_argument("--parallel",
+                                 action='store_true',
+                                 help="(Optional) Build each contract of a workspace in its own optimizer run, several at once, rather than in one workspace optimizer run. Uses the rust-optimizer of the workspace optimizer's version")
+
+        self.parser.add_argument("-j", "--jobs",
+                                 type=int,
+                                 default=0,
+                                 help="(Optional) With --parallel, how many contracts of a workspace to build at once. Defaults to as many as the machine's cores and memory allow")
+
+        self.parser.add_argument("--find",
+                                 type=str,
+                                 default="",
+                                 help="(Optional) Path to a wasm artifact. Lists the code ids on the chain holding exactly this wasm, using the index built by `capsule index codes`")
+
+        self.parser.add_argument("--nocache",
+                                 action='store_true',
+                                 help="(Optional) Always download the code objects rather than using ones cached in ~/.capsule/cache/bytecode, e.g after resetting a local chain")
+
 
         
         
@@ -80,6 +121,7 @@ class VerifyCmd(ACmd):
             Prepare defaults for the above
 
             Prepare an optimized build using the appropiate technique 
+            unless the sources are unchanged since a cached build, in which case its artifacts are reused
             If nobuild is provided; skip above and go right to the checksums.txt
 
             Query the byte_code from the lcd client 
@@ -88,94 +130,47 @@ class VerifyCmd(ACmd):
 
             Return success. 
         """
+        if args.find:
+            find_in_index(args.find, args.chain or DEFAULT_TESTNET_CHAIN)
+            return
         LOG.info("Starting verification")
+        # Parse the code ids up front so a malformed list fails before any building
+        code_ids = parse_code_ids(args.codeids) if args.codeids else [args.codeid]
         # Setup the Deployer with its lcd, fcd urls as well as the desired chain.
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        config = asyncio.run(get_config())
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        # config = asyncio.run(get_config())
-        # # TODO: Review setting up a list of urls in project rather than just depending on settings in config
-        chain_url = config.get("networks", {}).get(args.chain, DEFAULT_TESTNET_CHAIN).get("chain_url")
-        chain_fcd_url = config.get("networks", {}).get(args.chain, DEFAULT_TESTNET_CHAIN).get("chain_fcd_url")
-
-        # TODO: Validate Init_msg is wellformed json 
-        chain_to_use = args.chain or "bombay-12"
-        
-        deployer = Deployer(client=LCDClient(
-            url=chain_url, 
-            chain_id=chain_to_use,
-            gas_prices=Coins(requests.get(f"{chain_fcd_url}/v1/txs/gas_prices").json())))
-    
-
+        chain_to_use = args.chain or DEFAULT_TESTNET_CHAIN
+        session = DeploySession(
+            chain_to_use,
+            # Verification never sends a tx so only use gas prices we already have locally
+            cached_gas_prices=True,
+            # Stored code never changes so it only needs downloading once
+            bytecode_cache=None if args.nocache else BytecodeCache())
 
         contract_dir = os.path.abspath(args.package)
-        print(contract_dir)
-        # TODO: Refactor into a neater function 
-        if not args.nobuild: 
-            if platform.uname()[4] == "arm64":
-                try:
-                    # process = subprocess.run(['docker', 'run', '--rm', '-v', '"$(pwd)":/code',
-                    # '--mount', 'type=volume,source="$(basename "$(pwd)")_cache",target=/code/target',
-                    # '--mount', 'type=volume,source=registry_cache,target=/usr/local/cargo/registry',
-                    # 'cosmwasm/rust-optimizer-arm64:0.12.4'], cwd=contract_dir, check=True, stdout=subprocess.PIPE, universal_newlines=True)
-
-                    process = subprocess.run('docker run --rm -v "$(pwd)":/code \
-                            --mount type=volume,source="$(basename "$(pwd)")_cache",target=/code/target \
-                            --mount type=volume,source=registry_cache,target=/usr/local/cargo/registry \
-                            cosmwasm/workspace-optimizer-arm64:0.12.5', cwd=contract_dir, shell=True, check=True, stdout=subprocess.PIPE, universal_newlines=True)
-
-                    LOG.info(process.stdout)
-
-                except subprocess.CalledProcessError as grepexc:                                                                                                   
-                    LOG.info("error code", grepexc.returncode, grepexc.output)
+        LOG.info(f"Verifying the contracts of {contract_dir}")
+        built = args.nobuild or optimized_build(contract_dir, rebuild=args.rebuild, parallel=args.parallel, jobs=args.jobs)
+        if not built:
+            # Comparing against stale or missing artifacts would report a misleading result
+            LOG.info("[Verification]: Failed. The optimized build of the contracts failed, see its output above")
+            sys.exit(1)
+
+        # Index the checksums once so every code id is a single lookup
+        checksums = read_checksums(os.path.join(contract_dir, "artifacts", "checksums.txt"))
+        results = asyncio.run(verify_in_session(session, code_ids, checksums))
+
+        rows = []
+        for result in results:
+            if result["error"]:
+                outcome = f"ERROR {result['error']}"
+            elif result["artifacts"]:
+                outcome = f"MATCH {', '.join(result['artifacts'])}"
             else:
-                try:
-                    process = subprocess.run(['cargo','run-script','optimize'], cwd=contract_dir, check=True, stdout=subprocess.PIPE, universal_newlines=True)
-
-                    LOG.info(process.stdout)
-                except subprocess.CalledProcessError as grepexc:                                                                                                   
-                    LOG.info("error code", grepexc.returncode, grepexc.output)
-
-        # By Default the target chain is terra 
-        target_chain = SupportedChains.TERRA
-        if IS_JUNO(args.chain):
-            target_chain = SupportedChains.JUNO
-
-        code_byte_code = asyncio.run(deployer.query_code_bytecode(chain_url, args.codeid, target_chain=target_chain))
-
-        # Handle the code_byte_code and get a sha 
-        on_chain = hashlib.sha256()
-        on_chain.update(base64.b64decode(code_byte_code['byte_code']))
-        # LOG.info(on_chain.digest())
-        # LOG.info(base64.b16encode(on_chain.digest()))
-        on_chain_code_sha = base64.b16encode(on_chain.digest())
-        # Get the hash from artifacts 
-        # TODO: Make less POC and more MVP, what if there are multiple checksums 
-        with open(contract_dir+"/artifacts/checksums.txt", "r") as file:
-            LOG.info(f"[SHA265 of code with id {args.codeid}] {on_chain_code_sha.lower()}")
-            # Simple flag to see if we found a match at all 
-            found = False
-            for line in file:
-                sha_to_compare = line.split("  ")[0].encode()
-                contract_name = line.split("  ")[1].encode()
-                LOG.debug(f"[SHA265 of code found in artifacts directory with name {contract_name}] {sha_to_compare}")
-
-                if sha_to_compare == on_chain_code_sha.lower():
-                    LOG.info("[Verification]: Success. The provided contract wasm matches the provided code ID's byte_code hash")
-                    found = True
-            
-            if not found:
-                LOG.info("[Verification]: Failed. The provided contract wasm does not match the provided code ID's byte_code hash")
-            LOG.info("[Verification]: Command run finished")
-
-        
-
-
-
-
-    
-
-        
+                outcome = "MISMATCH"
+            rows.append([result["code_id"], result["checksum"] or "-", outcome])
+        LOG.info("\n" + format_table(["CODE ID", "SHA256", "RESULT"], rows))
+
+        matched = len([result for result in results if result["artifacts"]])
+        if matched == len(results):
+            LOG.info("[Verification]: Success. Every code ID's byte_code hash matches one of the provided contract wasms")
+        else:
+            LOG.info(f"[Verification]: Failed. {len(results) - matched} of {len(results)} code IDs do not match any of the provided contract wasms")
+        LOG.info("[Verification]: Command run finished")
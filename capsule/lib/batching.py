@@ -0,0 +1,150 @@
+"""Helpers for packing many messages into as few transactions as possible
+and for fanning many independent requests out concurrently"""
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+
+from capsule.lib.logging_handler import LOG
+
+# Upper bound on the number of messages placed in a single tx
+DEFAULT_MAX_MSGS_PER_TX = 50
+# Tendermint's default mempool max-tx-bytes is 1MB, leave room for signatures and auth info
+DEFAULT_MAX_TX_BYTES = 800000
+# Upper bound on the simulated gas a single tx may consume before it is split
+DEFAULT_MAX_GAS_PER_TX = 10000000
+
+
+def msg_size(msg) -> int:
+    """Return the encoded size in bytes of a msg
+    as it would appear inside a tx body
+
+    Args:
+        msg (terra_sdk.core.msg.Msg): The msg to measure
+
+    Returns:
+        int: The size of the msg packed as a protobuf Any
+    """
+    return len(bytes(msg.pack_any()))
+
+
+def pack_msgs(msgs: list,
+              max_msgs: int = DEFAULT_MAX_MSGS_PER_TX,
+              max_bytes: int = DEFAULT_MAX_TX_BYTES,
+              size_of: Callable = msg_size) -> List[list]:
+    """Greedily pack msgs, in order, into chunks where each chunk
+    holds no more than max_msgs messages and max_bytes encoded bytes.
+    A single msg larger than max_bytes is given a chunk of its own
+    and left for the node to accept or reject.
+
+    Args:
+        msgs (list): The msgs to pack
+        max_msgs (int, optional): Max msgs per chunk. Defaults to DEFAULT_MAX_MSGS_PER_TX.
+        max_bytes (int, optional): Max encoded bytes per chunk. Defaults to DEFAULT_MAX_TX_BYTES.
+        size_of (Callable, optional): Function returning the size of a msg. Defaults to msg_size.
+
+    Returns:
+        List[list]: The chunks, each of which becomes one tx
+    """
+    chunks = []
+    chunk = []
+    chunk_bytes = 0
+    for msg in msgs:
+        size = size_of(msg)
+        if chunk and (len(chunk) >= max_msgs or chunk_bytes + size > max_bytes):
+            chunks.append(chunk)
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(msg)
+        chunk_bytes += size
+    if chunk:
+        chunks.append(chunk)
+    LOG.debug(f"Packed {len(msgs)} msgs into {len(chunks)} chunks")
+    return chunks
+
+
+def map_msg_results(tx_result, msg_count: int, offset: int = 0) -> List[dict]:
+    """Map a multi-msg tx result back out into one result per msg using the tx logs.
+    A failed tx is atomic so every msg in it is reported with the tx error.
+
+    Args:
+        tx_result (BlockTxBroadcastResult | TxInfo): The result of broadcasting the tx
+        msg_count (int): The number of msgs which were in the tx
+        offset (int, optional): The position of the tx's first msg within the whole batch. Defaults to 0.
+
+    Returns:
+        List[dict]: One result dict per msg in the order they were sent
+    """
+    failed = bool(getattr(tx_result, "code", None))
+    logs = getattr(tx_result, "logs", None) or []
+    results = []
+    for msg_index in range(msg_count):
+        result = {
+            "index": offset + msg_index,
+            "txhash": tx_result.txhash,
+            "height": getattr(tx_result, "height", None),
+            "success": not failed,
+        }
+        if failed:
+            result["error"] = getattr(tx_result, "raw_log", None)
+        elif msg_index < len(logs):
+            result["events"] = logs[msg_index].events_by_type
+        results.append(result)
+    return results
+
+
+def read_batch_file(path: str, required_keys: Tuple[str, ...] = ("address", "msg")) -> List[dict]:
+    """Read a JSON lines batch file, one JSON object per line.
+    An execute batch looks like `{"address": "<contract>", "msg": {...}, "coins": "100uluna"}` per line,
+    coins being optional, while a query batch uses `{"address": "<contract>", "query": {...}}`.
+
+    Args:
+        path (str): The path to the .jsonl file
+        required_keys (Tuple[str, ...], optional): Keys every line must have. Defaults to ("address", "msg").
+
+    Returns:
+        List[dict]: The parsed lines, blank lines are skipped
+    """
+    entries = []
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            missing = [key for key in required_keys if entry.get(key) in (None, "")]
+            if missing:
+                raise ValueError(f"Line {line_number} of {path} is missing {', '.join(missing)}")
+            entries.append(entry)
+    return entries
+
+
+async def fan_out(items: list, worker: Callable[..., Awaitable], concurrency: int,
+                  ordered: bool = False) -> AsyncIterator[Tuple[int, object, Exception]]:
+    """Run worker over every item with at most `concurrency` running at once,
+    yielding results as they finish or, when ordered, in the order of items.
+    A failing item yields its exception rather than stopping the others.
+
+    Args:
+        items (list): The items to process
+        worker (Callable[..., Awaitable]): Coroutine function called with each item
+        concurrency (int): Max number of workers in flight
+        ordered (bool, optional): Yield in input order instead of completion order. Defaults to False.
+
+    Yields:
+        Tuple[int, object, Exception]: The item's index, its result and its exception, one of which is None
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, item):
+        async with semaphore:
+            try:
+                return index, await worker(item), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_result in (tasks if ordered else asyncio.as_completed(tasks)):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,362 @@
+"""Optimized contract builds, optionally run per contract in parallel and skipped whenever the sources haven't changed"""
+import glob
+import hashlib
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import toml
+
+from capsule.lib.config_handler import get_capsule_dir
+from capsule.lib.logging_handler import LOG
+
+# The optimizer used on ARM machines, where `cargo run-script optimize` would pull an x86 image
+ARM_OPTIMIZER_IMAGE = "cosmwasm/workspace-optimizer-arm64:0.12.5"
+# The optimizer assumed when a project's `optimize` script doesn't name one
+OPTIMIZER_IMAGE = "cosmwasm/workspace-optimizer:0.12.5"
+# Finds the optimizer image, and so its version, in a project's `optimize` script
+OPTIMIZER_IMAGE_PATTERN = re.compile(r"cosmwasm/(?:workspace|rust)-optimizer(?:-arm64)?:[\w.-]+")
+# Rough peak memory of one optimized contract build, used to size the pool of builds
+BUILD_MEMORY_BYTES = 2 * 1024 * 1024 * 1024
+ARM_MACHINES = ("arm64", "aarch64")
+# Directories which never hold build inputs
+IGNORED_DIRS = {".git", "target", "artifacts", "node_modules", "schema"}
+# Files which decide what the optimizer produces
+SOURCE_FILE_NAMES = {"Cargo.toml", "Cargo.lock", "rust-toolchain", "rust-toolchain.toml"}
+SOURCE_SUFFIXES = (".rs",)
+# Number of builds kept in the cache before the oldest is evicted
+DEFAULT_BUILD_CACHE_ENTRIES = 20
+
+
+def is_arm() -> bool:
+    return platform.uname()[4] in ARM_MACHINES
+
+
+def optimize_command() -> List[str]:
+    """The command which produces optimized artifacts for a contract on this machine"""
+    if is_arm():
+        return ["docker", "run", "--rm", "-v", "{contract_dir}:/code",
+                "--mount", "type=volume,source={contract_name}_cache,target=/code/target",
+                "--mount", "type=volume,source=registry_cache,target=/usr/local/cargo/registry",
+                ARM_OPTIMIZER_IMAGE]
+    return ["cargo", "run-script", "optimize"]
+
+
+def optimizer_image(contract_dir: str) -> str:
+    """The optimizer image the whole workspace build runs, being the ARM optimizer
+    on ARM machines and otherwise the image named by the `optimize` script of the
+    workspace's Cargo.toml, which `cargo run-script optimize` runs
+
+    Args:
+        contract_dir (str): The root of the contract or workspace
+
+    Returns:
+        str: The image, including its version tag
+    """
+    if is_arm():
+        return ARM_OPTIMIZER_IMAGE
+    try:
+        manifest = toml.load(os.path.join(contract_dir, "Cargo.toml"))
+    except FileNotFoundError:
+        return OPTIMIZER_IMAGE
+    for section in ("workspace", "package"):
+        script = manifest.get(section, {}).get("metadata", {}).get("scripts", {}).get("optimize", "")
+        match = OPTIMIZER_IMAGE_PATTERN.search(script)
+        if match:
+            return match.group(0)
+    return OPTIMIZER_IMAGE
+
+
+def contract_optimizer_image(contract_dir: str) -> str:
+    """The optimizer which builds a single contract of a workspace. The workspace optimizer
+    can only build every member at once, so this is the rust-optimizer released alongside it,
+    the same version sharing its toolchain and so producing the same wasm.
+
+    Args:
+        contract_dir (str): The root of the workspace
+
+    Returns:
+        str: The image, including the workspace optimizer's version tag
+    """
+    return optimizer_image(contract_dir).replace("workspace-optimizer", "rust-optimizer")
+
+
+def contract_optimize_command(contract_dir: str, member: str, output_dir: str) -> List[str]:
+    """The command which builds one contract of a workspace into its own output directory.
+    Each contract gets its own target volume so parallel builds don't wait on each other's cargo locks.
+
+    Args:
+        contract_dir (str): The root of the workspace
+        member (str): The contract's path relative to the workspace root
+        output_dir (str): Where the contract's artifacts should be written
+
+    Returns:
+        List[str]: The command
+    """
+    volume = f"{os.path.basename(contract_dir)}_{member.replace(os.sep, '_')}_cache"
+    return ["docker", "run", "--rm", "-v", f"{contract_dir}:/code", "-v", f"{output_dir}:/code/artifacts",
+            "--mount", f"type=volume,source={volume},target=/code/target",
+            "--mount", "type=volume,source=registry_cache,target=/usr/local/cargo/registry",
+            contract_optimizer_image(contract_dir), f"./{member}"]
+
+
+def workspace_contracts(contract_dir: str) -> List[str]:
+    """Find the contracts of a cargo workspace, being the members which build to a cdylib
+
+    Args:
+        contract_dir (str): The root of the workspace
+
+    Returns:
+        List[str]: The contracts' paths relative to the workspace root, or an empty list when it isn't a workspace
+    """
+    try:
+        workspace = toml.load(os.path.join(contract_dir, "Cargo.toml")).get("workspace", {})
+    except FileNotFoundError:
+        return []
+    excluded = {os.path.normpath(path) for path in workspace.get("exclude", [])}
+    contracts = []
+    for pattern in workspace.get("members", []):
+        for member_dir in sorted(glob.glob(os.path.join(contract_dir, pattern))):
+            member = os.path.relpath(member_dir, contract_dir)
+            manifest = os.path.join(member_dir, "Cargo.toml")
+            if member in excluded or not os.path.isfile(manifest):
+                continue
+            if "cdylib" in toml.load(manifest).get("lib", {}).get("crate-type", []):
+                contracts.append(member)
+    return contracts
+
+
+def default_jobs(builds: int) -> int:
+    """Size the pool of parallel builds to the cores and memory of the machine"""
+    jobs = os.cpu_count() or 1
+    try:
+        jobs = min(jobs, os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // BUILD_MEMORY_BYTES)
+    except (ValueError, OSError, AttributeError):
+        pass
+    return max(1, min(jobs, builds))
+
+
+def stream_command(command: List[str], cwd: str, prefix: str) -> bool:
+    """Run a command, logging each line of its output with a prefix as it is written
+
+    Returns:
+        bool: Whether the command succeeded
+    """
+    try:
+        process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    except FileNotFoundError as e:
+        LOG.info(f"[{prefix}] {e}")
+        return False
+    with process.stdout:
+        for line in process.stdout:
+            LOG.info(f"[{prefix}] {line.rstrip()}")
+    return process.wait() == 0
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_contracts(contract_dir: str, contracts: List[str], jobs: int = 0) -> bool:
+    """Build every contract of a workspace in its own optimizer run, at most `jobs` at once,
+    then gather their wasm into `<contract_dir>/artifacts` with one combined checksums.txt
+
+    Args:
+        contract_dir (str): The root of the workspace
+        contracts (List[str]): The contracts from workspace_contracts
+        jobs (int, optional): Max builds at once. Defaults to 0, sized to the machine.
+
+    Returns:
+        bool: Whether every contract built
+    """
+    jobs = jobs or default_jobs(len(contracts))
+    LOG.info(f"Building {len(contracts)} contracts, {jobs} at a time")
+    artifacts_dir = os.path.join(contract_dir, "artifacts")
+    os.makedirs(artifacts_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as output_root:
+        output_dirs = {contract: os.path.join(output_root, contract.replace(os.sep, "_")) for contract in contracts}
+        for output_dir in output_dirs.values():
+            os.makedirs(output_dir)
+
+        def build(contract):
+            command = contract_optimize_command(contract_dir, contract, output_dirs[contract])
+            return stream_command(command, contract_dir, os.path.basename(contract))
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = dict(zip(contracts, pool.map(build, contracts)))
+
+        failed = [contract for contract, succeeded in results.items() if not succeeded]
+        if failed:
+            LOG.info(f"Optimized build failed for {', '.join(failed)}")
+            return False
+
+        wasm = {contract: sorted(name for name in os.listdir(output_dir) if name.endswith(".wasm"))
+                for contract, output_dir in output_dirs.items()}
+        missing = [contract for contract, names in wasm.items() if not names]
+        if missing:
+            LOG.info(f"Optimized build produced no wasm for {', '.join(missing)}")
+            return False
+
+        checksums = []
+        for contract, names in wasm.items():
+            for name in names:
+                shutil.copy2(os.path.join(output_dirs[contract], name), os.path.join(artifacts_dir, name))
+                checksums.append(f"{sha256_file(os.path.join(artifacts_dir, name))}  {name}\n")
+    with open(os.path.join(artifacts_dir, "checksums.txt"), "w") as file:
+        file.writelines(sorted(checksums, key=lambda line: line.split()[1]))
+    return True
+
+
+def built_artifacts(artifacts_dir: str) -> List[str]:
+    """List the wasm a build produced, being those named in its checksums.txt
+    as any other wasm in artifacts_dir is left over from earlier builds
+
+    Args:
+        artifacts_dir (str): The artifacts directory of the build
+
+    Returns:
+        List[str]: File names relative to artifacts_dir
+    """
+    with open(os.path.join(artifacts_dir, "checksums.txt"), "r") as file:
+        return [line.split()[1] for line in file if line.strip()]
+
+
+def source_files(contract_dir: str) -> List[str]:
+    """List the files of a contract or workspace that feed into its build
+
+    Args:
+        contract_dir (str): The root of the contract or workspace
+
+    Returns:
+        List[str]: Paths relative to contract_dir, sorted
+    """
+    files = []
+    for root, dirs, names in os.walk(contract_dir):
+        dirs[:] = [name for name in dirs if name not in IGNORED_DIRS]
+        for name in names:
+            if name in SOURCE_FILE_NAMES or name.endswith(SOURCE_SUFFIXES):
+                files.append(os.path.relpath(os.path.join(root, name), contract_dir))
+    return sorted(files)
+
+
+def build_key(contract_dir: str, command: List[str] = None) -> str:
+    """Hash everything which decides the output of an optimized build: the rust sources,
+    every Cargo.toml and the Cargo.lock, the optimizer command (and so its image tag)
+    and the host architecture, as ARM and x86 optimizers produce different wasm.
+
+    Args:
+        contract_dir (str): The root of the contract or workspace
+        command (List[str], optional): The build command. Defaults to optimize_command().
+
+    Returns:
+        str: The key as hex
+    """
+    key = hashlib.sha256()
+    key.update(platform.uname()[4].encode())
+    key.update(" ".join(command or optimize_command()).encode())
+    for path in source_files(contract_dir):
+        key.update(path.encode() + b"\0")
+        with open(os.path.join(contract_dir, path), "rb") as file:
+            key.update(hashlib.sha256(file.read()).digest())
+    return key.hexdigest()
+
+
+class BuildCache(object):
+    """BuildCache keeps the artifacts of past optimized builds
+    under `~/.capsule/cache/builds/<build key>/`"""
+
+    def __init__(self, cache_dir: str = None, max_entries: int = DEFAULT_BUILD_CACHE_ENTRIES) -> None:
+        self.cache_dir = cache_dir or get_capsule_dir("cache", "builds")
+        self.max_entries = max_entries
+
+    def restore(self, key: str, artifacts_dir: str) -> bool:
+        """Copy the artifacts of a cached build into artifacts_dir
+
+        Returns:
+            bool: Whether there was a cached build to restore
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry_dir):
+            return False
+        os.makedirs(artifacts_dir, exist_ok=True)
+        for name in os.listdir(entry_dir):
+            shutil.copy2(os.path.join(entry_dir, name), os.path.join(artifacts_dir, name))
+        os.utime(entry_dir)
+        return True
+
+    def put(self, key: str, artifacts_dir: str) -> None:
+        """Remember the artifacts of a successful build, only those its checksums.txt names"""
+        try:
+            names = built_artifacts(artifacts_dir)
+        except FileNotFoundError:
+            LOG.info("The build wrote no checksums.txt, so its artifacts are not cached")
+            return
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, suffix=".tmp")
+        for name in names + ["checksums.txt"]:
+            shutil.copy2(os.path.join(artifacts_dir, name), os.path.join(staging_dir, name))
+        entry_dir = os.path.join(self.cache_dir, key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(staging_dir, entry_dir)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = sorted((os.path.getmtime(os.path.join(self.cache_dir, name)), name)
+                         for name in os.listdir(self.cache_dir) if not name.endswith(".tmp"))
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+def run_optimizer(contract_dir: str, command: List[str] = None) -> bool:
+    """Run the optimizer over a contract or workspace in one go
+
+    Returns:
+        bool: Whether the build succeeded
+    """
+    command = [part.format(contract_dir=contract_dir, contract_name=os.path.basename(contract_dir))
+               for part in (command or optimize_command())]
+    LOG.info(f"Running {' '.join(command)}")
+    if not stream_command(command, contract_dir, os.path.basename(contract_dir)):
+        LOG.info("Optimized build failed")
+        return False
+    return True
+
+
+def optimized_build(contract_dir: str, rebuild: bool = False, cache: Optional[BuildCache] = None,
+                    parallel: bool = False, jobs: int = 0) -> bool:
+    """Produce optimized artifacts and their checksums in `<contract_dir>/artifacts`,
+    restoring them from the build cache when nothing that goes into the build has changed.
+    The workspace optimizer builds every contract in one run unless `parallel` is set,
+    in which case the contracts of a multi-contract workspace are built one per optimizer run.
+
+    Args:
+        contract_dir (str): The root of the contract or workspace
+        rebuild (bool, optional): Build even when a cached build matches. Defaults to False.
+        cache (BuildCache, optional): The cache to use. Defaults to the cache in `~/.capsule`.
+        parallel (bool, optional): Build each contract of a workspace in its own run, in parallel. Defaults to False.
+        jobs (int, optional): Max contracts built at once in parallel. Defaults to 0, sized to the machine.
+
+    Returns:
+        bool: Whether artifacts are in place, either restored or freshly built
+    """
+    cache = cache or BuildCache()
+    artifacts_dir = os.path.join(contract_dir, "artifacts")
+    contracts = workspace_contracts(contract_dir) if parallel else []
+    parallel = len(contracts) > 1
+    key = build_key(contract_dir, command=[contract_optimizer_image(contract_dir)] if parallel else None)
+    if not rebuild and cache.restore(key, artifacts_dir):
+        LOG.info(f"Sources are unchanged since build {key[:12]}, reusing its artifacts")
+        return True
+    built = build_contracts(contract_dir, contracts, jobs) if parallel else run_optimizer(contract_dir)
+    if not built:
+        return False
+    cache.put(key, artifacts_dir)
+    return True
@@ -0,0 +1,145 @@
+"""Persistent on-disk cache of downloaded code objects"""
+import contextlib
+import hashlib
+import mmap
+import os
+import tempfile
+from typing import Iterator, Optional
+
+from capsule.lib.config_handler import get_capsule_dir
+from capsule.lib.logging_handler import LOG
+
+# Total size the cached wasm may grow to before the least recently used is evicted
+DEFAULT_BYTECODE_CACHE_SIZE = 512 * 1024 * 1024
+WASM_SUFFIX = ".wasm"
+CHECKSUM_SUFFIX = ".sha256"
+
+
+class BytecodeCache(object):
+    """BytecodeCache keeps the raw wasm of code objects under
+    `~/.capsule/cache/bytecode/<chain>/<code_id>.wasm` next to its sha256.
+
+    Stored code can never change so an entry never goes stale and is only
+    removed to keep the cache under `max_bytes`, least recently used first.
+    Code is read back with mmap, so an entry whose sha256 is missing is hashed
+    from the page cache rather than copied into memory first. The one exception
+    to immutability is a local chain which has been reset, which is what `forget` is for.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_BYTECODE_CACHE_SIZE) -> None:
+        """
+        Args:
+            cache_dir (str, optional): Where to cache code. Defaults to `~/.capsule/cache/bytecode`.
+            max_bytes (int, optional): Max total size of cached wasm. Defaults to DEFAULT_BYTECODE_CACHE_SIZE.
+        """
+        self.cache_dir = cache_dir or get_capsule_dir("cache", "bytecode")
+        self.max_bytes = max_bytes
+
+    def _path(self, chain_id: str, code_id: int, suffix: str) -> str:
+        return os.path.join(self.cache_dir, chain_id, f"{int(code_id)}{suffix}")
+
+    def _touch(self, path: str) -> None:
+        # The mtime of the wasm is what eviction orders entries by
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+
+    def checksum(self, chain_id: str, code_id: int) -> Optional[str]:
+        """Get the sha256 of a cached code object, without reading the code unless its sha256 went missing
+
+        Args:
+            chain_id (str): The chain the code is stored on
+            code_id (int): The code id
+
+        Returns:
+            Optional[str]: The sha256 as lowercase hex or None when the code isn't cached
+        """
+        wasm_path = self._path(chain_id, code_id, WASM_SUFFIX)
+        checksum_path = self._path(chain_id, code_id, CHECKSUM_SUFFIX)
+        try:
+            with open(checksum_path, "r") as file:
+                checksum = file.read().strip()
+        except FileNotFoundError:
+            checksum = None
+        if checksum is None or not os.path.exists(wasm_path):
+            # The wasm is written first, so a process stopped between the two writes leaves it without its sha256
+            with self.open(chain_id, code_id) as code:
+                if code is None:
+                    return None
+                checksum = hashlib.sha256(code).hexdigest()
+            self._write(checksum_path, checksum, "w")
+            return checksum
+        self._touch(wasm_path)
+        return checksum
+
+    @contextlib.contextmanager
+    def open(self, chain_id: str, code_id: int) -> Iterator[Optional[mmap.mmap]]:
+        """Map a cached code object into memory read only
+
+        Args:
+            chain_id (str): The chain the code is stored on
+            code_id (int): The code id
+
+        Yields:
+            Optional[mmap.mmap]: The raw wasm, or None when the code isn't cached
+        """
+        wasm_path = self._path(chain_id, code_id, WASM_SUFFIX)
+        try:
+            file = open(wasm_path, "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as code:
+            self._touch(wasm_path)
+            yield code
+
+    def put(self, chain_id: str, code_id: int, code: bytes) -> str:
+        """Cache a code object, evicting others if the cache grows too large
+
+        Args:
+            chain_id (str): The chain the code is stored on
+            code_id (int): The code id
+            code (bytes): The raw, uncompressed wasm
+
+        Returns:
+            str: The sha256 of the code as lowercase hex
+        """
+        checksum = hashlib.sha256(code).hexdigest()
+        wasm_path = self._path(chain_id, code_id, WASM_SUFFIX)
+        os.makedirs(os.path.dirname(wasm_path), exist_ok=True)
+        # Write the wasm before its checksum, the wasm alone is all an entry needs
+        self._write(wasm_path, code, "wb")
+        self._write(self._path(chain_id, code_id, CHECKSUM_SUFFIX), checksum, "w")
+        self.evict()
+        return checksum
+
+    def _write(self, path: str, content, mode: str) -> None:
+        # Written under a temporary name and moved into place, so no reader sees part of a file
+        with tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path), delete=False, suffix=".tmp") as file:
+            file.write(content)
+        os.replace(file.name, path)
+
+    def forget(self, chain_id: str, code_id: int) -> None:
+        for suffix in (CHECKSUM_SUFFIX, WASM_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(chain_id, code_id, suffix))
+
+    def evict(self) -> None:
+        """Remove the least recently used code objects until the cache fits in max_bytes"""
+        entries = []
+        for chain_id in os.listdir(self.cache_dir):
+            chain_dir = os.path.join(self.cache_dir, chain_id)
+            if not os.path.isdir(chain_dir):
+                continue
+            for name in os.listdir(chain_dir):
+                if name.endswith(WASM_SUFFIX):
+                    with contextlib.suppress(FileNotFoundError):
+                        stat = os.stat(os.path.join(chain_dir, name))
+                        entries.append((stat.st_mtime, stat.st_size, chain_id, name[:-len(WASM_SUFFIX)]))
+
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, chain_id, code_id in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            LOG.debug(f"Evicting code ID {code_id} of {chain_id} from the bytecode cache")
+            self.forget(chain_id, code_id)
+            total -= size
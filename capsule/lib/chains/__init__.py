@@ -0,0 +1,76 @@
+"""Chain adapters, which hide how each family of chains is reached behind AChainAdapter.
+
+The gRPC adapter is only imported for networks which set a `grpc_url`,
+keeping grpclib out of every other command's startup.
+"""
+import enum
+from enum import auto
+
+from capsule.abstractions.AChainAdapter import AChainAdapter
+from capsule.lib.chains.lcd_adapter import LcdAdapter, TerraLcdAdapter
+from capsule.lib.endpoint_router import EndpointRouter
+from capsule.lib.transport import AsyncTransport
+
+
+class SupportedChains(enum.Enum):
+   TERRA = auto()
+   JUNO = auto()
+   OSMOSIS = auto()
+
+
+# The LCD adapter of each chain family
+LCD_ADAPTERS = {
+    SupportedChains.TERRA: TerraLcdAdapter,
+    SupportedChains.JUNO: LcdAdapter,
+    SupportedChains.OSMOSIS: LcdAdapter,
+}
+# Network name prefixes telling a family apart when a network's config doesn't name one
+CHAIN_NAME_PREFIXES = {
+    SupportedChains.JUNO: ("juno", "uni"),
+    SupportedChains.OSMOSIS: ("osmosis", "osmo"),
+}
+
+
+def chain_family(network: str, network_info: dict = None) -> SupportedChains:
+    """Work out which family a network belongs to, from its `chain_family` in the config
+    or else from its name. Networks which match no family are taken to be Terra.
+
+    Args:
+        network (str): The name of the network, e.g juno-1
+        network_info (dict, optional): The network's entry in the config. Defaults to None.
+
+    Returns:
+        SupportedChains: The network's family
+    """
+    family = (network_info or {}).get("chain_family")
+    if family:
+        try:
+            return SupportedChains[family.upper()]
+        except KeyError:
+            raise ValueError(f"Network '{network}' has an unknown chain_family '{family}', expected one of: {', '.join(chain.name.lower() for chain in SupportedChains)}")
+    for chain, prefixes in CHAIN_NAME_PREFIXES.items():
+        if network.lower().startswith(prefixes):
+            return chain
+    return SupportedChains.TERRA
+
+
+def make_chain_adapter(target_chain: SupportedChains, client, transport: AsyncTransport, grpc_url: str = None,
+                       router: EndpointRouter = None) -> AChainAdapter:
+    """Build the adapter to reach a chain with
+
+    Args:
+        target_chain (SupportedChains): The chain's family
+        client (AsyncLCDClient): The chain's LCD client
+        transport (AsyncTransport): The pooled transport for REST calls
+        grpc_url (str, optional): The chain's gRPC endpoint, which is used over the LCD when given. Defaults to None.
+        router (EndpointRouter, optional): Picks which of the chain's LCDs each REST call goes to. Defaults to the client's url alone.
+
+    Returns:
+        AChainAdapter: The adapter
+    """
+    if grpc_url:
+        from capsule.lib.chains.grpc_adapter import GrpcAdapter
+        return GrpcAdapter(grpc_url)
+    if target_chain not in LCD_ADAPTERS:
+        raise ValueError(f"Chain {target_chain} is not supported")
+    return LCD_ADAPTERS[target_chain](client, transport, router=router)
@@ -0,0 +1,126 @@
+"""Chain adapter speaking gRPC, using the cosmos and cosmwasm stubs of terra_proto"""
+import asyncio
+import json
+from typing import Tuple
+from urllib.parse import urlsplit
+
+from grpclib.client import Channel
+from terra_proto.cosmos.base.query.v1beta1 import PageRequest
+from terra_proto.cosmos.tx.v1beta1 import BroadcastMode, BroadcastTxRequest
+from terra_proto.cosmos.tx.v1beta1 import ServiceStub as TxServiceStub
+from terra_proto.cosmwasm.wasm.v1 import (AccessType, QueryCodeRequest,
+                                          QueryCodesRequest,
+                                          QuerySmartContractStateRequest,
+                                          QueryStub)
+from terra_sdk.core.broadcast import (AsyncTxBroadcastResult,
+                                      SyncTxBroadcastResult)
+
+from capsule.abstractions.AChainAdapter import AChainAdapter
+from capsule.lib.code_index import code_key
+
+# Port of a gRPC endpoint given without one, by whether it uses TLS
+DEFAULT_GRPC_PORT = 9090
+DEFAULT_GRPC_TLS_PORT = 443
+# Seconds before any single gRPC call is abandoned
+DEFAULT_GRPC_TIMEOUT = 60
+# Schemes of a grpc_url which connect over TLS
+TLS_SCHEMES = ("grpcs", "https")
+
+
+def parse_grpc_url(grpc_url: str) -> Tuple[str, int, bool]:
+    """Split a gRPC endpoint into where and how to connect.
+    `grpcs://` and `https://` endpoints use TLS, while `grpc://`, `http://`
+    and a bare `host:port` are plaintext.
+
+    Args:
+        grpc_url (str): The endpoint, e.g `grpcs://juno-grpc.example.com:443` or `localhost:9090`
+
+    Returns:
+        Tuple[str, int, bool]: The host, the port and whether to use TLS
+    """
+    parts = urlsplit(grpc_url if "://" in grpc_url else f"grpc://{grpc_url}")
+    if parts.scheme not in TLS_SCHEMES + ("grpc", "http") or not parts.hostname:
+        raise ValueError(f"'{grpc_url}' is not a gRPC endpoint, expected grpcs://host:port, grpc://host:port or host:port")
+    use_tls = parts.scheme in TLS_SCHEMES
+    return parts.hostname, parts.port or (DEFAULT_GRPC_TLS_PORT if use_tls else DEFAULT_GRPC_PORT), use_tls
+
+
+class GrpcAdapter(AChainAdapter):
+    """GrpcAdapter reaches a chain through its gRPC endpoint.
+
+    Every call shares one HTTP/2 connection, concurrent calls being multiplexed
+    over it rather than each needing a connection from a pool. Payloads are
+    protobuf, so query msgs, query results and code are sent as raw bytes
+    instead of base64 inside JSON, which for code is a third smaller and
+    spares both ends the JSON encoding.
+
+    Like AsyncTransport's session, the channel is bound to the event loop
+    it was opened on and is reopened when used from a new loop.
+    """
+
+    def __init__(self, grpc_url: str, timeout: float = DEFAULT_GRPC_TIMEOUT) -> None:
+        """
+        Args:
+            grpc_url (str): The chain's gRPC endpoint, see parse_grpc_url
+            timeout (float, optional): Seconds before a call is abandoned. Defaults to DEFAULT_GRPC_TIMEOUT.
+        """
+        self.grpc_url = grpc_url
+        self.host, self.port, self.use_tls = parse_grpc_url(grpc_url)
+        self.timeout = timeout
+        self._channel = None
+        self._loop = None
+
+    def channel(self) -> Channel:
+        """Return the channel for the running event loop, opening it if needed"""
+        loop = asyncio.get_running_loop()
+        if self._channel is None or self._loop is not loop:
+            self._channel = Channel(self.host, self.port, ssl=self.use_tls)
+            self._loop = loop
+        return self._channel
+
+    async def query_smart(self, contract_addr: str, query_msg: dict):
+        response = await QueryStub(self.channel(), timeout=self.timeout).smart_contract_state(
+            QuerySmartContractStateRequest(address=contract_addr, query_data=json.dumps(query_msg).encode()))
+        return json.loads(response.data)
+
+    async def code_info(self, code_id: int):
+        # Code is listed without its bytecode, unlike the code query, seeking straight to the code id
+        response = await QueryStub(self.channel(), timeout=self.timeout).codes(
+            QueryCodesRequest(pagination=PageRequest(key=code_key(code_id), limit=1)))
+        for code_info in response.code_infos:
+            if code_info.code_id == int(code_id):
+                permission = code_info.instantiate_permission
+                return {"code_id": str(code_info.code_id), "creator": code_info.creator, "data_hash": code_info.data_hash.hex().upper(),
+                        "instantiate_permission": {"permission": AccessType(permission.permission).name, "address": permission.address,
+                                                   "addresses": list(permission.addresses)}}
+        return None
+
+    async def code_bytes(self, code_id: int) -> bytes:
+        response = await QueryStub(self.channel(), timeout=self.timeout).code(QueryCodeRequest(code_id=int(code_id)))
+        if not response.data:
+            raise Exception(f"no byte_code returned for code ID {code_id}")
+        return response.data
+
+    async def _broadcast(self, tx, mode: BroadcastMode):
+        response = await TxServiceStub(self.channel(), timeout=self.timeout).broadcast_tx(
+            BroadcastTxRequest(tx_bytes=bytes(tx.to_proto()), mode=mode))
+        return response.tx_response
+
+    async def broadcast_sync(self, tx):
+        tx_response = await self._broadcast(tx, BroadcastMode.BROADCAST_MODE_SYNC)
+        return SyncTxBroadcastResult(
+            txhash=tx_response.txhash,
+            raw_log=tx_response.raw_log,
+            code=tx_response.code,
+            codespace=tx_response.codespace,
+        )
+
+    async def broadcast_async(self, tx):
+        tx_response = await self._broadcast(tx, BroadcastMode.BROADCAST_MODE_ASYNC)
+        return AsyncTxBroadcastResult(txhash=tx_response.txhash)
+
+    async def close(self) -> None:
+        if self._channel is not None and self._loop is asyncio.get_running_loop():
+            self._channel.close()
+        self._channel = None
+        self._loop = None
@@ -0,0 +1,136 @@
+"""Local SQLite index of every code object on a chain, by code hash"""
+import base64
+import os
+import sqlite3
+import struct
+from typing import List, Optional
+
+from capsule.lib.code_registry import normalise_checksum
+from capsule.lib.config_handler import get_capsule_dir
+from capsule.lib.logging_handler import LOG
+
+DEFAULT_CODE_INDEX_FILE_NAME = "code_index.sqlite"
+# Number of code infos requested per page while crawling
+DEFAULT_CRAWL_PAGE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS codes (
+    chain_id TEXT NOT NULL,
+    code_id INTEGER NOT NULL,
+    data_hash TEXT NOT NULL,
+    creator TEXT,
+    PRIMARY KEY (chain_id, code_id)
+);
+CREATE INDEX IF NOT EXISTS codes_by_hash ON codes (chain_id, data_hash);
+CREATE TABLE IF NOT EXISTS crawls (
+    chain_id TEXT PRIMARY KEY,
+    last_code_id INTEGER NOT NULL
+);
+"""
+
+
+def code_key(code_id: int) -> bytes:
+    """Build the raw pagination key which starts a codes listing at code_id.
+    wasmd stores code infos under their code id as a big endian uint64,
+    so a listing can seek to any code id without paging from the start.
+
+    Args:
+        code_id (int): The first code id to list
+
+    Returns:
+        bytes: The pagination key, as gRPC takes it
+    """
+    return struct.pack(">Q", int(code_id))
+
+
+def code_pagination_key(code_id: int) -> str:
+    """Build the pagination key which starts a codes listing at code_id, see code_key
+
+    Args:
+        code_id (int): The first code id to list
+
+    Returns:
+        str: The base64 pagination key, as the LCD takes it
+    """
+    return base64.b64encode(code_key(code_id)).decode()
+
+
+class CodeIndex(object):
+    """CodeIndex answers "which code ids on this chain hold this exact wasm"
+    from a local copy of every code info's data hash.
+
+    The index is filled by `crawl`, which pages through the chain's code infos
+    from the code id after the last one it saw, so keeping it up to date
+    only costs the codes stored since the previous crawl.
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path or os.path.join(get_capsule_dir(), DEFAULT_CODE_INDEX_FILE_NAME)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def last_code_id(self, chain_id: str) -> int:
+        """The highest code id crawled so far on a chain, 0 if it has never been crawled"""
+        row = self.db.execute("SELECT last_code_id FROM crawls WHERE chain_id = ?", (chain_id,)).fetchone()
+        return row[0] if row else 0
+
+    def add(self, chain_id: str, code_infos: List[dict]) -> None:
+        """Index a page of code infos and remember how far the crawl got, in one transaction
+
+        Args:
+            chain_id (str): The chain the codes are stored on
+            code_infos (List[dict]): Code infos as returned by the codes listing
+        """
+        if not code_infos:
+            return
+        last_code_id = max(int(code_info["code_id"]) for code_info in code_infos)
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO codes (chain_id, code_id, data_hash, creator) VALUES (?, ?, ?, ?)",
+                [(chain_id, int(code_info["code_id"]), normalise_checksum(code_info["data_hash"]), code_info.get("creator"))
+                 for code_info in code_infos])
+            self.db.execute(
+                "INSERT INTO crawls (chain_id, last_code_id) VALUES (?, ?) "
+                "ON CONFLICT (chain_id) DO UPDATE SET last_code_id = MAX(last_code_id, excluded.last_code_id)",
+                (chain_id, last_code_id))
+
+    def find(self, chain_id: str, checksum: str) -> List[int]:
+        """Look up every code id on a chain holding the code with this sha256
+
+        Args:
+            chain_id (str): The chain to look on
+            checksum (str): The sha256 of the uncompressed wasm
+
+        Returns:
+            List[int]: The code ids, oldest first
+        """
+        rows = self.db.execute("SELECT code_id FROM codes WHERE chain_id = ? AND data_hash = ? ORDER BY code_id",
+                               (chain_id, normalise_checksum(checksum)))
+        return [row[0] for row in rows]
+
+    async def crawl(self, deployer, page_size: int = DEFAULT_CRAWL_PAGE_SIZE, limit: Optional[int] = None) -> int:
+        """Index every code stored on the deployer's chain since the last crawl
+
+        Args:
+            deployer (Deployer): The deployer whose chain is crawled
+            page_size (int, optional): Code infos per request. Defaults to DEFAULT_CRAWL_PAGE_SIZE.
+            limit (int, optional): Stop after roughly this many codes. Defaults to None, crawl to the end.
+
+        Returns:
+            int: The number of codes indexed
+        """
+        chain_id = deployer.async_client.chain_id
+        start = self.last_code_id(chain_id) + 1
+        LOG.info(f"Crawling code infos of {chain_id} from code ID {start}")
+        indexed = 0
+        next_key = code_pagination_key(start)
+        while next_key and (limit is None or indexed < limit):
+            code_infos, next_key = await deployer.query_code_infos(next_key, page_size)
+            self.add(chain_id, code_infos)
+            indexed += len(code_infos)
+            if code_infos:
+                LOG.info(f"Indexed {chain_id} up to code ID {self.last_code_id(chain_id)}")
+        return indexed
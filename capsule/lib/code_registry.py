@@ -0,0 +1,111 @@
+"""Local, content addressed registry of the code objects we have stored on each chain"""
+import base64
+import binascii
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+from capsule.lib.config_handler import get_capsule_dir
+
+DEFAULT_CODE_REGISTRY_FILE_NAME = "code_registry.json"
+
+
+def normalise_checksum(data_hash: str) -> str:
+    """Bring a code hash into the lowercase hex form checksums.txt and hashlib use.
+    LCDs return the data hash as hex, though some encode it as base64.
+
+    Args:
+        data_hash (str): The hash as returned by a chain or read from a checksums file
+
+    Returns:
+        str: The hash as lowercase hex
+    """
+    try:
+        int(data_hash, 16)
+        return data_hash.lower()
+    except ValueError:
+        return binascii.hexlify(base64.b64decode(data_hash)).decode()
+
+
+def can_instantiate(code_info: dict, address: str) -> bool:
+    """Check whether an account may instantiate a stored code object, going by the code's
+    instantiate permission or, for chains which don't report one, by who uploaded it.
+
+    Args:
+        code_info (dict): The code info as returned by a chain adapter
+        address (str): The account which would instantiate the code
+
+    Returns:
+        bool: Whether the account may instantiate it
+    """
+    config = code_info.get("instantiate_permission")
+    if not config:
+        return code_info.get("creator") == address
+    # LCDs name the permission e.g `OnlyAddress` while protobuf names it ACCESS_TYPE_ONLY_ADDRESS
+    permission = str(config.get("permission", "")).upper().replace("ACCESS_TYPE_", "").replace("_", "")
+    if permission == "EVERYBODY":
+        return True
+    if permission == "ONLYADDRESS":
+        return config.get("address") == address
+    if permission == "ANYOFADDRESSES":
+        return address in (config.get("addresses") or [])
+    if permission == "NOBODY":
+        return False
+    return code_info.get("creator") == address
+
+
+class CodeRegistry(object):
+    """CodeRegistry maps the sha256 of a wasm artifact to the code id it was
+    stored under, per chain, so an artifact which is already on a chain
+    doesn't have to be uploaded again.
+
+    The registry is filled from our own uploads and is only a hint, callers
+    are expected to check an entry against the chain's code info before
+    relying on it, as a local chain may well have been reset since.
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path or os.path.join(get_capsule_dir(), DEFAULT_CODE_REGISTRY_FILE_NAME)
+        self._entries = None
+
+    @property
+    def entries(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._entries = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, chain_id: str, checksum: str) -> Optional[int]:
+        """Look up the code id an artifact was stored under
+
+        Args:
+            chain_id (str): The chain to look on
+            checksum (str): The sha256 of the uncompressed wasm
+
+        Returns:
+            Optional[int]: The code id or None when we haven't stored the artifact on the chain
+        """
+        entry = self.entries.get(chain_id, {}).get(normalise_checksum(checksum))
+        return entry["code_id"] if entry else None
+
+    def record(self, chain_id: str, checksum: str, code_id: int) -> None:
+        self.entries.setdefault(chain_id, {})[normalise_checksum(checksum)] = {
+            "code_id": int(code_id),
+            "stored_at": int(time.time()),
+        }
+        self.save()
+
+    def forget(self, chain_id: str, checksum: str) -> None:
+        if self.entries.get(chain_id, {}).pop(normalise_checksum(checksum), None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        """Write the registry atomically so an interrupted run can't corrupt it"""
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.path), delete=False, suffix=".tmp") as file:
+            json.dump(self.entries, file, indent=2)
+        os.replace(file.name, self.path)
@@ -1,6 +1,7 @@
 """Load configuration from .toml file."""
 import os
-from multiprocessing.sharedctypes import Value
+from types import MappingProxyType
+from typing import Mapping
 
 import toml
 
@@ -8,6 +9,25 @@ from capsule.lib.logging_handler import LOG
 
 DEFAULT_CONFIG_FILE_ENV_VAR = "CAPSULE_CONFIG_FILE"
 DEFAULT_CONFIG_FILE_NAME = "config.toml"
+# Fields listing a network's endpoints, a network must set either of the first pair
+URL_FIELDS = (("chain_url", "chain_urls"), ("chain_fcd_url", "chain_fcd_urls"))
+# The types each known network field must have when it is set
+NETWORK_FIELD_TYPES = {
+    "chain_url": str,
+    "chain_urls": tuple,
+    "chain_fcd_url": str,
+    "chain_fcd_urls": tuple,
+    "gas_prices": (str, Mapping),
+    "gas_prices_ttl": (int, float),
+    "gas_adjustment": (int, float),
+    "grpc_url": str,
+    "chain_family": str,
+    "hedge_reads": bool,
+}
+URL_SCHEMES = ("http://", "https://")
+
+# Parsed configs by path, alongside the (mtime, size) of the file when it was parsed
+_PARSED_CONFIGS = {}
 
 def get_config_file(filename=None):
     """Attempts to get the location of 
@@ -35,34 +55,127 @@ def get_config_file(filename=None):
     if filename: return os.path.abspath(os.path.expandvars(os.path.expanduser(filename)))
 
     # Otherwise use a default one located in the .capsule directory at the home dir
-    config_file = os.path.expanduser(os.path.join("~", ".capsule", DEFAULT_CONFIG_FILE_NAME))
-    capsule_dir = os.path.dirname(config_file)
+    return os.path.join(get_capsule_dir(), DEFAULT_CONFIG_FILE_NAME)
+
+def get_capsule_dir(*paths):
+    """Get the path of a directory inside the capsule
+    directory at the home dir level, `~/.capsule`, creating it if needed.
+
+    Args:
+        *paths ([str], optional): Sub directories to join onto the capsule directory
+
+    Returns:
+        [str]: [The directory's path.]
+    """
+    capsule_dir = os.path.expanduser(os.path.join("~", ".capsule", *paths))
     # Check if the capsule directory has been created and if not, create it.
     if not os.path.exists(capsule_dir):
         os.makedirs(capsule_dir)
-    return config_file
+    return capsule_dir
+
+def read_only(value):
+    """Wrap a parsed toml value so it can be shared without anyone changing it,
+    tables become read only mappings and arrays become tuples.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: read_only(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(read_only(item) for item in value)
+    return value
+
+def network_urls(network, field: str = "chain_url") -> tuple:
+    """Get every endpoint a network lists for a field, its single `chain_url`
+    coming before its `chain_urls` list, without any duplicates.
+
+    Args:
+        network (Mapping): The network's entry in the config
+        field (str, optional): The single url field, `chain_url` or `chain_fcd_url`. Defaults to "chain_url".
+
+    Returns:
+        tuple: The endpoints in the order they are preferred
+    """
+    urls = ((network.get(field),) if network.get(field) else ()) + tuple(network.get(f"{field}s") or ())
+    return tuple(dict.fromkeys(urls))
+
+def validate_network(name, network, filename="config", strict=True):
+    """Check a network entry of a config has what the commands need to connect to it,
+    so a bad entry fails here rather than deep inside a client's setup.
+
+    Args:
+        name (str): The network's name in the config
+        network (Mapping): The network's entry in the config
+        filename (str, optional): The config the entry came from, for the error message. Defaults to "config".
+        strict (bool, optional): Also require an endpoint to connect to, as the network about to be used must have. Defaults to True.
+
+    Raises:
+        ValueError: Describing what is wrong with the entry
+    """
+    if not isinstance(network, Mapping):
+        raise ValueError(f"Network '{name}' in {filename} should be a table like [networks.{name}]")
+    for field, types in NETWORK_FIELD_TYPES.items():
+        # bool is an int, so only a field expecting one may be true or false
+        if field in network and (not isinstance(network[field], types) or (isinstance(network[field], bool) and types is not bool)):
+            raise ValueError(f"Network '{name}' in {filename} has an invalid '{field}': {network[field]!r}")
+    if strict and not network_urls(network):
+        raise ValueError(f"Network '{name}' in {filename} is missing 'chain_url' or 'chain_urls'")
+    for field, list_field in URL_FIELDS:
+        for url in network_urls(network, field):
+            if not isinstance(url, str) or not url.startswith(URL_SCHEMES):
+                raise ValueError(f"Network '{name}' in {filename} has a '{field}' or '{list_field}' entry which isn't an http(s) URL: {url!r}")
+
+def validate_networks(networks, filename="config"):
+    """Loosely check every network entry of a config as it is loaded. An entry
+    may leave out its endpoints, e.g one only naming a chain_id, so that it doesn't
+    break commands using other networks, each network being checked in full by
+    validate_network once it is selected.
+
+    Args:
+        networks (Mapping): The `networks` table of a config
+        filename (str, optional): The config the table came from, for the error message. Defaults to "config".
+
+    Raises:
+        ValueError: Describing the first bad entry found
+    """
+    for name, network in networks.items():
+        validate_network(name, network, filename, strict=False)
+
+def load_config(filename):
+    """Parse a config file once per process, parsing it again only
+    when its mtime or size shows it has changed.
+
+    Args:
+        filename (str): The config file's path
+
+    Returns:
+        Mapping: A read only view of the parsed config, shared by every caller
+    """
+    stat = os.stat(filename)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _PARSED_CONFIGS.get(filename)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    LOG.debug(f"Parsing config {filename}")
+    config = read_only(toml.load(filename))
+    validate_networks(config.get("networks", {}), filename)
+    _PARSED_CONFIGS[filename] = (version, config)
+    return config
 
 async def get_config(config_path=None):
     """Simple function which takes a config_file
     and attempts to parse it as a toml config
-    returning the parsed result as a dict
+    returning the parsed result as a read only mapping
     """
     filename = get_config_file(filename=config_path)
-    # Read toml file
-    config = toml.load(filename)
-
-    return config
+    return load_config(filename)
 
 async def get_networks(config_path=None):
     """Simple function which takes a config_file
     and attempts to parse it as a toml config
-    returning the parsed result as a dict
+    returning its networks as a read only mapping
     """
-    filename = get_config_file(filename=config_path)
-    # Read toml file
-    config = toml.load(filename)
-
+    config = await get_config(config_path)
 
     if not config.get('networks', False):
         raise ValueError("Could not find any 'networks' in config. Pls ensure the toml config is well formed.")
-    return config['networks']
\ No newline at end of file
+    return config['networks']
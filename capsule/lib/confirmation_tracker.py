@@ -0,0 +1,273 @@
+"""Confirmation of broadcast txs, watching for any number of tx hashes from a single polling loop"""
+import asyncio
+import base64
+import hashlib
+from typing import Optional
+
+from terra_sdk.core.broadcast import BlockTxBroadcastResult
+from terra_sdk.util.url import urljoin
+
+from capsule.lib.endpoint_router import EndpointRouter
+from capsule.lib.logging_handler import LOG
+from capsule.lib.transport import AsyncTransport
+
+# Seconds to wait for a broadcast tx to be included in a block
+DEFAULT_CONFIRMATION_TIMEOUT = 60
+# Seconds between polls right after a new block was seen
+DEFAULT_MIN_POLL_INTERVAL = 0.5
+# Longest the poll interval backs off to while no new block is seen
+DEFAULT_MAX_POLL_INTERVAL = 3
+# How much the poll interval grows by after each poll which saw no new block
+DEFAULT_POLL_BACKOFF = 1.5
+# Most skipped blocks fetched to catch up with, beyond that every pending tx is looked up instead
+DEFAULT_MAX_CATCH_UP_BLOCKS = 10
+
+
+def to_block_result(tx_response: dict) -> BlockTxBroadcastResult:
+    """Shape a `tx_response` from the LCD the same way a block mode broadcast is returned
+
+    Args:
+        tx_response (dict): The tx_response of a tx lookup
+
+    Returns:
+        BlockTxBroadcastResult: The tx result
+    """
+    return BlockTxBroadcastResult(
+        height=tx_response.get("height") or 0,
+        txhash=tx_response.get("txhash"),
+        raw_log=tx_response.get("raw_log"),
+        gas_wanted=tx_response.get("gas_wanted") or 0,
+        gas_used=tx_response.get("gas_used") or 0,
+        logs=tx_response.get("logs"),
+        code=tx_response.get("code"),
+        codespace=tx_response.get("codespace"),
+    )
+
+
+def block_height(block_info: dict) -> Optional[int]:
+    """Get the height of a block returned by the LCD, None if it is missing"""
+    try:
+        return int(block_info["block"]["header"]["height"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def block_tx_hashes(block_info: dict) -> Optional[set]:
+    """Hash the txs of a block returned by the LCD the way tx hashes are reported
+
+    Args:
+        block_info (dict): The block as returned by the LCD
+
+    Returns:
+        Optional[set]: The upper case hex hashes of the block's txs, None if the block came without its txs
+    """
+    try:
+        txs = block_info["block"]["data"]["txs"]
+    except (KeyError, TypeError):
+        return None
+    return {hashlib.sha256(base64.b64decode(tx)).hexdigest().upper() for tx in txs or []}
+
+
+class ConfirmationTracker(object):
+    """ConfirmationTracker waits on txs which were broadcast in sync mode
+    until they are included in a block, so callers can broadcast now and
+    confirm later:
+
+        confirmation = tracker.track(sync_result.txhash)
+        ...
+        result = await confirmation
+
+    However many txs are tracked, a single task polls the latest block. Only
+    when the height moves are txs looked up, and only those found among the
+    new blocks' txs, so a job with hundreds of txs in flight costs about one
+    request per poll plus one per tx. A newly tracked tx is looked up once
+    directly in case it already landed. Nodes which leave the txs out of
+    their blocks have every pending tx looked up on each new block instead.
+
+    The poll interval starts at `min_poll_interval` after each new block and
+    grows by `poll_backoff` after each poll which saw none, up to `max_poll_interval`.
+
+    Each tx's future resolves to its BlockTxBroadcastResult, or fails with a
+    TimeoutError once its timeout passes. Futures belong to the event loop
+    they were tracked on.
+    """
+
+    def __init__(self, lcd_url: str, transport: AsyncTransport = None, router: EndpointRouter = None,
+                 min_poll_interval: float = DEFAULT_MIN_POLL_INTERVAL,
+                 max_poll_interval: float = DEFAULT_MAX_POLL_INTERVAL,
+                 poll_backoff: float = DEFAULT_POLL_BACKOFF,
+                 max_catch_up_blocks: int = DEFAULT_MAX_CATCH_UP_BLOCKS) -> None:
+        """
+        Args:
+            lcd_url (str): The LCD to poll
+            transport (AsyncTransport, optional): The pooled transport to poll through. Defaults to a new AsyncTransport.
+            router (EndpointRouter, optional): Picks which of the network's LCDs each poll goes to. Defaults to polling lcd_url alone.
+            min_poll_interval (float, optional): Seconds between polls after a new block. Defaults to DEFAULT_MIN_POLL_INTERVAL.
+            max_poll_interval (float, optional): Longest seconds between polls. Defaults to DEFAULT_MAX_POLL_INTERVAL.
+            poll_backoff (float, optional): Growth of the interval after a poll without a new block. Defaults to DEFAULT_POLL_BACKOFF.
+            max_catch_up_blocks (int, optional): Most skipped blocks to fetch. Defaults to DEFAULT_MAX_CATCH_UP_BLOCKS.
+        """
+        self.lcd_url = lcd_url
+        self.transport = transport or AsyncTransport()
+        self.router = router or EndpointRouter([lcd_url])
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.poll_backoff = poll_backoff
+        self.max_catch_up_blocks = max_catch_up_blocks
+        # (future, deadline, timeout) of each tx still waiting on a block, by tx hash
+        self._pending = {}
+        # Tx hashes to look up directly on the next poll
+        self._unchecked = set()
+        # Height of the latest block already searched for pending txs
+        self._height = None
+        self._poller = None
+        self._loop = None
+
+    @property
+    def pending(self) -> int:
+        """The number of txs still waiting on a block"""
+        return len(self._pending)
+
+    def _reset(self, loop) -> None:
+        self._pending = {}
+        self._unchecked = set()
+        self._height = None
+        self._poller = None
+        self._loop = loop
+
+    def track(self, txhash: str, timeout: float = DEFAULT_CONFIRMATION_TIMEOUT) -> asyncio.Future:
+        """Start waiting on a broadcast tx, returning straight away
+
+        Args:
+            txhash (str): The hash of the broadcast tx
+            timeout (float, optional): Seconds to wait before giving up. Defaults to DEFAULT_CONFIRMATION_TIMEOUT.
+
+        Returns:
+            asyncio.Future: Resolves to the tx's BlockTxBroadcastResult, or fails with a TimeoutError.
+                Tracking a tx again hands back the same future.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Anything tracked on an earlier loop went away with it
+            self._reset(loop)
+        txhash = txhash.upper()
+        deadline = loop.time() + timeout
+        if txhash in self._pending and not self._pending[txhash][0].done():
+            confirmation, current_deadline, current_timeout = self._pending[txhash]
+            if deadline > current_deadline:
+                self._pending[txhash] = (confirmation, deadline, timeout)
+            return confirmation
+
+        confirmation = loop.create_future()
+        self._pending[txhash] = (confirmation, deadline, timeout)
+        self._unchecked.add(txhash)
+        if self._poller is None or self._poller.done():
+            self._poller = loop.create_task(self._poll())
+        return confirmation
+
+    async def wait(self, txhash: str, timeout: float = DEFAULT_CONFIRMATION_TIMEOUT) -> BlockTxBroadcastResult:
+        """Wait until a broadcast tx has been included in a block
+
+        Args:
+            txhash (str): The hash of the broadcast tx
+            timeout (float, optional): Seconds to wait before giving up. Defaults to DEFAULT_CONFIRMATION_TIMEOUT.
+
+        Returns:
+            BlockTxBroadcastResult: The result of the tx
+        """
+        # Shielded so a caller giving up doesn't cancel the tx for anyone else waiting on it
+        return await asyncio.shield(self.track(txhash, timeout=timeout))
+
+    async def _poll(self) -> None:
+        interval = self.min_poll_interval
+        while self._pending:
+            await asyncio.sleep(interval)
+            if await self._check():
+                interval = self.min_poll_interval
+            else:
+                interval = min(interval * self.poll_backoff, self.max_poll_interval)
+            self._expire()
+
+    async def _check(self) -> bool:
+        """Look up the txs which may have landed since the last poll
+
+        Returns:
+            bool: Whether a new block was seen
+        """
+        to_look_up = self._unchecked
+        self._unchecked = set()
+        latest = await self._get_block("latest")
+        height = block_height(latest)
+        new_block = height is not None and (self._height is None or height > self._height)
+        if new_block:
+            landed = await self._landed_since(latest, height)
+            to_look_up = to_look_up | (set(self._pending) if landed is None else landed & set(self._pending))
+            self._height = height
+        elif height is None:
+            to_look_up = set(self._pending)
+
+        await asyncio.gather(*[self._look_up(txhash) for txhash in to_look_up if txhash in self._pending])
+        return new_block
+
+    async def _landed_since(self, latest: dict, height: int) -> Optional[set]:
+        """Collect the tx hashes of every block since the last one searched
+
+        Returns:
+            Optional[set]: The tx hashes, None if any block's txs are unknown
+        """
+        landed = block_tx_hashes(latest)
+        if landed is None or self._height is None:
+            # Txs tracked before the first poll are all looked up directly
+            return landed
+        skipped = range(self._height + 1, height)
+        if len(skipped) > self.max_catch_up_blocks:
+            return None
+        for block_info in await asyncio.gather(*[self._get_block(skipped_height) for skipped_height in skipped]):
+            hashes = block_tx_hashes(block_info)
+            if hashes is None:
+                return None
+            landed |= hashes
+        return landed
+
+    async def _get_json(self, endpoint: str) -> dict:
+        # Polls are frequent and cheap to repeat, so they fail over but are never hedged nor timed
+        return await self.router.read(lambda url: self.transport.get_json(urljoin(url, endpoint)), hedge=False)
+
+    async def _get_block(self, height) -> Optional[dict]:
+        try:
+            return await self._get_json(f"/cosmos/base/tendermint/v1beta1/blocks/{height}")
+        except Exception as e:
+            LOG.debug(f"Could not fetch block {height}: {e!r}")
+            return None
+
+    async def _look_up(self, txhash: str) -> None:
+        try:
+            tx_info = await self._get_json(f"/cosmos/tx/v1beta1/txs/{txhash}")
+        except Exception as e:
+            LOG.debug(f"Could not look up tx {txhash}, retrying on the next poll: {e!r}")
+            self._unchecked.add(txhash)
+            return
+        if tx_info.get("tx_response") and txhash in self._pending:
+            confirmation = self._pending.pop(txhash)[0]
+            if not confirmation.done():
+                confirmation.set_result(to_block_result(tx_info["tx_response"]))
+
+    def _expire(self) -> None:
+        now = self._loop.time()
+        for txhash, (confirmation, deadline, timeout) in list(self._pending.items()):
+            if confirmation.done():
+                # Cancelled by whoever was waiting on it
+                del self._pending[txhash]
+            elif now >= deadline:
+                del self._pending[txhash]
+                confirmation.set_exception(TimeoutError(f"Tx {txhash} was not included in a block within {timeout}s"))
+
+    async def close(self) -> None:
+        """Stop polling, cancelling the futures of any txs still pending"""
+        if self._loop is asyncio.get_running_loop():
+            if self._poller is not None and not self._poller.done():
+                self._poller.cancel()
+                await asyncio.gather(self._poller, return_exceptions=True)
+            for confirmation, _, _ in self._pending.values():
+                confirmation.cancel()
+        self._reset(None)
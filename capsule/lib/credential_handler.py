@@ -1,10 +1,14 @@
 
+import hashlib
 import os
+import threading
 
-from capsule.lib.config_handler import get_config
+from terra_sdk.key.mnemonic import MnemonicKey
 
+from capsule.lib.config_handler import get_config_file, load_config
 
-async def get_mnemonic(strict=False):
+
+def read_mnemonic(strict=False, config_path=None):
     """Attempt to gather a mnemonic from one of the available sources
     First, if a mnemonic is defined in the env, use that.
     Next, check the config file for the secret 
@@ -13,6 +17,7 @@ async def get_mnemonic(strict=False):
 
     Args:
         strict (bool, optional): When set to true, if no mnemonic is found an exception is raised. Defaults to False.
+        config_path (str, optional): The config to look in. Defaults to the usual config.
 
     Returns:
         str: The mnemonic found either in the env or in the config file
@@ -20,15 +25,58 @@ async def get_mnemonic(strict=False):
     if os.getenv("CAPSULE_MNEMONIC", False):
         return os.environ["CAPSULE_MNEMONIC"]
 
-    config = await get_config()
+    config = load_config(get_config_file(filename=config_path))
     if config.get("deploy_info", {}).get("mnemonic", False):
         return config.get("deploy_info", {}).get("mnemonic", False)
     
     if strict:
         raise Exception("No Mnemonic was found either in the specified config file or in the environment. Strict mode is set to true")
     return None
-    
 
 
+async def get_mnemonic(strict=False):
+    """Async counterpart of read_mnemonic, see read_mnemonic"""
+    return read_mnemonic(strict=strict)
+
 
-    
+class KeyProvider(object):
+    """KeyProvider derives each signing key from its mnemonic once and keeps it
+    in memory for the rest of the process.
+
+    Deriving a key means a PBKDF2 seed stretch and a BIP32 derivation which,
+    repeated for every Deployer or wallet lane built during one run, adds up.
+    Keys are held under a sha256 of the mnemonic rather than the mnemonic itself.
+    """
+
+    def __init__(self) -> None:
+        self._keys = {}
+        # Deployers can be built from several threads, derive each key once regardless
+        self._lock = threading.Lock()
+
+    def get_key(self, mnemonic: str, index: int = 0) -> MnemonicKey:
+        """Get the key of an account derived from a mnemonic, deriving it on first use
+
+        Args:
+            mnemonic (str): The mnemonic to derive from
+            index (int, optional): The HD index of the account. Defaults to 0, the main account.
+
+        Returns:
+            MnemonicKey: The derived key
+        """
+        if mnemonic is None:
+            # MnemonicKey makes up a fresh mnemonic when given none, so there is nothing to reuse
+            return MnemonicKey(index=index)
+        cache_key = (hashlib.sha256(mnemonic.encode()).hexdigest(), index)
+        with self._lock:
+            if cache_key not in self._keys:
+                self._keys[cache_key] = MnemonicKey(mnemonic, index=index)
+            return self._keys[cache_key]
+
+    def clear(self) -> None:
+        """Drop every derived key"""
+        with self._lock:
+            self._keys.clear()
+
+
+# The key provider shared by every Deployer in the process
+KEY_PROVIDER = KeyProvider()
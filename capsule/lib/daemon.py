@@ -0,0 +1,242 @@
+"""The `capsule serve` daemon, keeping warm Deployers behind a JSON-RPC Unix socket"""
+import asyncio
+import contextlib
+import inspect
+import json
+import os
+import signal
+import time
+from collections import Counter
+
+from capsule.lib.config_handler import get_networks, network_urls
+from capsule.lib.daemon_client import (IDENTITY_MISMATCH_CODE, DaemonClient,
+                                       get_identity, get_socket_path)
+from capsule.lib.deployer import Deployer
+from capsule.lib.gas_prices import DEFAULT_GAS_PRICES_TTL
+from capsule.lib.logging_handler import LOG
+from capsule.lib.query_cache import QueryCache
+from capsule.lib.session import DeploySession
+from capsule.lib.transport import AsyncTransport
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR_CODE = -32700
+METHOD_NOT_FOUND_CODE = -32601
+INVALID_PARAMS_CODE = -32602
+SERVER_ERROR_CODE = -32000
+
+
+class RpcError(Exception):
+    """Raised by a daemon method to reply with a specific JSON-RPC error"""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+def to_json_result(result):
+    """Shape a Deployer result for a JSON reply, SDK objects are sent as their data"""
+    return result.to_data() if hasattr(result, "to_data") else result
+
+
+class CapsuleDaemon(object):
+    """CapsuleDaemon serves query and execute requests from a long lived process
+    so each one skips the imports, config parsing, key derivation, gas price
+    lookups and connection setup a fresh `capsule` invocation pays for.
+
+    A Deployer is kept per network, sharing one pooled transport, and so keeps its
+    locally tracked account sequence between requests. A network's Deployer is
+    rebuilt when its config entry changes or its gas prices are older than the
+    network's `gas_prices_ttl`, the replaced Deployer being closed once no
+    request is using it.
+
+    Requests are JSON-RPC 2.0, one line of JSON per request and per reply.
+    The socket is only accessible to the user running the daemon as anyone who
+    can reach it can sign txs with their key.
+    """
+
+    def __init__(self, socket_path: str = None) -> None:
+        self.socket_path = get_socket_path(socket_path)
+        self.identity = get_identity()
+        self.transport = AsyncTransport()
+        # Deployers by chain, alongside the network entry and time they were built from
+        self.deployers = {}
+        # Held while a chain's Deployer is built, so concurrent first requests share one
+        self._building = {}
+        # Requests in flight by the Deployer serving them
+        self._users = Counter()
+        # Replaced Deployers waiting on their last requests before being closed
+        self._retired = set()
+        self._server = None
+        self._stopped = None
+        # Connection handlers still running, by their writer
+        self._connections = {}
+
+    async def get_deployer(self, chain: str) -> Deployer:
+        """Get the warm Deployer of a network, building it if needed
+
+        Args:
+            chain (str): The network's name in the config
+
+        Returns:
+            Deployer: The network's Deployer
+        """
+        network = (await get_networks()).get(chain)
+        if network is None:
+            raise RpcError(INVALID_PARAMS_CODE, f"There is no network '{chain}' in the config")
+        async with self._building.setdefault(chain, asyncio.Lock()):
+            session_kwargs = {}
+            replaced = None
+            if chain in self.deployers:
+                built_from, built_at, replaced = self.deployers[chain]
+                # The config is shared as one read only copy until the file changes
+                if built_from is network and time.monotonic() - built_at < network.get("gas_prices_ttl", DEFAULT_GAS_PRICES_TTL):
+                    return replaced
+                # Keep what was learnt about the network's endpoints while they are unchanged
+                if replaced.endpoint_router.urls == network_urls(network):
+                    replaced.endpoint_router.hedge_reads = network.get("hedge_reads", False)
+                    session_kwargs["endpoint_router"] = replaced.endpoint_router
+
+            LOG.info(f"Warming up a Deployer for {chain}")
+            # Every session shares the daemon's transport, which is closed when the daemon stops
+            # Queries are only served from the cache when they give a max_staleness
+            session_kwargs.setdefault("query_cache", QueryCache(max_staleness=None))
+            session = await DeploySession.open(chain, transport=self.transport, close_transport=False, **session_kwargs)
+            self.deployers[chain] = (network, time.monotonic(), session.deployer)
+        if replaced is not None:
+            self._retired.add(replaced)
+            await self._close_if_idle(replaced)
+        return session.deployer
+
+    async def _close_if_idle(self, deployer: Deployer) -> None:
+        # A replaced Deployer may still be waiting on a tx for a request, which closing would cancel
+        if deployer in self._retired and not self._users[deployer]:
+            self._retired.discard(deployer)
+            await deployer.close(close_transport=False)
+
+    @contextlib.asynccontextmanager
+    async def using_deployer(self, chain: str):
+        """Get the warm Deployer of a network for the length of a request,
+        so it isn't closed under the request when it is replaced
+        """
+        deployer = await self.get_deployer(chain)
+        self._users[deployer] += 1
+        try:
+            yield deployer
+        finally:
+            self._users[deployer] -= 1
+            if not self._users[deployer]:
+                del self._users[deployer]
+            await self._close_if_idle(deployer)
+
+    async def rpc_ping(self) -> dict:
+        return {"pid": os.getpid(), "chains": sorted(self.deployers)}
+
+    async def rpc_query(self, chain: str, address: str, query: dict, max_staleness: float = None):
+        async with self.using_deployer(chain) as deployer:
+            return await deployer.query_contract(address, query, max_staleness=max_staleness)
+
+    async def rpc_execute(self, chain: str, address: str, msg: dict, coins: list = []):
+        async with self.using_deployer(chain) as deployer:
+            return to_json_result(await deployer.execute_contract(address, msg, coins))
+
+    async def rpc_shutdown(self) -> bool:
+        self._stopped.set()
+        return True
+
+    async def dispatch(self, request: dict) -> dict:
+        """Run one JSON-RPC request, returning its reply
+
+        Args:
+            request (dict): The decoded request
+
+        Returns:
+            dict: The reply, holding either a result or an error
+        """
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        params = dict(request.get("params") or {})
+        method = getattr(self, f"rpc_{request.get('method')}", None)
+        try:
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND_CODE, f"Unknown method '{request.get('method')}'")
+            identity = params.pop("identity", None)
+            if identity is not None and identity != self.identity:
+                raise RpcError(IDENTITY_MISMATCH_CODE, "The daemon is running with a different config or mnemonic")
+            try:
+                inspect.signature(method).bind(**params)
+            except TypeError as e:
+                raise RpcError(INVALID_PARAMS_CODE, str(e))
+            reply["result"] = await method(**params)
+        except RpcError as e:
+            reply["error"] = {"code": e.code, "message": str(e)}
+        except Exception as e:
+            LOG.debug(f"{request.get('method')} failed: {e!r}")
+            reply["error"] = {"code": SERVER_ERROR_CODE, "message": str(e)}
+        return reply
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve each request line of a connection until the client hangs up"""
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.dispatch(json.loads(line))
+                except json.JSONDecodeError as e:
+                    reply = {"jsonrpc": "2.0", "id": None, "error": {"code": PARSE_ERROR_CODE, "message": str(e)}}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    def _claim_socket(self) -> None:
+        # A socket file left behind by a daemon which didn't exit cleanly can be reused
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).is_running():
+                raise Exception(f"A daemon is already listening on {self.socket_path}")
+            os.remove(self.socket_path)
+
+    async def serve(self) -> None:
+        """Listen on the socket until shut down by a signal or a shutdown request"""
+        self._claim_socket()
+        self._stopped = asyncio.Event()
+        # Create the socket accessible to this user only
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self.handle_connection, path=self.socket_path)
+        finally:
+            os.umask(umask)
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopped.set)
+        LOG.info(f"Serving on {self.socket_path}")
+        try:
+            await self._stopped.wait()
+        finally:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+            await self.close()
+
+    async def close(self) -> None:
+        """Stop listening and release every pooled connection"""
+        if self._server is not None:
+            self._server.close()
+            # Hang up on idle clients so their handlers finish rather than being cancelled
+            handlers = list(self._connections.values())
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        for deployer in [deployer for _, _, deployer in self.deployers.values()] + list(self._retired):
+            await deployer.close(close_transport=False)
+        self._retired.clear()
+        await self.transport.close()
+        LOG.info("Daemon stopped")
@@ -0,0 +1,142 @@
+"""Client side of the `capsule serve` daemon, kept free of the SDK so forwarding a command stays fast"""
+import hashlib
+import itertools
+import json
+import os
+import socket
+from typing import Any, Tuple
+
+from capsule.lib.config_handler import get_capsule_dir, get_config_file
+from capsule.lib.logging_handler import LOG
+
+DEFAULT_SOCKET_FILE_ENV_VAR = "CAPSULE_SOCKET_FILE"
+DEFAULT_SOCKET_FILE_NAME = "capsule.sock"
+# Seconds to wait on a reply, long enough for an execute to land in a block
+DEFAULT_DAEMON_TIMEOUT = 120
+# JSON-RPC error code the daemon replies with when asked to act for a different config or mnemonic
+IDENTITY_MISMATCH_CODE = -32001
+
+_request_ids = itertools.count(1)
+
+
+class DaemonError(Exception):
+    """Raised when the daemon replies to a request with an error"""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no daemon is listening, before any request has been sent"""
+
+
+def get_socket_path(socket_path: str = None) -> str:
+    """Get the location of the daemon's socket, from the env or else `~/.capsule/capsule.sock`
+
+    Args:
+        socket_path (str, optional): A specified socket path, which takes priority. Defaults to None.
+
+    Returns:
+        str: The socket's path
+    """
+    return socket_path or os.environ.get(DEFAULT_SOCKET_FILE_ENV_VAR) or os.path.join(get_capsule_dir(), DEFAULT_SOCKET_FILE_NAME)
+
+
+def get_identity() -> dict:
+    """Describe whose behalf a command acts on, the config it reads and the mnemonic from the env if any.
+    A daemon only serves commands with the same identity as its own so it never signs with another key.
+    """
+    mnemonic = os.environ.get("CAPSULE_MNEMONIC")
+    return {
+        "config": os.path.abspath(get_config_file()),
+        "mnemonic_sha256": hashlib.sha256(mnemonic.encode()).hexdigest() if mnemonic else None,
+    }
+
+
+class DaemonClient(object):
+    """DaemonClient sends JSON-RPC 2.0 requests to a running `capsule serve`.
+    Each request and reply is a single line of JSON over the daemon's Unix socket.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = DEFAULT_DAEMON_TIMEOUT) -> None:
+        self.socket_path = get_socket_path(socket_path)
+        self.timeout = timeout
+
+    def is_running(self) -> bool:
+        """Whether a daemon is listening on the socket"""
+        if not os.path.exists(self.socket_path):
+            return False
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(self.socket_path)
+        except OSError:
+            return False
+        return True
+
+    def call(self, method: str, **params) -> Any:
+        """Call a method of the daemon and wait for its result
+
+        Args:
+            method (str): The method to call
+            **params: The method's params
+
+        Raises:
+            DaemonUnavailable: When no daemon is listening on the socket
+            DaemonError: When the daemon replies with an error or doesn't reply in time
+
+        Returns:
+            Any: The method's result
+        """
+        request = {"jsonrpc": "2.0", "id": next(_request_ids), "method": method, "params": params}
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except (ConnectionError, FileNotFoundError) as e:
+                raise DaemonUnavailable(f"No daemon listening on {self.socket_path}") from e
+            # Past this point the request may have been acted on, so failures are never retried elsewhere
+            try:
+                sock.sendall(json.dumps(request).encode() + b"\n")
+                with sock.makefile("rb") as replies:
+                    line = replies.readline()
+            except socket.timeout as e:
+                raise DaemonError(None, f"The daemon at {self.socket_path} did not reply to {method} within {self.timeout:g}s, "
+                                        "it may still complete it") from e
+        if not line:
+            raise DaemonError(None, f"The daemon at {self.socket_path} closed the connection without replying")
+        reply = json.loads(line)
+        if reply.get("error"):
+            raise DaemonError(reply["error"].get("code"), reply["error"].get("message"))
+        return reply.get("result")
+
+
+def forward_to_daemon(method: str, socket_path: str = None, **params) -> Tuple[bool, Any]:
+    """Have a running daemon perform a command's work, if there is one which can.
+
+    Args:
+        method (str): The daemon method to call
+        socket_path (str, optional): The daemon's socket. Defaults to get_socket_path().
+        **params: The method's params
+
+    Raises:
+        DaemonError: When the daemon took the request on but it failed
+
+    Returns:
+        Tuple[bool, Any]: Whether the daemon handled it, and the result when it did
+    """
+    client = DaemonClient(socket_path)
+    if not os.path.exists(client.socket_path):
+        return False, None
+    try:
+        result = client.call(method, identity=get_identity(), **params)
+    except DaemonError as e:
+        if e.code != IDENTITY_MISMATCH_CODE:
+            raise
+        LOG.debug(f"Not using the daemon at {client.socket_path}: {e}")
+        return False, None
+    except DaemonUnavailable as e:
+        LOG.debug(str(e))
+        return False, None
+    LOG.debug(f"{method} was served by the daemon at {client.socket_path}")
+    return True, result
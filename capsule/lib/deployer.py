@@ -1,36 +1,61 @@
 import asyncio
 import base64
+import copy
+import hashlib
 import json
 import pathlib
 import sys
+import warnings
 
-import requests
-from terra_sdk.client.lcd import LCDClient, Wallet
+from terra_sdk.client.lcd import AsyncLCDClient, AsyncWallet, LCDClient, Wallet
 from terra_sdk.core import Coins
+from terra_sdk.core.broadcast import BlockTxBroadcastResult
 from terra_sdk.core.fee import Fee as StdFee
 from terra_sdk.client.lcd.api.tx import CreateTxOptions
+from terra_sdk.exceptions import LCDResponseError
+from terra_sdk.util.url import urljoin
 
 from terra_sdk.core.wasm import (MsgExecuteContract, MsgInstantiateContract,
                                  MsgStoreCode)
 from terra_sdk.core.wasm.data import AccessConfig
 from terra_proto.cosmwasm.wasm.v1 import AccessType
 
-from terra_sdk.key.mnemonic import MnemonicKey
-from terra_sdk.util.contract import (get_code_id, get_contract_address,
-                                     read_file_as_b64)
+from terra_sdk.util.contract import get_code_id, get_contract_address
 
 from capsule.abstractions.ADeployer import ADeployer
-from capsule.lib.credential_handler import get_mnemonic
+from capsule.lib.bytecode_cache import BytecodeCache
+from capsule.lib.chains import SupportedChains, make_chain_adapter
+from capsule.lib.artifacts import prepare_wasm
+from capsule.lib.batching import (DEFAULT_MAX_GAS_PER_TX,
+                                  DEFAULT_MAX_MSGS_PER_TX,
+                                  DEFAULT_MAX_TX_BYTES, map_msg_results,
+                                  pack_msgs)
+from capsule.lib.code_registry import (CodeRegistry, can_instantiate,
+                                      normalise_checksum)
+from capsule.lib.confirmation_tracker import (DEFAULT_CONFIRMATION_TIMEOUT,
+                                              ConfirmationTracker)
+from capsule.lib.credential_handler import KEY_PROVIDER, read_mnemonic
+from capsule.lib.endpoint_router import EndpointRouter, RoutedLCDClient
+from capsule.lib.gas_estimator import GasEstimator
 from capsule.lib.logging_handler import LOG
+from capsule.lib.query_cache import QueryCache
+from capsule.lib.sequence_manager import (SEQUENCE_MISMATCH_CODE,
+                                          SequenceManager,
+                                          parse_sequence_mismatch)
+from capsule.lib.transport import AsyncTransport
 
 sys.path.append(pathlib.Path(__file__).parent.resolve())
 
 import enum
-from enum import auto 
-class SupportedChains(enum.Enum):
-   TERRA = auto()
-   JUNO = auto()
-   OSMOSIS = auto()
+
+# Wait for the tx to be included in a block before returning
+BROADCAST_MODE_BLOCK = "block"
+# Return once the tx has passed CheckTx and is in the mempool
+BROADCAST_MODE_SYNC = "sync"
+# Return as soon as the node has received the tx
+BROADCAST_MODE_ASYNC = "async"
+# How many times a tx is re-signed after an account sequence mismatch
+MAX_SEQUENCE_RETRIES = 3
 
 class Deployer(ADeployer):
     """Deployer is a simple facade object
@@ -40,23 +65,121 @@ class Deployer(ADeployer):
     and also executing or querying those contracts
     """
     
-    def __init__(self, client, target_chain: enum.Enum = SupportedChains.TERRA) -> None:
+    def __init__(self, client, target_chain: enum.Enum = SupportedChains.TERRA, transport: AsyncTransport = None, gas_estimator: GasEstimator = None, query_cache: QueryCache = None, key_index: int = 0, code_registry: CodeRegistry = None, bytecode_cache: BytecodeCache = None, mnemonic: str = None, grpc_url: str = None, endpoint_router: EndpointRouter = None) -> None:
         """__init__ takes only a client which is expected to be an already instantiated LCDClient for a network of your choice.
         By default it is expected you will provide a LCDClient configured for use with the Terra Network as this is the original target network. 
         In the event you want to use this deployer in a multi-chain sense for any other CosmWasm enabled chain you should also provide a different value for the 
-        `target_chain` param. Provided the target_chain is a SupportedChain, a relevant chain specific implementation of each of 
-        the abstractmethods defined in ADeployer should be provided. 
+        `target_chain` param. Provided the target_chain is a SupportedChain, the calls which differ between chains go through
+        that chain's adapter, see capsule.lib.chains.
 
         Args:
-            client (oneOf terra_sdk.client.lcd.LCDClient | OtherClient): An instantiated LCDClient class for the chain you want to use.
+            client (oneOf terra_sdk.client.lcd.LCDClient | AsyncLCDClient | OtherClient): An instantiated LCDClient class for the chain you want to use.
+                Only its url, chain id and gas settings are used, so an AsyncLCDClient works too, see DeploySession.
             target_chain (enum.Enum, optional): Optional, used only when you want to target a chain other than Terra such as Juno. Defaults to SupportedChains.TERRA.
+            transport (AsyncTransport, optional): A pooled HTTP transport to share between Deployers. Defaults to a new AsyncTransport.
+            gas_estimator (GasEstimator, optional): Estimates fees for txs. Defaults to one priced with the client's gas prices and backed by the cache in `~/.capsule`.
+            query_cache (QueryCache, optional): Opt-in, height aware cache for query_contract results. Defaults to None, meaning no caching.
+            key_index (int, optional): The HD index of the account to derive from the mnemonic. Defaults to 0, the main account.
+            code_registry (CodeRegistry, optional): Opt-in registry of stored code used by store_contract to skip re-uploading an artifact. Defaults to None.
+            bytecode_cache (BytecodeCache, optional): Opt-in on-disk cache of downloaded code objects used by code_checksum and query_code_bytes. Defaults to None.
+            mnemonic (str, optional): The mnemonic to sign with. Defaults to the one in the env or the config.
+            grpc_url (str, optional): The chain's gRPC endpoint, used for smart queries, code downloads and broadcasts
+                instead of the LCD. Defaults to None, meaning the LCD is used for everything.
+            endpoint_router (EndpointRouter, optional): Spreads LCD calls over several of the chain's endpoints
+                by their latency and health. Defaults to a router over the client's url alone.
         """
         self.target_chain = target_chain
         self.client = client
-        self.mnemonic = asyncio.run(get_mnemonic())
-        self.deployer = Wallet(lcd=self.client, key=MnemonicKey(self.mnemonic))
-        # TODO: Use constants here 
-        self.std_fee = StdFee(3969390, Coins.from_str("700000uusd"))
+        self.transport = transport or AsyncTransport()
+        self.endpoint_router = endpoint_router or EndpointRouter([client.url])
+        # All network I/O goes through an async mirror of the provided client
+        # which borrows its session from the pooled transport and picks an endpoint per call
+        self.async_client = RoutedLCDClient(
+            self.endpoint_router,
+            chain_id=client.chain_id,
+            gas_prices=client.gas_prices,
+            gas_adjustment=client.gas_adjustment,
+            loop=getattr(client, "loop", None),
+            _create_session=False)
+        self.mnemonic = mnemonic or read_mnemonic()
+        self.key_index = key_index
+        # Deriving a key from the mnemonic is expensive, so the wallets are only
+        # created the first time something needs to sign
+        self._deployer = None
+        self._async_deployer = None
+        self._sequence_manager = None
+        self.gas_estimator = gas_estimator or GasEstimator(
+            chain_id=client.chain_id,
+            gas_prices=client.gas_prices,
+            gas_adjustment=client.gas_adjustment)
+        self.query_cache = query_cache
+        self.code_registry = code_registry
+        self.bytecode_cache = bytecode_cache
+        # The calls which differ between chain families or transports go through the chain's adapter
+        self.chain = make_chain_adapter(target_chain, self.async_client, self.transport, grpc_url=grpc_url, router=self.endpoint_router)
+        # One tracker polls for every tx this Deployer and its siblings have in flight
+        self.confirmation_tracker = ConfirmationTracker(client.url, self.transport, router=self.endpoint_router)
+
+    @property
+    def deployer(self) -> Wallet:
+        """The wallet used to sign txs, its key is derived from the mnemonic once per process"""
+        if self._deployer is None:
+            self._deployer = Wallet(lcd=self.client, key=KEY_PROVIDER.get_key(self.mnemonic, index=self.key_index))
+        return self._deployer
+
+    @property
+    def async_deployer(self) -> AsyncWallet:
+        """The async counterpart of `deployer`, sharing its key"""
+        if self._async_deployer is None:
+            self._async_deployer = AsyncWallet(lcd=self.async_client, key=self.deployer.key)
+        return self._async_deployer
+
+    @property
+    def sequence_manager(self) -> SequenceManager:
+        """Tracks the account sequence of `deployer` locally"""
+        if self._sequence_manager is None:
+            self._sequence_manager = SequenceManager(self.async_deployer)
+        return self._sequence_manager
+
+    def for_key_index(self, key_index: int) -> "Deployer":
+        """for_key_index returns a Deployer for another account derived from the same mnemonic.
+        It shares this Deployer's clients, transport, gas estimator and query cache
+        but signs with its own key and tracks its own account sequence.
+
+        Args:
+            key_index (int): The HD index of the account to derive
+
+        Returns:
+            Deployer: The Deployer for the derived account
+        """
+        sibling = copy.copy(self)
+        sibling.key_index = key_index
+        sibling._deployer = None
+        sibling._async_deployer = None
+        sibling._sequence_manager = None
+        return sibling
+
+    async def get_async_client(self) -> AsyncLCDClient:
+        """get_async_client returns the async LCD client
+        with its session pointed at the pooled transport
+        for the currently running event loop
+
+        Returns:
+            AsyncLCDClient: The client to perform network I/O with
+        """
+        self.async_client.session = await self.transport.get_session()
+        return self.async_client
+
+    async def close(self, close_transport: bool = True) -> None:
+        """close stops waiting on pending txs and releases any connections held by this Deployer
+
+        Args:
+            close_transport (bool, optional): Close the pooled transport too, pass False when it is shared. Defaults to True.
+        """
+        await self.confirmation_tracker.close()
+        await self.chain.close()
+        if close_transport:
+            await self.transport.close()
 
     async def send_msg(self, msg):
         """send_msg attempts to create 
@@ -64,10 +187,210 @@ class Deployer(ADeployer):
         msg and then broadcasts the tx
 
         """
-        tx = self.deployer.create_and_sign_tx(CreateTxOptions(
-            msgs=[msg])
-        )
-        return self.client.tx.broadcast(tx)
+        return await self.send_msgs([msg])
+
+    async def send_msgs(self, msgs: list, fee: StdFee = None, broadcast_mode: str = BROADCAST_MODE_BLOCK):
+        """send_msgs attempts to create
+        and sign a single transaction containing all
+        of the provided msgs and then broadcasts the tx
+
+        The tx is signed with a locally tracked sequence and submitted in sync mode
+        while holding the sequence lock, so concurrent callers can have several txs
+        in flight from the same key. In block mode the lock is released before
+        waiting for the tx to land in a block.
+
+        Args:
+            msgs (list): The msgs to include in the tx, in order
+            fee (StdFee, optional): A fee to use instead of estimating one. Defaults to None.
+            broadcast_mode (str, optional): One of BROADCAST_MODE_BLOCK, BROADCAST_MODE_SYNC or BROADCAST_MODE_ASYNC. Defaults to BROADCAST_MODE_BLOCK.
+
+        Returns:
+            BlockTxBroadcastResult | SyncTxBroadcastResult | AsyncTxBroadcastResult: The broadcast result of the tx
+        """
+        # Account lookups and signing go through the LCD client
+        await self.get_async_client()
+        # Simulate outside of the lock so other txs can be signed meanwhile,
+        # simulate_gas uses the local sequence so txs already in flight don't fail it
+        if fee is None:
+            fee = await self.estimate_fee(msgs)
+
+        for attempt in range(MAX_SEQUENCE_RETRIES + 1):
+            async with self.sequence_manager.lock():
+                account_number, sequence = await self.sequence_manager.reserve()
+                tx = await self.async_deployer.create_and_sign_tx(CreateTxOptions(
+                    msgs=msgs, fee=fee, account_number=account_number, sequence=sequence)
+                )
+                try:
+                    if broadcast_mode == BROADCAST_MODE_ASYNC:
+                        return await self.chain.broadcast_async(tx)
+                    result = await self.chain.broadcast_sync(tx)
+                except LCDResponseError as e:
+                    expected_sequence = parse_sequence_mismatch(str(e))
+                    if expected_sequence is None:
+                        self.sequence_manager.release(sequence)
+                        raise
+                    result = None
+                else:
+                    expected_sequence = parse_sequence_mismatch(result.raw_log) if result.code == SEQUENCE_MISMATCH_CODE else None
+
+                if result is not None and expected_sequence is None:
+                    # Any other CheckTx failure means the sequence was never consumed
+                    if result.code:
+                        self.sequence_manager.release(sequence)
+                    break
+                LOG.info(f"Account sequence mismatch on attempt {attempt + 1}, resyncing and re-signing")
+                await self.sequence_manager.resync(expected_sequence)
+        else:
+            raise Exception(f"Could not broadcast tx after {MAX_SEQUENCE_RETRIES} sequence resyncs")
+
+        if broadcast_mode == BROADCAST_MODE_BLOCK and not result.code:
+            result = await self.wait_for_tx(result.txhash)
+            self.gas_estimator.record_result(msgs, result)
+        return result
+
+    async def submit_msgs(self, msgs: list, fee: StdFee = None) -> asyncio.Future:
+        """submit_msgs broadcasts a tx containing the provided msgs in sync mode
+        and returns without waiting for it to be included in a block,
+        so many txs can be in flight while the caller gets on with other work
+
+        Args:
+            msgs (list): The msgs to include in the tx, in order
+            fee (StdFee, optional): A fee to use instead of estimating one. Defaults to None.
+
+        Returns:
+            asyncio.Future: Resolves to the BlockTxBroadcastResult of the tx once it is in a block,
+                or straight away to the SyncTxBroadcastResult when the tx failed CheckTx
+        """
+        sync_result = await self.send_msgs(msgs, fee=fee, broadcast_mode=BROADCAST_MODE_SYNC)
+        LOG.info(f"Broadcast {len(msgs)} msgs in tx {sync_result.txhash}")
+        if sync_result.code:
+            confirmation = asyncio.get_running_loop().create_future()
+            confirmation.set_result(sync_result)
+            return confirmation
+
+        def record_gas(confirmation):
+            if not confirmation.cancelled() and confirmation.exception() is None:
+                self.gas_estimator.record_result(msgs, confirmation.result())
+
+        confirmation = self.confirmation_tracker.track(sync_result.txhash)
+        confirmation.add_done_callback(record_gas)
+        return confirmation
+
+    async def wait_for_tx(self, txhash: str, timeout: float = DEFAULT_CONFIRMATION_TIMEOUT) -> BlockTxBroadcastResult:
+        """wait_for_tx waits until a broadcast tx has been included in a block.
+        Every tx waited on shares one polling loop, see ConfirmationTracker
+
+        Args:
+            txhash (str): The hash of the broadcast tx
+            timeout (float, optional): Seconds to wait before giving up. Defaults to DEFAULT_CONFIRMATION_TIMEOUT.
+
+        Returns:
+            BlockTxBroadcastResult: The result of the tx, shaped as a block mode broadcast would return it
+        """
+        return await self.confirmation_tracker.wait(txhash, timeout=timeout)
+
+    async def simulate_gas(self, msgs: list) -> int:
+        """simulate_gas simulates a tx containing the provided msgs
+        and returns the gas it used without any adjustment applied
+
+        The node checks a simulation's sequence against its mempool state, which counts
+        the txs already in flight, so the simulation uses the locally tracked next
+        sequence rather than the committed one the LCD would report.
+
+        Args:
+            msgs (list): The msgs to simulate
+
+        Returns:
+            int: The simulated gas used
+        """
+        await self.get_async_client()
+        for attempt in range(MAX_SEQUENCE_RETRIES + 1):
+            # Read the sequence under the lock so no tx is between being signed and reaching the mempool
+            async with self.sequence_manager.lock():
+                _, sequence = await self.sequence_manager.peek()
+            try:
+                unsigned_tx = await self.async_deployer.create_tx(CreateTxOptions(msgs=msgs, gas_adjustment=1, sequence=sequence))
+            except LCDResponseError as e:
+                expected_sequence = parse_sequence_mismatch(str(e))
+                if expected_sequence is None:
+                    raise
+                LOG.info(f"Account sequence mismatch simulating on attempt {attempt + 1}, resyncing")
+                async with self.sequence_manager.lock():
+                    # Only resync when no tx was sent since, otherwise the sequence has moved on by itself
+                    if self.sequence_manager.next_sequence == sequence:
+                        await self.sequence_manager.resync(expected_sequence)
+                continue
+            return int(unsigned_tx.auth_info.fee.gas_limit)
+        raise Exception(f"Could not simulate tx after {MAX_SEQUENCE_RETRIES} sequence resyncs")
+
+    async def estimate_fee(self, msgs: list) -> StdFee:
+        """estimate_fee returns the fee for a tx containing the provided msgs.
+        Msg variants the gas estimator has learned enough about skip simulation,
+        everything else is simulated first, behind any txs this Deployer has in flight.
+
+        Args:
+            msgs (list): The msgs to estimate a fee for
+
+        Returns:
+            StdFee: The estimated fee including its gas limit
+        """
+        gas = self.gas_estimator.cached_gas(msgs)
+        if gas is None:
+            gas = self.gas_estimator.gas_from_simulation(msgs, await self.simulate_gas(msgs))
+        else:
+            LOG.debug(f"Using learned gas of {gas} and skipping simulation")
+        return self.gas_estimator.fee_for(gas)
+
+    async def _fit_to_gas(self, msgs: list, max_gas: int) -> list:
+        """Split a chunk of msgs in half until each piece simulates under max_gas
+
+        Returns:
+            list: (msgs, fee) pairs ready to be broadcast
+        """
+        fee = await self.estimate_fee(msgs)
+        if int(fee.gas_limit) <= max_gas or len(msgs) == 1:
+            return [(msgs, fee)]
+        LOG.debug(f"Chunk of {len(msgs)} msgs needs {fee.gas_limit} gas, splitting it")
+        middle = len(msgs) // 2
+        return await self._fit_to_gas(msgs[:middle], max_gas) + await self._fit_to_gas(msgs[middle:], max_gas)
+
+    async def execute_batch(self, executions: list,
+                            max_msgs_per_tx: int = DEFAULT_MAX_MSGS_PER_TX,
+                            max_tx_bytes: int = DEFAULT_MAX_TX_BYTES,
+                            max_gas_per_tx: int = DEFAULT_MAX_GAS_PER_TX) -> list:
+        """execute_batch packs many execute msgs into as few transactions
+        as the msg count, size and gas limits allow, broadcasts them in order
+        and maps the per-message results back out of each tx's logs
+
+        Args:
+            executions (list): dicts of the form {"address": str, "msg": dict, "coins": str (optional)}
+            max_msgs_per_tx (int, optional): Max msgs per tx. Defaults to DEFAULT_MAX_MSGS_PER_TX.
+            max_tx_bytes (int, optional): Max encoded msg bytes per tx. Defaults to DEFAULT_MAX_TX_BYTES.
+            max_gas_per_tx (int, optional): Max simulated gas per tx. Defaults to DEFAULT_MAX_GAS_PER_TX.
+
+        Returns:
+            list: One result dict per execution, in the order they were provided
+        """
+        msgs = [
+            MsgExecuteContract(
+                sender=self.deployer.key.acc_address,
+                contract=execution["address"],
+                execute_msg=execution["msg"],
+                coins=Coins.from_str(execution["coins"]) if execution.get("coins") else Coins()
+            )
+            for execution in executions
+        ]
+        # Submit every tx first so they are all in flight, then wait on them together
+        submitted = []
+        for chunk in pack_msgs(msgs, max_msgs=max_msgs_per_tx, max_bytes=max_tx_bytes):
+            for tx_msgs, fee in await self._fit_to_gas(chunk, max_gas_per_tx):
+                submitted.append((tx_msgs, await self.submit_msgs(tx_msgs, fee=fee)))
+
+        tx_results = await asyncio.gather(*[confirmation for _, confirmation in submitted])
+        results = []
+        for (tx_msgs, _), tx_result in zip(submitted, tx_results):
+            results.extend(map_msg_results(tx_result, len(tx_msgs), offset=len(results)))
+        return results
 
     async def store_contract(self, contract_name:str, contract_path:str="") -> str:
         """store_contract attempts to 
@@ -84,11 +407,63 @@ class Deployer(ADeployer):
         """
         # If the full path was provided, use it else assume its located in artifacts
         LOG.info(contract_path if contract_path else f"artifacts/{contract_name}.wasm")
-        bytes = read_file_as_b64(contract_path if contract_path else f"artifacts/{contract_name}.wasm")
-        msg = MsgStoreCode(self.deployer.key.acc_address, bytes, instantiate_permission=AccessConfig(permission=AccessType.ACCESS_TYPE_ONLY_ADDRESS, address=self.deployer.key.acc_address))
+        wasm = prepare_wasm(contract_path if contract_path else f"artifacts/{contract_name}.wasm")
+        if self.code_registry is not None:
+            code_id = await self.find_stored_code(wasm.checksum)
+            if code_id is not None:
+                LOG.info(f"Artifact {wasm.checksum} is already stored as code ID {code_id}, skipping the upload")
+                return code_id
+        fee_saved = self.gas_estimator.fee_for(wasm.gas_saved).amount
+        LOG.info(f"Uploading {wasm.original_size} bytes of wasm as {wasm.compressed_size} bytes, "
+                 f"saving {wasm.gas_saved} gas ({fee_saved or 'no fee'}) on tx size alone")
+        msg = MsgStoreCode(self.deployer.key.acc_address, wasm.wasm_b64, instantiate_permission=AccessConfig(permission=AccessType.ACCESS_TYPE_ONLY_ADDRESS, address=self.deployer.key.acc_address))
         contract_storage_result = await self.send_msg(msg)
         LOG.info(contract_storage_result)
-        return get_code_id(contract_storage_result)
+        code_id = get_code_id(contract_storage_result)
+        if self.code_registry is not None and code_id:
+            self.code_registry.record(self.async_client.chain_id, wasm.checksum, code_id)
+        return code_id
+
+    async def find_stored_code(self, checksum: str):
+        """find_stored_code looks an artifact's checksum up in the code registry
+        and confirms with the chain that the code id really holds that code
+        and that the deployer's account is allowed to instantiate it, as an upload
+        by another key is only instantiable by that key.
+        Entries the chain disagrees with are dropped from the registry.
+
+        Args:
+            checksum (str): The sha256 of the uncompressed wasm
+
+        Returns:
+            Optional[str]: The code id the artifact is stored under or None
+        """
+        chain_id = self.async_client.chain_id
+        code_id = self.code_registry.get(chain_id, checksum)
+        if code_id is None:
+            return None
+        code_info = await self.query_code_info(code_id)
+        if not code_info or normalise_checksum(code_info["data_hash"]) != normalise_checksum(checksum):
+            LOG.info(f"Code ID {code_id} on {chain_id} no longer holds artifact {checksum}, forgetting it")
+            self.code_registry.forget(chain_id, checksum)
+            return None
+        address = self.deployer.key.acc_address
+        if not can_instantiate(code_info, address):
+            LOG.info(f"Code ID {code_id} on {chain_id} can't be instantiated by {address}, uploading the artifact again")
+            return None
+        # The same type get_code_id gives back for a fresh upload
+        return str(code_id)
+
+    async def query_code_info(self, code_id: int):
+        """query_code_info fetches the info of a stored code object, including its data hash,
+        without downloading the code itself
+
+        Args:
+            code_id (int): The code_id to query
+
+        Returns:
+            Optional[dict]: The code info or None when there is no such code
+        """
+        return await self.chain.code_info(code_id)
     
     async def instantiate_contract(self, code_id: str, init_msg:dict, label: str = "Contract deployed with Capsule") -> str:
         """instantiate_contract attempts to 
@@ -136,81 +511,143 @@ class Deployer(ADeployer):
         LOG.debug(exe_result)
         return exe_result
     
-    async def query_contract(self, contract_addr: str, query_msg: dict):
+    async def query_contract(self, contract_addr: str, query_msg: dict, max_staleness: float = None):
         """Perform a query on a given contract, returning the result
 
         Args:
             contract_addr (str): The contract to perform the query on 
             query_msg (dict): The query to perform
+            max_staleness (float, optional): Seconds the query cache may trust its last seen height for
+                this query. Defaults to the query cache's own max_staleness, a cache whose max_staleness is
+                None only serving queries which give one. Ignored without a query_cache.
 
         Returns:
             dict: Query Result
         """
-        LOG.info(f"Query to be ran {query_msg}")
-        query_result = self.client.wasm.contract_query(contract_addr, query_msg)
+        LOG.debug(f"Query to be ran {query_msg}")
+        chain_id = self.async_client.chain_id
+        cached = self.query_cache is not None and (max_staleness is not None or self.query_cache.max_staleness is not None)
+        if cached:
+            await self.query_cache.ensure_height(self.latest_height, max_staleness)
+            height = self.query_cache.height
+            hit, query_result = self.query_cache.get(chain_id, contract_addr, query_msg)
+            if hit:
+                LOG.debug(query_result)
+                return query_result
+
+        query_result = await self.chain.query_smart(contract_addr, query_msg)
+        if cached:
+            self.query_cache.put(chain_id, contract_addr, query_msg, query_result, height=height)
         
-        LOG.info(query_result)
+        LOG.debug(query_result)
         return query_result
+
+    async def latest_height(self) -> int:
+        """Get the height of the latest block on the chain
+
+        Returns:
+            int: The latest block height
+        """
+        client = await self.get_async_client()
+        block = await client.tendermint.block_info()
+        return int(block["block"]["header"]["height"])
     
-    async def query_code_id(self, chain_url: str, code_id: int, target_chain=SupportedChains.TERRA):
-        """query_code_id is used to make a REST request to the relevant chain_url 
-        to specifically query the `code_details` of a given code_id
+    async def query_code_bytes(self, code_id: int) -> bytes:
+        """query_code_bytes downloads the wasm of a stored code object
+        the way the chain's adapter does, e.g from Terra's byte_code endpoint
+        or as raw bytes over gRPC. With a bytecode cache the code is only
+        ever downloaded once and read back from disk after that.
 
         Args:
-            chain_url (str): The Chain Host of the chain to interact with e.g 
-            code_id (int): The code_id to query 
-            target_chain (SupportedChains Enum, optional): Only used when you wish to target a chain other than Terra. 
-                Each chain can have different methods or URLs to request the same info and this option decides which way to perform queries  Defaults to SupportedChains.TERRA.
+            code_id (int): The code_id to query
 
         Returns:
-            Dict: `code_details` structure containing a hash with a certain encoding.
+            bytes: The stored wasm
         """
         LOG.info(f"Query to be ran {code_id}")
-        # query_result = self.client.wasm.code_info(code_id)
-        # query_two = self.client.wasm._c._get(f"/wasm/codes/{code_id}")
-        if target_chain == SupportedChains.TERRA:
-            query_raw = requests.get(f"{chain_url}/wasm/codes/{code_id}").json()
+        chain_id = self.async_client.chain_id
+        if self.bytecode_cache is None:
+            return await self.chain.code_bytes(code_id)
+        with self.bytecode_cache.open(chain_id, code_id) as cached:
+            if cached is not None:
+                LOG.debug(f"Using cached byte_code of code ID {code_id}")
+                return bytes(cached)
+        code = await self.chain.code_bytes(code_id)
+        self.bytecode_cache.put(chain_id, code_id, code)
+        return code
 
-        elif target_chain in SupportedChains:
-            LOG.info("Chain which should be support")
-            if target_chain == SupportedChains.JUNO:
-                LOG.info(f"Running query against the Juno chain with Chain URL of {chain_url}")
-                query_raw = requests.get(f"{chain_url}/cosmwasm/wasm/v1/code/{code_id}").json()
-        else: 
-            LOG.info("Chain not supported")
-        return query_raw
+    async def query_code_id(self, chain_url: str, code_id: int, target_chain=SupportedChains.TERRA):
+        """query_code_id queries the `code_details` of a given code_id.
+        Deprecated, use query_code_info. The code info now comes from this Deployer's
+        chain adapter, so chain_url is ignored and target_chain only picks the shape of the result.
+
+        Args:
+            chain_url (str): Unused, the Deployer's own endpoints are queried
+            code_id (int): The code_id to query
+            target_chain (SupportedChains Enum, optional): The shape to return the details in. Defaults to SupportedChains.TERRA.
+
+        Returns:
+            Dict: `code_details`, as {"result": code info} for Terra or {"code_info": code info, "data": base64 code} otherwise
+        """
+        warnings.warn("query_code_id is deprecated, use query_code_info", DeprecationWarning, stacklevel=2)
+        code_info = await self.query_code_info(code_id)
+        if target_chain == SupportedChains.TERRA:
+            return {"result": code_info and {"code_id": int(code_info["code_id"]), "code_hash": code_info["data_hash"],
+                                             "creator": code_info["creator"]}}
+        return {"code_info": code_info, "data": base64.b64encode(await self.query_code_bytes(code_id)).decode()}
 
     async def query_code_bytecode(self, chain_url: str, code_id: int, target_chain=SupportedChains.TERRA):
-        """query_code_bytecode is used to make a REST request to the relevant chain_url 
-        to query the actualy bytecode of the stored code object for the given code_id 
+        """query_code_bytecode queries the bytecode of the stored code object for the given code_id.
+        Deprecated, use query_code_bytes. The code now comes from this Deployer's chain adapter,
+        so chain_url and target_chain are ignored.
 
         Args:
-            chain_url (str): The Chain Host of the chain to interact with e.g 
-            code_id (int): The code_id to query 
-            target_chain (SupportedChains Enum, optional): Only used when you wish to target a chain other than Terra. 
-                Each chain can have different methods or URLs to request the same info and this option decides which way to perform queries  Defaults to SupportedChains.TERRA.
+            chain_url (str): Unused, the Deployer's own endpoints are queried
+            code_id (int): The code_id to query
+            target_chain (SupportedChains Enum, optional): Unused, the Deployer's own chain family is used. Defaults to SupportedChains.TERRA.
 
         Returns:
             dict: Dictionary containing the byte_code in base64
         """
-        LOG.info(f"Query to be ran {code_id}")
+        warnings.warn("query_code_bytecode is deprecated, use query_code_bytes", DeprecationWarning, stacklevel=2)
+        return {"byte_code": base64.b64encode(await self.query_code_bytes(code_id)).decode()}
 
-        if target_chain == SupportedChains.TERRA:
-        
-            # TODO: This query is not cross-chain capable 
-            query_raw = requests.get(f"{chain_url}/terra/wasm/v1beta1/codes/{code_id}/byte_code").json()
-            LOG.info(query_raw)
-        elif target_chain in SupportedChains:
-            LOG.info("Chain which should be support")
-            if target_chain == SupportedChains.JUNO:
-                LOG.info(f"Running query against the Juno chain with Chain URL of {chain_url}")
-                query_raw = requests.get(f"{chain_url}/cosmwasm/wasm/v1/code/{code_id}").json()
-                # In order to maintain similar outputs, cut off everything but the datahere
-                query_raw = {
-                    "byte_code": query_raw["data"]
-                }
-        else: 
-            LOG.info("Chain not supported")
-        return query_raw
-        
+    async def query_code_infos(self, pagination_key: str = None, limit: int = 100):
+        """query_code_infos lists a page of the chain's code infos, without their code
 
+        Args:
+            pagination_key (str, optional): Where to start the page, as a base64 pagination key. Defaults to None, the first code.
+            limit (int, optional): Max code infos in the page. Defaults to 100.
+
+        Returns:
+            Tuple[list, Optional[str]]: The code infos and the key of the next page, None after the last page
+        """
+        params = {"pagination.limit": str(limit)}
+        if pagination_key:
+            params["pagination.key"] = pagination_key
+        listing = await self.endpoint_router.read(
+            lambda url: self.transport.get_json(urljoin(url, "/cosmwasm/wasm/v1/code"), params=params), hedge=False)
+        if "code_infos" not in listing:
+            raise Exception(listing.get("message") or f"Could not list the code infos of {self.async_client.chain_id}")
+        return listing["code_infos"], (listing.get("pagination") or {}).get("next_key")
+
+    async def code_checksum(self, code_id: int) -> str:
+        """code_checksum gets the sha256 of a stored code object's byte_code.
+        With a bytecode cache the code is only ever downloaded once, after which
+        the checksum is served from disk without touching the network.
+
+        Args:
+            code_id (int): The code_id to hash
+
+        Returns:
+            str: The sha256 of the code as lowercase hex
+        """
+        chain_id = self.async_client.chain_id
+        if self.bytecode_cache is not None:
+            checksum = self.bytecode_cache.checksum(chain_id, code_id)
+            if checksum:
+                LOG.debug(f"Using cached byte_code of code ID {code_id}")
+                return checksum
+            # Caching the download hashes it too
+            return self.bytecode_cache.put(chain_id, code_id, await self.chain.code_bytes(code_id))
+        return hashlib.sha256(await self.query_code_bytes(code_id)).hexdigest()
@@ -0,0 +1,313 @@
+"""Routing of LCD requests over several endpoints of a network, by their measured latency and health"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+
+import aiohttp
+from multidict import CIMultiDict
+from terra_sdk.client.lcd import AsyncLCDClient
+from terra_sdk.exceptions import LCDResponseError
+from terra_sdk.util.json import dict_to_data
+from terra_sdk.util.url import urljoin
+
+from capsule.lib.logging_handler import LOG
+
+# Weight of the newest sample in an endpoint's latency and error rate averages
+DEFAULT_EWMA_ALPHA = 0.3
+# Error rate above which an endpoint is only tried once every healthy one has failed
+DEFAULT_ERROR_THRESHOLD = 0.5
+# Seconds after its last failure that an unhealthy endpoint is given another chance
+DEFAULT_COOLDOWN = 30
+# Seconds to wait on a read before hedging it, until enough latencies are known to use their p95
+DEFAULT_HEDGE_DELAY = 0.5
+# Percentile of recent read latencies a read is hedged after
+DEFAULT_HEDGE_PERCENTILE = 95
+# Number of recent read latencies the hedge delay is worked out from
+DEFAULT_LATENCY_SAMPLES = 200
+# Fewest latencies needed before the percentile is trusted over DEFAULT_HEDGE_DELAY
+MIN_HEDGE_SAMPLES = 20
+# POSTs which only read from the chain and so can be retried on another endpoint
+READ_ONLY_POSTS = ("/cosmos/tx/v1beta1/simulate",)
+
+
+class NonJSONResponseError(LCDResponseError):
+    """Raised when an endpoint answers with a page which isn't JSON, such as a proxy's
+    error or maintenance page, which an LCD itself never sends whatever its status
+    """
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """Tell a failing endpoint apart from a bad request. Rate limits, server errors,
+    timeouts, dropped connections and non JSON pages from a proxy are the endpoint's fault,
+    while a 4xx such as a failing contract query would fail on any endpoint.
+
+    Args:
+        error (Exception): What the request raised
+
+    Returns:
+        bool: Whether another endpoint might succeed
+    """
+    if isinstance(error, NonJSONResponseError):
+        return True
+    # LCDResponseError is an OSError, so it is told apart by its status first
+    if isinstance(error, LCDResponseError):
+        return error.response.status >= 500 or error.response.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError, json.JSONDecodeError))
+
+
+class EndpointStats(object):
+    """EndpointStats holds the exponentially weighted moving averages
+    of one endpoint's latency and error rate
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.latency = None
+        self.error_rate = 0.0
+        self.failed_at = None
+
+    def record_latency(self, latency: float, alpha: float) -> None:
+        self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+
+    def record_success(self, latency: Optional[float], alpha: float) -> None:
+        if latency is not None:
+            self.record_latency(latency, alpha)
+        self.error_rate = (1 - alpha) * self.error_rate
+
+    def record_failure(self, alpha: float) -> None:
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.failed_at = time.monotonic()
+
+    def healthy(self, error_threshold: float, cooldown: float) -> bool:
+        return self.error_rate <= error_threshold or time.monotonic() - self.failed_at >= cooldown
+
+    def score(self) -> float:
+        """The expected seconds to get an answer, as a request failing with
+        probability p takes 1 / (1 - p) attempts on average. Endpoints never
+        used yet score 0 so each is tried once.
+        """
+        return (self.latency or 0.0) / max(1 - self.error_rate, 0.01)
+
+    def __repr__(self) -> str:
+        latency = "?" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"{self.url} ({latency}, {self.error_rate:.0%} errors)"
+
+
+class EndpointRouter(object):
+    """EndpointRouter spreads a network's requests over every endpoint it lists,
+    so one slow or rate limiting public node no longer slows down every command.
+
+    Each endpoint keeps an EWMA of its latency and error rate. Only hedgeable
+    reads, the small queries whose latency is comparable from one to the next,
+    are timed. Code downloads, block polls, simulations and writes opt out of
+    hedging and so never skew the latencies reads are ranked and hedged by,
+    though their failures still count against an endpoint's error rate.
+    Reads go to the healthy endpoint with the best expected latency
+    and fail over to the next best when an endpoint fails them, an endpoint
+    failing too often being skipped until a cooldown passes.
+
+    With `hedge_reads` a read still in flight after the p95 of recent read
+    latencies is sent to the next best endpoint too, the first answer winning
+    and the other request being cancelled. This ties tail latency to the
+    fastest endpoints instead of the slowest, for at most ~5% more reads.
+
+    Writes are never hedged and only fail over when no connection could be
+    made, as a broadcast which reached a node may already be in its mempool.
+    """
+
+    def __init__(self, urls: List[str], hedge_reads: bool = False,
+                 alpha: float = DEFAULT_EWMA_ALPHA,
+                 error_threshold: float = DEFAULT_ERROR_THRESHOLD,
+                 cooldown: float = DEFAULT_COOLDOWN,
+                 hedge_delay: float = DEFAULT_HEDGE_DELAY,
+                 hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 latency_samples: int = DEFAULT_LATENCY_SAMPLES) -> None:
+        """
+        Args:
+            urls (List[str]): The endpoints, in the order they are preferred until measured
+            hedge_reads (bool, optional): Hedge reads which outlast the p95 latency. Defaults to False.
+            alpha (float, optional): Weight of the newest sample in the averages. Defaults to DEFAULT_EWMA_ALPHA.
+            error_threshold (float, optional): Error rate making an endpoint unhealthy. Defaults to DEFAULT_ERROR_THRESHOLD.
+            cooldown (float, optional): Seconds an unhealthy endpoint is skipped for. Defaults to DEFAULT_COOLDOWN.
+            hedge_delay (float, optional): Seconds before hedging while few latencies are known. Defaults to DEFAULT_HEDGE_DELAY.
+            hedge_percentile (float, optional): Percentile of read latencies to hedge after. Defaults to DEFAULT_HEDGE_PERCENTILE.
+            latency_samples (int, optional): Number of recent hedgeable read latencies kept. Defaults to DEFAULT_LATENCY_SAMPLES.
+        """
+        if not urls:
+            raise ValueError("An EndpointRouter needs at least one endpoint")
+        self.endpoints = [EndpointStats(url) for url in dict.fromkeys(urls)]
+        self.hedge_reads = hedge_reads
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.default_hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.latencies = deque(maxlen=latency_samples)
+        self.hedged = 0
+
+    @property
+    def urls(self) -> tuple:
+        return tuple(endpoint.url for endpoint in self.endpoints)
+
+    def ranked(self) -> List[EndpointStats]:
+        """Order the endpoints to try a request on, healthy ones by their score
+        then unhealthy ones by how long ago they last failed
+        """
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy(self.error_threshold, self.cooldown)]
+        unhealthy = [endpoint for endpoint in self.endpoints if endpoint not in healthy]
+        return sorted(healthy, key=EndpointStats.score) + sorted(unhealthy, key=lambda endpoint: endpoint.failed_at)
+
+    def hedge_delay(self) -> float:
+        """Seconds a read is given before it is hedged, the chosen percentile of recent hedgeable read latencies"""
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return self.default_hedge_delay
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))]
+
+    async def _attempt(self, endpoint: EndpointStats, request: Callable[[str], Awaitable], sample: bool):
+        # Only requests which sample are timed, the others only count towards the error rate
+        started = time.monotonic()
+        try:
+            result = await request(endpoint.url)
+        except asyncio.CancelledError:
+            # A hedged read which lost still took at least this long
+            if sample:
+                endpoint.record_latency(time.monotonic() - started, self.alpha)
+            raise
+        except Exception as e:
+            if is_endpoint_failure(e):
+                endpoint.record_failure(self.alpha)
+            else:
+                # The endpoint answered, it was the request which was bad
+                endpoint.record_success(time.monotonic() - started if sample else None, self.alpha)
+            raise
+        latency = time.monotonic() - started if sample else None
+        endpoint.record_success(latency, self.alpha)
+        if sample:
+            self.latencies.append(latency)
+        return result
+
+    async def read(self, request: Callable[[str], Awaitable], hedge: bool = True):
+        """Perform a read on the best endpoint, failing over to the next best
+        and, when hedging, racing it against the next best once it is slow.
+
+        Args:
+            request (Callable[[str], Awaitable]): Coroutine function performing the read against an endpoint's url
+            hedge (bool, optional): Whether this read is hedgeable, being hedged when the router's hedge_reads
+                is set and timed. Pass False for slow or long running reads. Defaults to True.
+
+        Returns:
+            Any: What the first successful request returned
+        """
+        sample = hedge
+        hedge = hedge and self.hedge_reads
+        candidates = iter(self.ranked())
+        in_flight = {}
+
+        def launch() -> bool:
+            endpoint = next(candidates, None)
+            if endpoint is None:
+                return False
+            in_flight[asyncio.ensure_future(self._attempt(endpoint, request, sample=sample))] = endpoint
+            return True
+
+        launch()
+        error = None
+        try:
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, timeout=self.hedge_delay() if hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Only hedge once, a read already racing two endpoints just waits
+                    hedge = False
+                    if launch():
+                        self.hedged += 1
+                        LOG.debug(f"Hedging a read on {list(in_flight.values())[-1].url}")
+                    continue
+                finished = [(in_flight.pop(task), task, task.exception()) for task in done]
+                for endpoint, task, exception in finished:
+                    if exception is None:
+                        return task.result()
+                for endpoint, task, exception in finished:
+                    if not is_endpoint_failure(exception):
+                        raise exception
+                    error = exception
+                    LOG.debug(f"Read on {endpoint.url} failed, trying another endpoint: {error!r}")
+                if not in_flight:
+                    launch()
+            raise error
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def write(self, request: Callable[[str], Awaitable]):
+        """Perform a write on the best endpoint, only failing over to the next
+        when an endpoint couldn't be connected to and so never saw the write
+
+        Args:
+            request (Callable[[str], Awaitable]): Coroutine function performing the write against an endpoint's url
+
+        Returns:
+            Any: What the request returned
+        """
+        endpoints = self.ranked()
+        for endpoint in endpoints[:-1]:
+            try:
+                return await self._attempt(endpoint, request, sample=False)
+            except aiohttp.ClientConnectorError as e:
+                LOG.debug(f"Could not connect to {endpoint.url}, writing to another endpoint: {e!r}")
+        return await self._attempt(endpoints[-1], request, sample=False)
+
+
+class RoutedLCDClient(AsyncLCDClient):
+    """RoutedLCDClient is an AsyncLCDClient whose requests go through an
+    EndpointRouter, its `url` being the router's first endpoint.
+    GETs, tx searches and simulations are reads, every other POST is a write.
+    """
+
+    def __init__(self, router: EndpointRouter, **kwargs) -> None:
+        """
+        Args:
+            router (EndpointRouter): The router choosing which endpoint serves each request
+            **kwargs: Passed on to AsyncLCDClient, except for its url
+        """
+        super().__init__(url=router.urls[0], **kwargs)
+        self.router = router
+
+    async def _request(self, method: str, url: str, endpoint: str, **kwargs):
+        # Mirrors AsyncLCDClient._get and _post, against the url the router picked
+        async with self.session.request(method, urljoin(url, endpoint), **kwargs) as response:
+            try:
+                result = await response.json(content_type=None)
+            except json.JSONDecodeError:
+                raise NonJSONResponseError(message=str(response.reason), response=response)
+            if not 200 <= response.status < 299:
+                raise LCDResponseError(message=str(result) if method == "GET" else result.get("message"), response=response)
+        self.last_request_height = result.get("height") if result else self.last_request_height
+        return result
+
+    async def _get(self, endpoint: str, params=None):
+        if params and callable(getattr(params, "to_dict", None)):
+            params = params.to_dict()
+        return await self.router.read(lambda url: self._request("GET", url, endpoint, params=params))
+
+    async def _search(self, events: List[list], params=None):
+        # Mirrors AsyncLCDClient._search, which the gov API uses, as it requests self.url itself
+        actual_params = CIMultiDict()
+        for event in events:
+            if event[0] == "tx.height":
+                actual_params.add("events", f"{event[0]}={event[1]}")
+            else:
+                actual_params.add("events", f"{event[0]}='{event[1]}'")
+        for param in params or ():
+            actual_params.add(param, params[param])
+        return await self.router.read(lambda url: self._request("GET", url, "/cosmos/tx/v1beta1/txs", params=actual_params))
+
+    async def _post(self, endpoint: str, data: Optional[dict] = None):
+        payload = data and dict_to_data(data)
+        request = lambda url: self._request("POST", url, endpoint, json=payload)
+        if endpoint in READ_ONLY_POSTS:
+            return await self.router.read(request, hedge=False)
+        return await self.router.write(request)
@@ -0,0 +1,216 @@
+"""Simulation based gas estimation backed by a learned, persistent per-message cache"""
+import json
+import math
+import os
+import tempfile
+from typing import List, Optional
+
+from terra_sdk.core import Coins
+from terra_sdk.core.fee import Fee as StdFee
+from terra_sdk.core.wasm import (MsgExecuteContract, MsgInstantiateContract,
+                                 MsgStoreCode)
+
+from capsule.lib.config_handler import get_capsule_dir
+from capsule.lib.logging_handler import LOG
+
+DEFAULT_GAS_CACHE_FILE_NAME = "gas_cache.json"
+# Multiplier applied to simulated gas for a message variant we know nothing about yet
+DEFAULT_GAS_ADJUSTMENT = 1.5
+# The tightest multiplier the cache will ever settle on
+MIN_GAS_ADJUSTMENT = 1.1
+# Number of confirmed txs a variant needs before simulation is skipped for it
+MIN_SAMPLES_TO_SKIP_SIMULATION = 3
+# The sdk error code for a tx which ran out of gas
+OUT_OF_GAS_CODE = 11
+
+
+def _ceil_gas(gas: float) -> int:
+    # Round first so float noise like 110000.00000000001 doesn't cost an extra unit of gas
+    return math.ceil(round(gas, 3))
+
+
+def msg_cache_key(chain_id: str, msg) -> Optional[str]:
+    """Build the cache key (chain, contract/code id, message variant) for a msg.
+    The variant of an execute msg is its top level key, e.g `transfer` for `{"transfer": {...}}`.
+    Code uploads are never cached as their gas depends entirely on the artifact size.
+
+    Args:
+        chain_id (str): The chain the msg is sent to
+        msg (terra_sdk.core.msg.Msg): The msg
+
+    Returns:
+        Optional[str]: The key or None when the msg should not be cached
+    """
+    if isinstance(msg, MsgStoreCode):
+        return None
+    if isinstance(msg, MsgExecuteContract):
+        # terra_sdk renamed execute_msg to msg in later releases
+        execute_msg = getattr(msg, "execute_msg", getattr(msg, "msg", None))
+        variant = next(iter(execute_msg)) if isinstance(execute_msg, dict) and execute_msg else "execute"
+        return f"{chain_id}|{msg.contract}|execute:{variant}"
+    if isinstance(msg, MsgInstantiateContract):
+        return f"{chain_id}|{msg.code_id}|instantiate"
+    return f"{chain_id}||{type(msg).__name__}"
+
+
+class GasCache(object):
+    """GasCache is a small JSON backed store of what
+    each message variant simulated to and actually used on chain.
+
+    Each entry records:
+    - simulated: The gas a single msg of this variant last simulated to
+    - peak_used: The most gas a single msg of this variant has used on chain
+    - peak_ratio: The largest used / simulated ratio seen
+    - samples: The number of confirmed txs the entry has learned from
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path or os.path.join(get_capsule_dir(), DEFAULT_GAS_CACHE_FILE_NAME)
+        self._entries = None
+
+    @property
+    def entries(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, "r") as file:
+                    self._entries = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def record_simulation(self, key: str, simulated: int) -> None:
+        entry = self.entries.setdefault(key, {"simulated": 0, "peak_used": 0, "peak_ratio": 0, "samples": 0})
+        entry["simulated"] = simulated
+        self.save()
+
+    def record_usage(self, key: str, used: int) -> None:
+        entry = self.entries.setdefault(key, {"simulated": 0, "peak_used": 0, "peak_ratio": 0, "samples": 0})
+        entry["peak_used"] = max(entry["peak_used"], used)
+        if entry["simulated"]:
+            entry["peak_ratio"] = max(entry["peak_ratio"], used / entry["simulated"])
+        entry["samples"] += 1
+        self.save()
+
+    def forget(self, key: str) -> None:
+        if self.entries.pop(key, None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        """Write the cache atomically so an interrupted run can't corrupt it"""
+        directory = os.path.dirname(self.path)
+        with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as file:
+            json.dump(self.entries, file)
+        os.replace(file.name, self.path)
+
+
+class GasEstimator(object):
+    """GasEstimator turns msgs into fees.
+
+    Msg variants which have never been seen are simulated and padded with the
+    default gas adjustment. Once a variant has confirmed txs behind it the
+    adjustment tightens to the worst used / simulated ratio observed, and once
+    it has enough samples simulation is skipped entirely in favour of the peak
+    gas it has been seen to use.
+    """
+
+    def __init__(self, chain_id: str, gas_prices: Coins.Input, gas_adjustment: float = None,
+                 fee_denoms: List[str] = None, cache: GasCache = None) -> None:
+        """
+        Args:
+            chain_id (str): The chain the fees are for
+            gas_prices (Coins.Input): The gas prices to price the fees with
+            gas_adjustment (float, optional): Adjustment for unseen variants. Defaults to DEFAULT_GAS_ADJUSTMENT.
+            fee_denoms (List[str], optional): Only pay fees in these denoms. Defaults to every denom in gas_prices.
+            cache (GasCache, optional): The learned cache to use. Defaults to the cache in `~/.capsule`.
+        """
+        self.chain_id = chain_id
+        self.gas_prices = Coins(gas_prices) if gas_prices else Coins()
+        if fee_denoms:
+            self.gas_prices = self.gas_prices.filter(lambda coin: coin.denom in fee_denoms)
+        self.gas_adjustment = float(gas_adjustment or DEFAULT_GAS_ADJUSTMENT)
+        self.cache = cache or GasCache()
+
+    def _keys(self, msgs: list) -> Optional[List[str]]:
+        keys = [msg_cache_key(self.chain_id, msg) for msg in msgs]
+        return None if None in keys else keys
+
+    def adjustment_for(self, key: str) -> float:
+        """The multiplier to pad simulated gas with for a given key"""
+        entry = self.cache.get(key)
+        if not entry or not entry["samples"] or not entry["peak_ratio"]:
+            return self.gas_adjustment
+        return max(MIN_GAS_ADJUSTMENT, entry["peak_ratio"] * MIN_GAS_ADJUSTMENT)
+
+    def cached_gas(self, msgs: list) -> Optional[int]:
+        """Estimate gas for msgs purely from the cache
+
+        Returns:
+            Optional[int]: The gas limit, or None if any msg still needs simulating
+        """
+        keys = self._keys(msgs)
+        if not keys:
+            return None
+        gas = 0
+        for key in keys:
+            entry = self.cache.get(key)
+            if not entry or entry["samples"] < MIN_SAMPLES_TO_SKIP_SIMULATION:
+                return None
+            gas += entry["peak_used"] * MIN_GAS_ADJUSTMENT
+        return _ceil_gas(gas)
+
+    def gas_from_simulation(self, msgs: list, simulated: int) -> int:
+        """Turn the simulated gas of a tx into a gas limit, remembering the simulation
+        for later comparison against what the tx really used
+
+        Args:
+            msgs (list): The msgs in the simulated tx
+            simulated (int): The gas the simulation used
+
+        Returns:
+            int: The gas limit to use
+        """
+        keys = self._keys(msgs)
+        if not keys:
+            return _ceil_gas(simulated * self.gas_adjustment)
+        per_msg = simulated / len(msgs)
+        # Like record_result, only a tx of a single variant tells us what one msg of it simulates to,
+        # the average of a mixed tx would overwrite what each of its variants has learned
+        if len(set(keys)) == 1:
+            self.cache.record_simulation(keys[0], per_msg)
+        return _ceil_gas(sum(per_msg * self.adjustment_for(key) for key in keys))
+
+    def record_result(self, msgs: list, tx_result) -> None:
+        """Learn from a confirmed tx. Out of gas failures reset the variants involved
+        so they are simulated again next time.
+
+        Args:
+            msgs (list): The msgs which were in the tx
+            tx_result (BlockTxBroadcastResult): The confirmed result of the tx
+        """
+        keys = self._keys(msgs)
+        if not keys:
+            return
+        if tx_result.code == OUT_OF_GAS_CODE:
+            LOG.info(f"Tx {tx_result.txhash} ran out of gas, resetting learned gas for its msgs")
+            for key in set(keys):
+                self.cache.forget(key)
+            return
+        if tx_result.code or not tx_result.gas_used:
+            return
+        # Only a tx of a single variant tells us exactly what one msg of it uses
+        if len(set(keys)) == 1:
+            self.cache.record_usage(keys[0], int(tx_result.gas_used) / len(msgs))
+
+    def fee_for(self, gas: int) -> StdFee:
+        """Price a gas limit with the configured gas prices
+
+        Args:
+            gas (int): The gas limit
+
+        Returns:
+            StdFee: The fee
+        """
+        return StdFee(gas, self.gas_prices.mul(gas).to_int_ceil_coins())
@@ -0,0 +1,178 @@
+"""Gas price oracle with an on-disk TTL cache so commands don't wait on the FCD"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Mapping, Optional, Sequence
+
+import requests
+from terra_sdk.core import Coins
+
+from capsule.lib.config_handler import get_capsule_dir, network_urls
+from capsule.lib.logging_handler import LOG
+
+# Seconds cached gas prices are considered fresh for
+DEFAULT_GAS_PRICES_TTL = 300
+# Seconds to wait on the FCD before giving up on a fetch
+DEFAULT_GAS_PRICES_TIMEOUT = 5
+
+
+def is_gas_prices(payload) -> bool:
+    """Check a payload maps denoms to prices, e.g {"uluna": "0.15"}
+
+    Args:
+        payload (Any): The parsed body an FCD answered with
+
+    Returns:
+        bool: Whether it can be used as gas prices
+    """
+    if not isinstance(payload, dict) or not payload:
+        return False
+    for denom, price in payload.items():
+        if not isinstance(denom, str) or isinstance(price, bool) or not isinstance(price, (str, int, float)):
+            return False
+        try:
+            float(price)
+        except ValueError:
+            return False
+    return True
+
+
+class GasPriceOracle(object):
+    """GasPriceOracle hands out gas prices for a chain without making
+    the caller wait on the FCD whenever it can avoid it.
+
+    In order of preference the prices come from:
+    - The on-disk cache at `~/.capsule/cache/gas_prices/<chain>.json` when it is younger than the TTL
+    - The stale on-disk cache or the static `gas_prices` of the network config, while a refresh runs in the background
+    - A synchronous fetch from the FCD, only when nothing else is available
+
+    A fetch tries each of the network's FCDs in turn until one answers.
+    """
+
+    def __init__(self, chain_id: str, fcd_url: str = None, fallback: Coins.Input = None,
+                 ttl: int = DEFAULT_GAS_PRICES_TTL, cache_dir: str = None,
+                 timeout: int = DEFAULT_GAS_PRICES_TIMEOUT, fcd_urls: Sequence[str] = ()) -> None:
+        """
+        Args:
+            chain_id (str): The chain to get gas prices for
+            fcd_url (str, optional): The FCD to fetch prices from. Defaults to None.
+            fallback (Coins.Input, optional): Static prices to use when nothing is cached. Defaults to None.
+            ttl (int, optional): Seconds cached prices stay fresh. Defaults to DEFAULT_GAS_PRICES_TTL.
+            cache_dir (str, optional): Where to cache prices. Defaults to `~/.capsule/cache/gas_prices`.
+            timeout (int, optional): Seconds to wait on the FCD. Defaults to DEFAULT_GAS_PRICES_TIMEOUT.
+            fcd_urls (Sequence[str], optional): More FCDs to fall back on, after fcd_url. Defaults to none.
+        """
+        self.chain_id = chain_id
+        self.fcd_urls = tuple(dict.fromkeys(((fcd_url,) if fcd_url else ()) + tuple(fcd_urls)))
+        if isinstance(fallback, Mapping):
+            # Tables of the config are read only views which Coins doesn't recognise as a dict
+            fallback = dict(fallback)
+        self.fallback = {coin.denom: str(coin.amount) for coin in Coins(fallback)} if fallback else None
+        self.ttl = ttl
+        self.cache_file = os.path.join(cache_dir or get_capsule_dir("cache", "gas_prices"), f"{chain_id}.json")
+        self.timeout = timeout
+
+    @classmethod
+    def from_network(cls, chain_id: str, network: dict, cache_dir: str = None) -> "GasPriceOracle":
+        """Build an oracle from a network entry of the config
+
+        Args:
+            chain_id (str): The chain the network entry is for
+            network (dict): The network entry, using `chain_fcd_url`, `chain_fcd_urls`, `gas_prices` and `gas_prices_ttl`
+            cache_dir (str, optional): Where to cache prices. Defaults to `~/.capsule/cache/gas_prices`.
+
+        Returns:
+            GasPriceOracle: The oracle for the network
+        """
+        return cls(chain_id,
+                   fcd_urls=network_urls(network, "chain_fcd_url"),
+                   fallback=network.get("gas_prices"),
+                   ttl=network.get("gas_prices_ttl", DEFAULT_GAS_PRICES_TTL),
+                   cache_dir=cache_dir)
+
+    def get_gas_prices(self, cached_only: bool = False) -> Optional[dict]:
+        """Get gas prices for the chain, preferring anything local over the network.
+
+        Args:
+            cached_only (bool, optional): Never touch the FCD, returning whatever is available locally
+                or None. Useful for commands which don't send txs. Defaults to False.
+
+        Returns:
+            Optional[dict]: The gas prices as {denom: price}
+        """
+        cached = self._read_cache()
+        if cached and time.time() - cached["fetched_at"] < self.ttl:
+            return cached["gas_prices"]
+
+        prices = cached["gas_prices"] if cached else self.fallback
+        if cached_only:
+            return prices
+        if prices is not None:
+            self.refresh_in_background()
+            return prices
+
+        LOG.info(f"No cached gas prices for {self.chain_id}, fetching them from the FCD")
+        return self.refresh()
+
+    def refresh(self) -> dict:
+        """Fetch gas prices from the first FCD to answer and cache them
+
+        Returns:
+            dict: The fetched gas prices
+        """
+        if not self.fcd_urls:
+            raise ValueError(f"Network {self.chain_id} has no 'chain_fcd_url' or 'gas_prices' to get gas prices from")
+        for fcd_url in self.fcd_urls:
+            try:
+                gas_prices = self._fetch(fcd_url)
+                break
+            except (requests.RequestException, ValueError) as e:
+                if fcd_url == self.fcd_urls[-1]:
+                    raise
+                LOG.debug(f"Could not get gas prices from {fcd_url}, trying the next FCD: {e!r}")
+        self._write_cache(gas_prices)
+        return gas_prices
+
+    def _fetch(self, fcd_url: str) -> dict:
+        response = requests.get(f"{fcd_url}/v1/txs/gas_prices", timeout=self.timeout)
+        # An error body from a rate limited or failing FCD must never be cached as prices
+        response.raise_for_status()
+        gas_prices = response.json()
+        if not is_gas_prices(gas_prices):
+            raise ValueError(f"{fcd_url} answered with something other than gas prices: {gas_prices!r:.200}")
+        return gas_prices
+
+    def refresh_in_background(self) -> Optional[threading.Thread]:
+        """Refresh the cached gas prices on a background thread.
+        The thread is not a daemon so a short lived command still lets it finish writing.
+
+        Returns:
+            Optional[threading.Thread]: The refreshing thread or None when there is no FCD to refresh from
+        """
+        if not self.fcd_urls:
+            return None
+
+        def refresh_quietly():
+            try:
+                self.refresh()
+            except Exception as e:
+                LOG.debug(f"Background gas price refresh for {self.chain_id} failed: {e}")
+
+        thread = threading.Thread(target=refresh_quietly, name=f"gas-prices-{self.chain_id}")
+        thread.start()
+        return thread
+
+    def _read_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_file, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, gas_prices: dict) -> None:
+        # Write atomically as a background refresh may race a reader
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(self.cache_file), delete=False, suffix=".tmp") as file:
+            json.dump({"fetched_at": time.time(), "gas_prices": gas_prices}, file)
+        os.replace(file.name, self.cache_file)
@@ -20,4 +20,20 @@ def setup_logger(logger_name="capsule", extra_kwargs={}):
     logger.addHandler(handler)
     return logger
 
+
+def format_table(headers, rows):
+    """Lay rows out as a plain text table for logging
+
+    Args:
+        headers (list): The column headings
+        rows (list): Lists of cell values, one per column
+
+    Returns:
+        str: The table, one line per row with the headings first
+    """
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max([len(str(header))] + [len(row[column]) for row in rows]) for column, header in enumerate(headers)]
+    lines = [[str(header) for header in headers], ["-" * width for width in widths]] + rows
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip() for line in lines)
+
 LOG = setup_logger()
@@ -0,0 +1,180 @@
+"""Manifest driven deploys of many contracts, run as a dependency graph"""
+import asyncio
+import json
+import os
+import re
+from typing import Dict, List, Set
+
+import toml
+
+from capsule.lib.logging_handler import LOG
+
+# Matches `${contract.address}` and `${contract.code_id}` inside init msgs
+REFERENCE_PATTERN = re.compile(r"\$\{([A-Za-z0-9_-]+)\.(address|code_id)\}")
+REFERENCE_FIELDS = ("address", "code_id")
+
+
+def find_references(value) -> Set[str]:
+    """Find the names of every contract referenced anywhere inside an init msg
+
+    Args:
+        value (dict | list | str): The init msg, or any part of it
+
+    Returns:
+        Set[str]: The referenced contract names
+    """
+    if isinstance(value, dict):
+        return set().union(*[find_references(item) for item in value.values()])
+    if isinstance(value, list):
+        return set().union(*[find_references(item) for item in value])
+    if isinstance(value, str):
+        return {match.group(1) for match in REFERENCE_PATTERN.finditer(value)}
+    return set()
+
+
+def resolve_references(value, deployed: Dict[str, dict]):
+    """Substitute every `${name.field}` in an init msg with the deployed value.
+    A string which is nothing but a `${name.code_id}` reference becomes the code id as an int.
+
+    Args:
+        value (dict | list | str): The init msg, or any part of it
+        deployed (Dict[str, dict]): {name: {"address": str, "code_id": int}} of deployed contracts
+
+    Returns:
+        dict | list | str: The init msg with references resolved
+    """
+    if isinstance(value, dict):
+        return {key: resolve_references(item, deployed) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, deployed) for item in value]
+    if isinstance(value, str):
+        whole = REFERENCE_PATTERN.fullmatch(value)
+        if whole and whole.group(2) == "code_id":
+            return int(deployed[whole.group(1)]["code_id"])
+        return REFERENCE_PATTERN.sub(lambda match: str(deployed[match.group(1)][match.group(2)]), value)
+    return value
+
+
+def load_manifest(path: str) -> Dict[str, dict]:
+    """Read and validate a deploy manifest. A manifest is a toml file with one table per contract:
+
+        [contracts.token]
+        package = "artifacts/cw20_base.wasm"
+        init_msg = { name = "Token", symbol = "TKN", decimals = 6, initial_balances = [] }
+
+        [contracts.pair]
+        code_id = 5
+        init_msg = '{"token": "${token.address}"}'
+        label = "Token pair"
+        depends_on = ["token"]
+
+    Each contract needs either a `package` to store or an existing `code_id`. `init_msg`
+    may be a table or a JSON string. Referencing another contract in the init msg makes
+    it a dependency, `depends_on` adds any which aren't referenced.
+    Package paths are relative to the manifest.
+
+    Args:
+        path (str): The path to the manifest
+
+    Returns:
+        Dict[str, dict]: The contracts by name, each with its full set of `dependencies`
+    """
+    manifest = toml.load(path)
+    contracts = manifest.get("contracts")
+    if not contracts:
+        raise ValueError(f"Could not find any 'contracts' in manifest {path}")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for name, contract in contracts.items():
+        if bool(contract.get("package")) == bool(contract.get("code_id")):
+            raise ValueError(f"Contract '{name}' needs exactly one of 'package' or 'code_id'")
+        if contract.get("package"):
+            contract["package"] = os.path.join(base_dir, contract["package"])
+        init_msg = contract.get("init_msg", {})
+        contract["init_msg"] = json.loads(init_msg) if isinstance(init_msg, str) else init_msg
+        contract["dependencies"] = find_references(contract["init_msg"]) | set(contract.get("depends_on", []))
+        unknown = contract["dependencies"] - set(contracts)
+        if unknown:
+            raise ValueError(f"Contract '{name}' depends on unknown contracts {', '.join(sorted(unknown))}")
+
+    # Fail up front rather than deadlock on a cycle
+    deploy_order(contracts)
+    return contracts
+
+
+def deploy_order(contracts: Dict[str, dict]) -> List[List[str]]:
+    """Group contracts into waves, where each wave only depends on earlier ones
+
+    Args:
+        contracts (Dict[str, dict]): The contracts from load_manifest
+
+    Returns:
+        List[List[str]]: The waves, the number of them being the length of the critical path
+    """
+    remaining = {name: set(contract["dependencies"]) for name, contract in contracts.items()}
+    waves = []
+    while remaining:
+        wave = sorted(name for name, dependencies in remaining.items() if not dependencies)
+        if not wave:
+            raise ValueError(f"Manifest has a dependency cycle between {', '.join(sorted(remaining))}")
+        waves.append(wave)
+        for name in wave:
+            del remaining[name]
+        for dependencies in remaining.values():
+            dependencies.difference_update(wave)
+    return waves
+
+
+async def deploy_manifest(deployer, contracts: Dict[str, dict], upload_only: bool = False) -> Dict[str, dict]:
+    """Store and instantiate every contract of a manifest. Each step starts as soon as
+    its own prerequisites are done, so independent contracts are deployed concurrently
+    and the whole deploy takes as long as its critical path. A package shared by
+    several contracts is only stored once.
+
+    Args:
+        deployer (Deployer): The deployer to store and instantiate with
+        contracts (Dict[str, dict]): The contracts from load_manifest
+        upload_only (bool, optional): Only store code, skipping instantiation. Defaults to False.
+
+    Returns:
+        Dict[str, dict]: {name: {"code_id", "address"} or {"error"}} for every contract
+    """
+    stores = {}
+    deploys = {}
+    deployed = {}
+
+    def store(package):
+        if package not in stores:
+            stores[package] = asyncio.ensure_future(deployer.store_contract(os.path.basename(package), package))
+        return stores[package]
+
+    async def deploy(name):
+        contract = contracts[name]
+        # Only wait on our own prerequisites, everything else keeps running
+        code_id = await store(contract["package"]) if contract.get("package") else contract["code_id"]
+        deployed[name] = {"code_id": int(code_id)}
+        if upload_only:
+            return deployed[name]
+        for dependency in contract["dependencies"]:
+            try:
+                await deploys[dependency]
+            except Exception:
+                raise Exception(f"Dependency '{dependency}' failed to deploy")
+        init_msg = resolve_references(contract["init_msg"], deployed)
+        LOG.info(f"Instantiating {name} from code ID {code_id}")
+        deployed[name]["address"] = await deployer.instantiate_contract(
+            code_id, init_msg=init_msg, label=contract.get("label", f"{name} deployed with Capsule"))
+        return deployed[name]
+
+    for name in contracts:
+        deploys[name] = asyncio.ensure_future(deploy(name))
+    results = await asyncio.gather(*deploys.values(), return_exceptions=True)
+
+    address_map = {}
+    for name, result in zip(deploys, results):
+        if isinstance(result, Exception):
+            LOG.info(f"Deploying {name} failed: {result}")
+            address_map[name] = {"error": str(result)}
+        else:
+            address_map[name] = result
+    return address_map
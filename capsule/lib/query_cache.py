@@ -0,0 +1,120 @@
+"""Opt-in, height aware cache for smart contract queries"""
+import asyncio
+import copy
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Tuple
+
+from capsule.lib.logging_handler import LOG
+
+# Max number of query results held before the least recently used is evicted
+DEFAULT_QUERY_CACHE_SIZE = 1024
+# Seconds the last seen block height is trusted before asking the chain again,
+# 0 spends a block_info round trip on every hit, only saving the query itself
+DEFAULT_MAX_STALENESS = 0
+
+
+def canonical_query(query_msg) -> str:
+    """Serialize a query msg so that equivalent queries produce the same string
+
+    Args:
+        query_msg (dict | str): The query msg
+
+    Returns:
+        str: The query as compact JSON with sorted keys
+    """
+    if isinstance(query_msg, str):
+        query_msg = json.loads(query_msg)
+    return json.dumps(query_msg, sort_keys=True, separators=(",", ":"))
+
+
+class QueryCache(object):
+    """QueryCache remembers smart query results keyed by
+    (chain, contract address, canonical query JSON, block height).
+
+    A result can only be served for the height it was read at, so every entry
+    is dropped once the chain is seen at a new height. How often the height is
+    checked is the `max_staleness` knob: 0 checks before every query, so
+    each hit still costs a block_info round trip, N trusts the last seen height for N seconds and serves identical queries
+    from memory in the meantime. A bound can also be given per query, as the
+    `capsule serve` daemon does for each `capsule query --max-staleness`,
+    and a cache whose own max_staleness is None only serves such queries.
+    Results are copied in and out, so callers may mutate what they get back.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_QUERY_CACHE_SIZE,
+                 max_staleness: float = DEFAULT_MAX_STALENESS) -> None:
+        self.max_entries = max_entries
+        self.max_staleness = max_staleness
+        self.height = None
+        self.height_checked_at = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._height_request = None
+
+    def height_is_stale(self, max_staleness: float = None) -> bool:
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        return self.height is None or time.monotonic() - self.height_checked_at >= max_staleness
+
+    def set_height(self, height: int) -> None:
+        """Record the chain's current height, invalidating every entry read at an older one"""
+        if height != self.height:
+            LOG.debug(f"Chain moved from height {self.height} to {height}, invalidating {len(self._entries)} cached queries")
+            self._entries.clear()
+            self.height = height
+        self.height_checked_at = time.monotonic()
+
+    async def ensure_height(self, fetch_height: Callable[[], Awaitable[int]], max_staleness: float = None) -> None:
+        """Make sure the cached height is within max_staleness, calling fetch_height if not.
+        Concurrent callers share a single in flight fetch.
+
+        Args:
+            fetch_height (Callable[[], Awaitable[int]]): Coroutine function returning the latest height
+            max_staleness (float, optional): Seconds the height may be trusted for this call. Defaults to the cache's max_staleness.
+        """
+        if not self.height_is_stale(max_staleness):
+            return
+        if self._height_request is None:
+            self._height_request = asyncio.ensure_future(fetch_height())
+        request = self._height_request
+        try:
+            height = await request
+        finally:
+            if self._height_request is request:
+                self._height_request = None
+        self.set_height(height)
+
+    def _key(self, chain_id: str, contract_addr: str, query_msg, height: int) -> Tuple:
+        return (chain_id, contract_addr, canonical_query(query_msg), height)
+
+    def get(self, chain_id: str, contract_addr: str, query_msg) -> Tuple[bool, Any]:
+        """Look up a query at the current height
+
+        Returns:
+            Tuple[bool, Any]: Whether there was a hit and the cached result
+        """
+        key = self._key(chain_id, contract_addr, query_msg, self.height)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(self._entries[key])
+        self.misses += 1
+        return False, None
+
+    def put(self, chain_id: str, contract_addr: str, query_msg, result, height: int = None) -> None:
+        """Store a query result under the height it was read at. A result read before
+        the chain was seen at a newer height is dropped as it may already be stale.
+
+        Args:
+            height (int, optional): The height the query was sent at. Defaults to the current height.
+        """
+        height = self.height if height is None else height
+        if height != self.height:
+            return
+        key = self._key(chain_id, contract_addr, query_msg, height)
+        self._entries[key] = copy.deepcopy(result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
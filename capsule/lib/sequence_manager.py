@@ -0,0 +1,103 @@
+"""Local account-sequence tracking so one key can have many txs in flight"""
+import asyncio
+import re
+from typing import Optional, Tuple
+
+from capsule.lib.logging_handler import LOG
+
+# The sdk error code returned from CheckTx when a tx is signed with the wrong sequence
+SEQUENCE_MISMATCH_CODE = 32
+SEQUENCE_MISMATCH_PATTERN = re.compile(r"account sequence mismatch, expected (\d+)")
+
+
+def parse_sequence_mismatch(log: str) -> Optional[int]:
+    """Look for an "account sequence mismatch" error in a raw log or error message
+
+    Args:
+        log (str): The raw_log of a tx result or the text of an error
+
+    Returns:
+        Optional[int]: The sequence the node expected, or None if the log is not a sequence mismatch
+    """
+    match = SEQUENCE_MISMATCH_PATTERN.search(log or "")
+    return int(match.group(1)) if match else None
+
+
+class SequenceManager(object):
+    """SequenceManager hands out account sequences locally instead of
+    asking the LCD for them before every tx.
+
+    The account number and sequence are fetched once and the sequence is
+    then incremented for each tx signed. Callers hold `lock()` while they
+    reserve a sequence, sign and submit so txs reach the mempool in
+    sequence order, and release it before waiting on the tx to be included
+    in a block, which is what lets several txs from one key be in flight at once.
+    """
+
+    def __init__(self, wallet) -> None:
+        """
+        Args:
+            wallet (AsyncWallet): The wallet whose account sequence is managed
+        """
+        self.wallet = wallet
+        self.account_number = None
+        self.next_sequence = None
+        self._lock = None
+        self._loop = None
+
+    def lock(self) -> asyncio.Lock:
+        """Return the lock guarding reserve/sign/submit for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def resync(self, expected_sequence: int = None) -> None:
+        """Bring the local sequence back in line with the chain.
+        When the node told us which sequence it expected that is used directly,
+        otherwise the account is fetched from the LCD.
+
+        Args:
+            expected_sequence (int, optional): The sequence reported in a mismatch error. Defaults to None.
+        """
+        if expected_sequence is not None and self.account_number is not None:
+            self.next_sequence = expected_sequence
+        else:
+            account = await self.wallet.account_number_and_sequence()
+            self.account_number = int(account["account_number"])
+            self.next_sequence = int(account["sequence"])
+        LOG.debug(f"Resynced account {self.account_number} to sequence {self.next_sequence}")
+
+    async def peek(self) -> Tuple[int, int]:
+        """Get the sequence the next tx will be signed with without reserving it,
+        which is what the node checks a simulation against once every earlier tx
+        is in its mempool. Must be called while holding `lock()`
+
+        Returns:
+            Tuple[int, int]: The account number and the next sequence
+        """
+        if self.next_sequence is None:
+            await self.resync()
+        return self.account_number, self.next_sequence
+
+    async def reserve(self) -> Tuple[int, int]:
+        """Reserve the next sequence. Must be called while holding `lock()`
+
+        Returns:
+            Tuple[int, int]: The account number and the reserved sequence
+        """
+        if self.next_sequence is None:
+            await self.resync()
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        return self.account_number, sequence
+
+    def release(self, sequence: int) -> None:
+        """Hand back a reserved sequence whose tx never made it into the mempool.
+        Must be called while still holding `lock()` so no later sequence was reserved.
+
+        Args:
+            sequence (int): The sequence that was reserved
+        """
+        self.next_sequence = sequence
@@ -0,0 +1,113 @@
+"""Async sessions giving a Deployer for a configured network inside an already running event loop"""
+import asyncio
+
+from terra_sdk.client.lcd import AsyncLCDClient
+
+from capsule.lib.chains import chain_family
+from capsule.lib.config_handler import (get_config_file, get_networks,
+                                        network_urls, validate_network)
+from capsule.lib.credential_handler import read_mnemonic
+from capsule.lib.deployer import Deployer
+from capsule.lib.endpoint_router import EndpointRouter
+from capsule.lib.gas_estimator import DEFAULT_GAS_ADJUSTMENT
+from capsule.lib.gas_prices import GasPriceOracle
+from capsule.lib.transport import AsyncTransport
+
+
+class DeploySession(object):
+    """DeploySession builds a Deployer for a network of the config and releases
+    its connections when done, all from within the caller's event loop:
+
+        async with DeploySession("bombay-12") as deployer:
+            await deployer.query_contract(address, {"config": {}})
+
+    Unlike constructing a Deployer around an LCDClient, nothing here starts or
+    nests an event loop, so sessions can be opened inside an asyncio service and
+    any number of them can be used concurrently. Blocking setup, such as the
+    first fetch of a network's gas prices, runs in the loop's default executor.
+
+    Closing the session closes its transport, unless told not to so that one
+    transport can be shared between sessions.
+    """
+
+    def __init__(self, network: str, config_path: str = None, transport: AsyncTransport = None,
+                 close_transport: bool = True, cached_gas_prices: bool = False, **deployer_kwargs) -> None:
+        """
+        Args:
+            network (str): The name of the network in the config
+            config_path (str, optional): The config to read the network from. Defaults to the usual config.
+            transport (AsyncTransport, optional): The pooled transport to use. Defaults to a new AsyncTransport.
+            close_transport (bool, optional): Close the transport along with the session. Defaults to True.
+            cached_gas_prices (bool, optional): Only use gas prices already known locally, for sessions
+                which never send a tx. Defaults to False.
+            **deployer_kwargs: Passed on to the Deployer, e.g. query_cache, code_registry or an endpoint_router
+                to keep the endpoint stats of an earlier session
+        """
+        self.network = network
+        self.config_path = config_path
+        self.transport = transport or AsyncTransport()
+        self.close_transport = close_transport
+        self.cached_gas_prices = cached_gas_prices
+        self.deployer_kwargs = deployer_kwargs
+        self.network_info = None
+        self.deployer = None
+
+    @classmethod
+    async def open(cls, network: str, **kwargs) -> "DeploySession":
+        """Async factory returning a session which is ready to use, remember to close it
+
+        Args:
+            network (str): The name of the network in the config
+            **kwargs: See DeploySession.__init__
+
+        Returns:
+            DeploySession: The started session
+        """
+        session = cls(network, **kwargs)
+        await session.start()
+        return session
+
+    async def start(self) -> Deployer:
+        """Build the session's Deployer from the network's config entry
+
+        Returns:
+            Deployer: The Deployer for the network
+        """
+        networks = await get_networks(self.config_path)
+        if self.network not in networks:
+            raise ValueError(f"There is no network '{self.network}' in the config, the configured networks are: {', '.join(networks)}")
+        self.network_info = networks[self.network]
+        validate_network(self.network, self.network_info, get_config_file(filename=self.config_path))
+
+        deployer_kwargs = dict(self.deployer_kwargs)
+        # Sign with the mnemonic of the session's config unless given one
+        deployer_kwargs.setdefault("mnemonic", read_mnemonic(config_path=self.config_path))
+        deployer_kwargs.setdefault("target_chain", chain_family(self.network, self.network_info))
+        deployer_kwargs.setdefault("grpc_url", self.network_info.get("grpc_url"))
+        deployer_kwargs.setdefault("endpoint_router", EndpointRouter(
+            network_urls(self.network_info), hedge_reads=self.network_info.get("hedge_reads", False)))
+        oracle = GasPriceOracle.from_network(self.network, self.network_info)
+        gas_prices = await asyncio.get_running_loop().run_in_executor(None, oracle.get_gas_prices, self.cached_gas_prices)
+        self.deployer = Deployer(
+            client=AsyncLCDClient(
+                url=deployer_kwargs["endpoint_router"].urls[0],
+                chain_id=self.network,
+                gas_prices=gas_prices,
+                gas_adjustment=self.network_info.get("gas_adjustment", DEFAULT_GAS_ADJUSTMENT),
+                _create_session=False),
+            transport=self.transport,
+            **deployer_kwargs)
+        return self.deployer
+
+    async def close(self) -> None:
+        """Stop waiting on any txs still pending and release the session's connections"""
+        if self.deployer is not None:
+            await self.deployer.close(close_transport=self.close_transport)
+        elif self.close_transport:
+            await self.transport.close()
+
+    async def __aenter__(self) -> Deployer:
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
@@ -0,0 +1,111 @@
+"""Shared async HTTP transport used by the Deployer and friends."""
+import asyncio
+
+import aiohttp
+
+from capsule.lib.logging_handler import LOG
+
+# Total number of open connections the pool will hold across all hosts
+DEFAULT_CONNECTION_LIMIT = 100
+# Number of open connections allowed to any single LCD/FCD host
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 10
+# Seconds an idle connection is kept alive for reuse
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+# Seconds before any single request is abandoned
+DEFAULT_REQUEST_TIMEOUT = 60
+
+
+class AsyncTransport(object):
+    """AsyncTransport is a small wrapper around an aiohttp ClientSession
+    which gives every request made through it a pooled, keep-alive connection
+    with a per-host connection limit.
+
+    A ClientSession is bound to the event loop it was created on so the session
+    is created lazily and recreated whenever it is used from a new loop. A session
+    nobody closed is closed on its own loop as `asyncio.run` shuts that loop down,
+    and failing that as soon as a new loop replaces it.
+    Within a single loop every caller shares one pool, meaning concurrent
+    requests overlap and only the first request to a host pays for TCP/TLS setup.
+    """
+
+    def __init__(self,
+                 limit: int = DEFAULT_CONNECTION_LIMIT,
+                 limit_per_host: int = DEFAULT_CONNECTION_LIMIT_PER_HOST,
+                 keepalive_timeout: int = DEFAULT_KEEPALIVE_TIMEOUT,
+                 request_timeout: int = DEFAULT_REQUEST_TIMEOUT) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self._session = None
+        self._loop = None
+        self._closer = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session for the running event loop, creating it if needed
+
+        Returns:
+            aiohttp.ClientSession: A session sharing one connection pool
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            if self._session is not None and not self._session.closed:
+                await self._close_stale_session()
+            LOG.debug(f"Opening a new connection pool (limit={self.limit}, limit_per_host={self.limit_per_host})")
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                headers={"Accept": "application/json"})
+            self._loop = loop
+            self._closer = loop.create_task(self._close_at_shutdown(self._session))
+        return self._session
+
+    async def _close_at_shutdown(self, session: aiohttp.ClientSession) -> None:
+        # Parked until asyncio.run cancels the tasks left over as its loop shuts down,
+        # so the session's connections are released on the loop they belong to
+        try:
+            await asyncio.Event().wait()
+        finally:
+            if not session.closed:
+                await session.close()
+
+    async def _close_stale_session(self) -> None:
+        # The session's loop ended without shutting it down, closing it from here
+        # still releases its connector even if its sockets can't say goodbye
+        try:
+            await self._session.close()
+        except Exception as e:
+            LOG.debug(f"Could not close the connection pool of a finished event loop: {e!r}")
+
+    async def get_json(self, url: str, params: dict = None):
+        """Perform a GET request on the pooled session and parse the response as JSON.
+        Much like `requests.get(url).json()` the body is returned whatever the status code
+        so callers can inspect any error payload the node sent back.
+
+        Args:
+            url (str): The full url to request
+            params (dict, optional): Any query string parameters. Defaults to None.
+
+        Returns:
+            dict: The parsed JSON body
+        """
+        session = await self.get_session()
+        async with session.get(url, params=params) as response:
+            return await response.json(content_type=None)
+
+    async def close(self) -> None:
+        """Close the underlying session and release every pooled connection"""
+        if self._session is not None and not self._session.closed:
+            if self._loop is asyncio.get_running_loop():
+                await self._session.close()
+            else:
+                await self._close_stale_session()
+        if self._closer is not None:
+            self._closer.cancel()
+        self._session = None
+        self._loop = None
+        self._closer = None
@@ -0,0 +1,83 @@
+"""Helpers for verifying stored code objects against locally built artifacts"""
+from typing import Dict, List
+
+from capsule.lib.batching import fan_out
+from capsule.lib.logging_handler import LOG
+
+# Number of code objects downloaded at once when verifying many code ids
+DEFAULT_VERIFY_CONCURRENCY = 8
+
+
+def parse_code_ids(spec: str) -> List[int]:
+    """Parse a list of code ids such as `12,15,88-95` into the individual ids
+
+    Args:
+        spec (str): Comma separated code ids and inclusive ranges
+
+    Returns:
+        List[int]: The code ids in the order given, without duplicates
+    """
+    code_ids = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, end = (int(bound) for bound in part.split("-", 1))
+                if start > end:
+                    raise ValueError
+                code_ids.extend(range(start, end + 1))
+            else:
+                code_ids.append(int(part))
+        except ValueError:
+            raise ValueError(f"'{part}' is not a code id or a range of code ids like 88-95")
+    return list(dict.fromkeys(code_ids))
+
+
+def read_checksums(path: str) -> Dict[str, List[str]]:
+    """Index a `checksums.txt` as written by the rust optimizers, `<sha256>  <artifact>` per line
+
+    Args:
+        path (str): The path to the checksums file
+
+    Returns:
+        Dict[str, List[str]]: The artifact names by lowercase sha256
+    """
+    index = {}
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            checksum, artifact = line.split(maxsplit=1)
+            index.setdefault(checksum.lower(), []).append(artifact.strip())
+    return index
+
+
+async def verify_code_ids(deployer, code_ids: List[int], checksums: Dict[str, List[str]],
+                          concurrency: int = DEFAULT_VERIFY_CONCURRENCY) -> List[dict]:
+    """Hash many code objects concurrently, matching each against the checksums index
+
+    Args:
+        deployer (Deployer): The deployer of the chain holding the code, which fetches it the chain's way
+        code_ids (List[int]): The code ids to verify
+        checksums (Dict[str, List[str]]): The index from read_checksums
+        concurrency (int, optional): Max downloads in flight. Defaults to DEFAULT_VERIFY_CONCURRENCY.
+
+    Returns:
+        List[dict]: One {"code_id", "checksum", "artifacts", "error"} per code id, in the order given
+    """
+    async def verify(code_id):
+        return await deployer.code_checksum(code_id)
+
+    results = [None] * len(code_ids)
+    async for index, checksum, error in fan_out(code_ids, verify, concurrency):
+        if error is not None:
+            LOG.debug(f"Fetching code ID {code_ids[index]} failed: {error}")
+        results[index] = {
+            "code_id": code_ids[index],
+            "checksum": checksum,
+            "artifacts": checksums.get(checksum, []) if checksum else [],
+            "error": str(error) if error is not None else None,
+        }
+    return results
@@ -0,0 +1,124 @@
+"""A pool of HD derived sub-accounts ("lanes") so independent txs aren't serialized on one account sequence"""
+import asyncio
+import itertools
+from typing import List
+
+from terra_sdk.core import Coins
+from terra_sdk.core.bank import MsgSend
+
+from capsule.lib.batching import (DEFAULT_MAX_GAS_PER_TX,
+                                  DEFAULT_MAX_MSGS_PER_TX,
+                                  DEFAULT_MAX_TX_BYTES)
+from capsule.lib.logging_handler import LOG
+
+# Number of sub-accounts derived when no lane count is given
+DEFAULT_LANES = 4
+# HD index of the first lane, index 0 being the main account which funds the lanes
+FIRST_LANE_INDEX = 1
+
+
+class WalletPool(object):
+    """WalletPool derives `lanes` accounts from the deployer's mnemonic at
+    HD indexes 1..N and spreads independent executions over them round-robin.
+
+    Every lane has its own account sequence, so with N lanes up to N txs
+    can be signed and in the mempool at the same time on top of what a single
+    account can pipeline. The main account (index 0) never executes in the
+    pool, it only funds the lanes via `fund`.
+    """
+
+    def __init__(self, deployer, lanes: int = DEFAULT_LANES) -> None:
+        """
+        Args:
+            deployer (Deployer): The Deployer of the main account, its clients and transport are shared with every lane
+            lanes (int, optional): The number of sub-accounts to derive. Defaults to DEFAULT_LANES.
+        """
+        if lanes < 1:
+            raise ValueError("A wallet pool needs at least one lane")
+        self.deployer = deployer
+        self.lanes = [deployer.for_key_index(FIRST_LANE_INDEX + lane) for lane in range(lanes)]
+        self._next_lane = itertools.cycle(self.lanes)
+
+    def next_lane(self):
+        """Return the lane the next independent execution should go to"""
+        return next(self._next_lane)
+
+    async def lane_balance(self, lane) -> Coins:
+        client = await lane.get_async_client()
+        balance, _ = await client.bank.balance(lane.deployer.key.acc_address)
+        return balance
+
+    async def fund(self, amount: Coins.Input):
+        """Top every lane up to at least `amount` from the main account,
+        sending all of the transfers in a single tx
+
+        Args:
+            amount (Coins.Input): The balance each lane should hold, e.g "1000000uluna"
+
+        Returns:
+            BlockTxBroadcastResult: The result of the funding tx, or None if every lane already held enough
+        """
+        target = Coins(amount)
+        balances = await asyncio.gather(*[self.lane_balance(lane) for lane in self.lanes])
+        msgs = []
+        for lane, balance in zip(self.lanes, balances):
+            shortfall = Coins([
+                coin.sub(balance.get(coin.denom).amount) if balance.get(coin.denom) else coin
+                for coin in target
+            ]).filter(lambda coin: coin.amount > 0)
+            if shortfall.to_list():
+                LOG.info(f"Funding lane {lane.key_index} ({lane.deployer.key.acc_address}) with {shortfall}")
+                msgs.append(MsgSend(self.deployer.deployer.key.acc_address, lane.deployer.key.acc_address, shortfall))
+        if not msgs:
+            LOG.info(f"All {len(self.lanes)} lanes already hold {target}")
+            return None
+        return await self.deployer.send_msgs(msgs)
+
+    async def execute_contract(self, contract_addr: str, execute_msg, coins=[]):
+        """Execute a msg on a contract from the next lane
+
+        Args:
+            contract_addr (str): The contract to execute a msg on
+            execute_msg (dict): The msg to execute on the contract
+            coins (list, optional): Coins which may be needed for the execution tx. Defaults to [].
+
+        Returns:
+            BlockTxBroadcastResult: The execution result
+        """
+        return await self.next_lane().execute_contract(contract_addr, execute_msg, coins)
+
+    async def execute_batch(self, executions: list,
+                            max_msgs_per_tx: int = DEFAULT_MAX_MSGS_PER_TX,
+                            max_tx_bytes: int = DEFAULT_MAX_TX_BYTES,
+                            max_gas_per_tx: int = DEFAULT_MAX_GAS_PER_TX) -> List[dict]:
+        """Deal the executions out round-robin across the lanes, run every lane's
+        share as its own batch concurrently and merge the results back together.
+        Executions are assumed to be independent of one another as their order
+        across lanes is not preserved on chain.
+
+        Args:
+            executions (list): dicts of the form {"address": str, "msg": dict, "coins": str (optional)}
+            max_msgs_per_tx (int, optional): Max msgs per tx. Defaults to DEFAULT_MAX_MSGS_PER_TX.
+            max_tx_bytes (int, optional): Max encoded msg bytes per tx. Defaults to DEFAULT_MAX_TX_BYTES.
+            max_gas_per_tx (int, optional): Max simulated gas per tx. Defaults to DEFAULT_MAX_GAS_PER_TX.
+
+        Returns:
+            List[dict]: One result dict per execution, in the order they were provided
+        """
+        shares = {}
+        for index, execution in enumerate(executions):
+            lane = self.next_lane()
+            shares.setdefault(lane.key_index, (lane, []))[1].append((index, execution))
+
+        async def run_share(lane, share):
+            results = await lane.execute_batch([execution for _, execution in share],
+                                               max_msgs_per_tx=max_msgs_per_tx,
+                                               max_tx_bytes=max_tx_bytes,
+                                               max_gas_per_tx=max_gas_per_tx)
+            for (index, _), result in zip(share, results):
+                result["index"] = index
+                result["lane"] = lane.key_index
+            return results
+
+        lane_results = await asyncio.gather(*[run_share(lane, share) for lane, share in shares.values()])
+        return sorted((result for results in lane_results for result in results), key=lambda result: result["index"])
@@ -0,0 +1,53 @@
+import base64
+import gzip
+import hashlib
+
+import pytest
+
+from capsule.lib.artifacts import TX_SIZE_COST_PER_BYTE, prepare_wasm
+
+WASM = b"\x00asm\x01\x00\x00\x00" + b"\x00" * 4096
+
+
+class TestArtifacts():
+    def test_wasm_is_gzipped(self, tmp_path):
+        """test that a plain wasm is gzipped before encoding and
+        the checksum is taken over the uncompressed code
+        """
+        path = tmp_path / "contract.wasm"
+        path.write_bytes(WASM)
+
+        wasm = prepare_wasm(str(path))
+        assert gzip.decompress(base64.b64decode(wasm.wasm_b64)) == WASM
+        assert wasm.checksum == hashlib.sha256(WASM).hexdigest()
+        assert wasm.original_size == len(WASM)
+        assert wasm.compressed_size < wasm.original_size
+        assert wasm.gas_saved == (wasm.original_size - wasm.compressed_size) * TX_SIZE_COST_PER_BYTE
+
+    def test_gzipped_wasm_is_not_gzipped_again(self, tmp_path):
+        """test that an already gzipped artifact is uploaded as is"""
+        compressed = gzip.compress(WASM)
+        path = tmp_path / "contract.wasm.gz"
+        path.write_bytes(compressed)
+
+        wasm = prepare_wasm(str(path))
+        assert base64.b64decode(wasm.wasm_b64) == compressed
+        assert wasm.checksum == hashlib.sha256(WASM).hexdigest()
+        assert wasm.original_size == len(WASM)
+
+    def test_compression_is_optional_and_deterministic(self, tmp_path):
+        """test that the same artifact always encodes the same
+        and can be left uncompressed
+        """
+        path = tmp_path / "contract.wasm"
+        path.write_bytes(WASM)
+
+        assert prepare_wasm(str(path)) == prepare_wasm(str(path))
+        assert base64.b64decode(prepare_wasm(str(path), compress=False).wasm_b64) == WASM
+
+    def test_non_wasm_is_refused(self, tmp_path):
+        """test that a file which isn't wasm fails before any upload"""
+        path = tmp_path / "contract.wasm"
+        path.write_bytes(b"not wasm")
+        with pytest.raises(ValueError):
+            prepare_wasm(str(path))
@@ -0,0 +1,217 @@
+import asyncio
+import json
+from argparse import Namespace
+
+import pytest
+from terra_sdk.exceptions import LCDResponseError
+
+from capsule.lib.batching import (fan_out, map_msg_results, pack_msgs,
+                                  read_batch_file)
+from capsule.lib.deployer import Deployer
+
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+class FakeLog():
+    def __init__(self, events_by_type):
+        self.events_by_type = events_by_type
+
+
+class FakeTxResult():
+    def __init__(self, txhash="ABC", code=None, raw_log="", logs=None):
+        self.txhash = txhash
+        self.height = 10
+        self.code = code
+        self.raw_log = raw_log
+        self.logs = logs
+
+
+class FakeNode():
+    """Plays the account's wallet and the chain, checking every simulation and
+    broadcast against the committed sequence plus the txs in its mempool
+    """
+
+    def __init__(self, committed):
+        self.committed = committed
+        self.mempool = []
+        self.simulated = []
+
+    def check(self, sequence):
+        expected = self.committed + len(self.mempool)
+        if sequence != expected:
+            raise LCDResponseError(message=f"account sequence mismatch, expected {expected}, got {sequence}: incorrect account sequence",
+                                   response=Namespace(status=400))
+
+    async def account_number_and_sequence(self):
+        return {"account_number": 7, "sequence": self.committed}
+
+    async def create_tx(self, options):
+        self.check(options.sequence)
+        self.simulated.append(options.sequence)
+        return Namespace(auth_info=Namespace(fee=Namespace(gas_limit=100000 * len(options.msgs))))
+
+    async def create_and_sign_tx(self, options):
+        return Namespace(sequence=options.sequence)
+
+    async def broadcast_sync(self, tx):
+        self.check(tx.sequence)
+        self.mempool.append(tx.sequence)
+        return FakeTxResult(txhash=f"TX{tx.sequence}", code=0)
+
+    async def close(self):
+        pass
+
+
+class FakeTracker():
+    """Leaves every tx pending"""
+
+    def track(self, txhash):
+        return asyncio.get_running_loop().create_future()
+
+    async def close(self):
+        pass
+
+
+class FakeEstimator():
+    def cached_gas(self, msgs):
+        return None
+
+    def gas_from_simulation(self, msgs, gas):
+        return gas
+
+    def fee_for(self, gas):
+        return Namespace(gas_limit=gas)
+
+
+class TestBatching():
+    def test_pack_respects_msg_count(self):
+        """test that no chunk holds more than max_msgs msgs
+        and that msg order is preserved across chunks
+        """
+        chunks = pack_msgs(list(range(7)), max_msgs=3, size_of=lambda msg: 1)
+        assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_pack_respects_byte_size(self):
+        """test that a chunk is closed once the next
+        msg would take it over max_bytes
+        """
+        chunks = pack_msgs([40, 40, 40, 10], max_msgs=10, max_bytes=100, size_of=lambda msg: msg)
+        assert chunks == [[40, 40], [40, 10]]
+
+    def test_oversized_msg_gets_its_own_chunk(self):
+        """test that a msg bigger than max_bytes is
+        not dropped but sent on its own
+        """
+        chunks = pack_msgs([10, 500, 10], max_msgs=10, max_bytes=100, size_of=lambda msg: msg)
+        assert chunks == [[10], [500], [10]]
+
+    def test_map_results_from_logs(self):
+        """test that each msg is given the events
+        from its own log entry and its index in the whole batch
+        """
+        tx_result = FakeTxResult(logs=[FakeLog({"wasm": {"a": ["1"]}}), FakeLog({"wasm": {"a": ["2"]}})])
+        results = map_msg_results(tx_result, 2, offset=5)
+        assert [result["index"] for result in results] == [5, 6]
+        assert results[1]["events"] == {"wasm": {"a": ["2"]}}
+        assert all(result["success"] for result in results)
+
+    def test_map_results_from_failed_tx(self):
+        """test that a failed tx marks every msg
+        within it as failed with the tx error
+        """
+        tx_result = FakeTxResult(code=5, raw_log="out of gas")
+        results = map_msg_results(tx_result, 3)
+        assert not any(result["success"] for result in results)
+        assert results[2]["error"] == "out of gas"
+
+    def test_read_batch_file(self, tmp_path):
+        """test that a jsonl batch file is parsed
+        and lines missing an address are rejected
+        """
+        batch_file = tmp_path / "msgs.jsonl"
+        batch_file.write_text(json.dumps({"address": "terra1abc", "msg": {"increment": {}}}) + "\n\n")
+        assert read_batch_file(str(batch_file)) == [{"address": "terra1abc", "msg": {"increment": {}}}]
+
+        batch_file.write_text(json.dumps({"msg": {"increment": {}}}) + "\n")
+        with pytest.raises(ValueError):
+            read_batch_file(str(batch_file))
+
+    def test_fan_out_bounds_concurrency_and_orders(self):
+        """test that fan_out never runs more than `concurrency` workers at once,
+        can yield in input order and reports failures without stopping
+        """
+        in_flight = []
+        peak = []
+
+        async def worker(item):
+            in_flight.append(item)
+            peak.append(len(in_flight))
+            # Later items finish first
+            await asyncio.sleep(0.001 * (10 - item))
+            in_flight.remove(item)
+            if item == 3:
+                raise ValueError("bad query")
+            return item * 2
+
+        async def collect(ordered):
+            return [result async for result in fan_out(list(range(10)), worker, 4, ordered=ordered)]
+
+        results = asyncio.run(collect(ordered=True))
+        assert max(peak) <= 4
+        assert [index for index, _, _ in results] == list(range(10))
+        assert results[5][1] == 10
+        assert isinstance(results[3][2], ValueError)
+
+        results = asyncio.run(collect(ordered=False))
+        assert sorted(index for index, _, _ in results) == list(range(10))
+
+    def test_chunks_simulate_behind_pending_txs(self):
+        """test that a chunk simulated while an earlier chunk is still in the
+        mempool is simulated at the next local sequence, not the committed one,
+        and that a tx sent by someone else meanwhile is resynced past
+        """
+        node = FakeNode(committed=4)
+
+        async def run():
+            client = Namespace(url="http://lcd", chain_id="localterra", gas_prices="0.15uluna", gas_adjustment=1.5)
+            deployer = Deployer(client, mnemonic=TEST_MNEMONIC, gas_estimator=FakeEstimator())
+            deployer._async_deployer = node
+            deployer.chain = node
+            deployer.confirmation_tracker = FakeTracker()
+            try:
+                for chunk in (["a"], ["b", "c"]):
+                    for tx_msgs, fee in await deployer._fit_to_gas(chunk, 10 ** 6):
+                        await deployer.submit_msgs(tx_msgs, fee=fee)
+                # Another client sends a tx from the same account
+                node.mempool.append(None)
+                return await deployer.simulate_gas(["d"])
+            finally:
+                await deployer.close()
+
+        assert asyncio.run(run()) == 100000
+        assert node.simulated == [4, 5, 7]
+        assert node.mempool == [4, 5, None]
+
+    def test_pipelined_sends_simulate_behind_pending_txs(self):
+        """test that txs sent one after another without waiting on each other
+        each have their fee simulated behind the txs still in the mempool
+        """
+        node = FakeNode(committed=0)
+
+        async def run():
+            client = Namespace(url="http://lcd", chain_id="localterra", gas_prices="0.15uluna", gas_adjustment=1.5)
+            deployer = Deployer(client, mnemonic=TEST_MNEMONIC, gas_estimator=FakeEstimator())
+            deployer._async_deployer = node
+            deployer.chain = node
+            deployer.confirmation_tracker = FakeTracker()
+            try:
+                first = await deployer.submit_msgs(["a"])
+                rest = await asyncio.gather(*[deployer.submit_msgs([msg]) for msg in "bcd"])
+                return [first] + rest
+            finally:
+                await deployer.close()
+
+        assert len(asyncio.run(run())) == 4
+        # Every simulation matched the node's sequence, or it would have raised
+        assert len(node.simulated) == 4 and node.simulated[1] == 1
+        assert node.mempool == [0, 1, 2, 3]
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+
+from capsule.lib import builder
+from capsule.lib.builder import (BuildCache, build_contracts, build_key,
+                                 contract_optimizer_image, default_jobs,
+                                 optimized_build, optimizer_image,
+                                 source_files, workspace_contracts)
+
+
+def make_workspace(root):
+    (root / "contracts" / "token" / "src").mkdir(parents=True)
+    (root / "target").mkdir()
+    (root / "Cargo.toml").write_text("[workspace]\nmembers = [\"contracts/*\"]\n")
+    (root / "Cargo.lock").write_text("# lock\n")
+    (root / "contracts" / "token" / "Cargo.toml").write_text("[package]\nname = \"token\"\n")
+    (root / "contracts" / "token" / "src" / "lib.rs").write_text("pub fn a() {}\n")
+    (root / "target" / "junk.rs").write_text("ignored\n")
+    (root / "README.md").write_text("not a build input\n")
+
+
+class TestBuilder():
+    def test_source_files(self, tmp_path):
+        """test that only build inputs outside of target and artifacts are hashed"""
+        make_workspace(tmp_path)
+        assert source_files(str(tmp_path)) == [
+            "Cargo.lock",
+            "Cargo.toml",
+            os.path.join("contracts", "token", "Cargo.toml"),
+            os.path.join("contracts", "token", "src", "lib.rs"),
+        ]
+
+    def test_build_key_tracks_inputs(self, tmp_path):
+        """test that the key only changes when a build input or the optimizer changes"""
+        make_workspace(tmp_path)
+        key = build_key(str(tmp_path), command=["optimizer:1"])
+        (tmp_path / "README.md").write_text("still not a build input\n")
+        assert build_key(str(tmp_path), command=["optimizer:1"]) == key
+        assert build_key(str(tmp_path), command=["optimizer:2"]) != key
+        (tmp_path / "contracts" / "token" / "src" / "lib.rs").write_text("pub fn b() {}\n")
+        assert build_key(str(tmp_path), command=["optimizer:1"]) != key
+
+    def test_unchanged_sources_skip_the_optimizer(self, tmp_path, monkeypatch):
+        """test that a second build of unchanged sources restores the cached artifacts
+        without running the optimizer, and that rebuild forces it to run
+        """
+        workspace = tmp_path / "ws"
+        workspace.mkdir()
+        make_workspace(workspace)
+        runs = []
+
+        def fake_optimizer(contract_dir, command=None):
+            runs.append(contract_dir)
+            os.makedirs(os.path.join(contract_dir, "artifacts"), exist_ok=True)
+            with open(os.path.join(contract_dir, "artifacts", "token.wasm"), "wb") as file:
+                file.write(b"\x00asm")
+            with open(os.path.join(contract_dir, "artifacts", "checksums.txt"), "w") as file:
+                file.write("abc  token.wasm\n")
+            return True
+
+        monkeypatch.setattr(builder, "run_optimizer", fake_optimizer)
+        cache = BuildCache(str(tmp_path / "cache"))
+        (tmp_path / "cache").mkdir()
+
+        assert optimized_build(str(workspace), cache=cache)
+        os.remove(workspace / "artifacts" / "token.wasm")
+        assert optimized_build(str(workspace), cache=cache)
+        assert len(runs) == 1
+        assert (workspace / "artifacts" / "token.wasm").read_bytes() == b"\x00asm"
+
+        assert optimized_build(str(workspace), rebuild=True, cache=cache)
+        assert len(runs) == 2
+
+    def test_cache_keeps_the_newest_builds(self, tmp_path):
+        """test that the oldest builds are evicted past max_entries"""
+        artifacts = tmp_path / "artifacts"
+        artifacts.mkdir()
+        (artifacts / "checksums.txt").write_text("abc  token.wasm\n")
+        (artifacts / "token.wasm").write_bytes(b"\x00asm")
+        (tmp_path / "cache").mkdir()
+        cache = BuildCache(str(tmp_path / "cache"), max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, str(artifacts))
+            os.utime(tmp_path / "cache" / key, (ord(key), ord(key)))
+        cache.evict()
+        assert sorted(os.listdir(tmp_path / "cache")) == ["b", "c"]
+
+    def test_cache_skips_stale_artifacts(self, tmp_path):
+        """test that wasm left in artifacts by an earlier build isn't cached with this one"""
+        artifacts = tmp_path / "artifacts"
+        artifacts.mkdir()
+        (artifacts / "checksums.txt").write_text("abc  token.wasm\n")
+        (artifacts / "token.wasm").write_bytes(b"\x00asm")
+        (artifacts / "removed_contract.wasm").write_bytes(b"\x00asm")
+        (tmp_path / "cache").mkdir()
+        cache = BuildCache(str(tmp_path / "cache"))
+        cache.put("a", str(artifacts))
+        assert sorted(os.listdir(tmp_path / "cache" / "a")) == ["checksums.txt", "token.wasm"]
+
+    def test_workspace_contracts(self, tmp_path):
+        """test that only cdylib members of the workspace are treated as contracts"""
+        (tmp_path / "Cargo.toml").write_text('[workspace]\nmembers = ["contracts/*", "packages/*"]\nexclude = ["contracts/old"]\n')
+        for member, crate_type in (("contracts/pair", '["cdylib", "rlib"]'), ("contracts/token", '["cdylib"]'),
+                                   ("contracts/old", '["cdylib"]'), ("packages/shared", '["rlib"]')):
+            (tmp_path / member).mkdir(parents=True)
+            (tmp_path / member / "Cargo.toml").write_text(f'[package]\nname = "x"\n[lib]\ncrate-type = {crate_type}\n')
+        assert workspace_contracts(str(tmp_path)) == [os.path.join("contracts", "pair"), os.path.join("contracts", "token")]
+        assert workspace_contracts(str(tmp_path / "contracts" / "pair")) == []
+
+    def test_contracts_build_in_parallel(self, tmp_path, monkeypatch, caplog):
+        """test that contracts build concurrently with prefixed logs
+        and their wasm is gathered under one checksums file
+        """
+        def fake_command(contract_dir, member, output_dir):
+            name = os.path.basename(member)
+            return ["sh", "-c", f"echo built; printf '\\0asm{name}' > {output_dir}/{name}.wasm"]
+
+        # Every build waits for the others to start, so they can only finish if all run at once
+        started = threading.Barrier(3, timeout=5)
+        lock = threading.Lock()
+        running = {"now": 0, "most": 0}
+        stream_command = builder.stream_command
+
+        def counted_stream_command(command, cwd, prefix):
+            with lock:
+                running["now"] += 1
+                running["most"] = max(running["most"], running["now"])
+            try:
+                started.wait()
+                return stream_command(command, cwd, prefix)
+            finally:
+                with lock:
+                    running["now"] -= 1
+
+        monkeypatch.setattr(builder, "contract_optimize_command", fake_command)
+        monkeypatch.setattr(builder, "stream_command", counted_stream_command)
+        contracts = ["contracts/a", "contracts/b", "contracts/c"]
+        with caplog.at_level(logging.INFO, logger="capsule"):
+            assert build_contracts(str(tmp_path), contracts, jobs=3)
+        assert running["most"] == 3
+        assert "[b] built" in caplog.text
+
+        lines = (tmp_path / "artifacts" / "checksums.txt").read_text().splitlines()
+        assert [line.split("  ")[1] for line in lines] == ["a.wasm", "b.wasm", "c.wasm"]
+        assert lines[0].split("  ")[0] == hashlib.sha256(b"\0asma").hexdigest()
+
+    def test_parallel_builds_are_opt_in(self, tmp_path, monkeypatch):
+        """test that a workspace is built by the workspace optimizer
+        unless per contract builds are asked for
+        """
+        (tmp_path / "Cargo.toml").write_text('[workspace]\nmembers = ["contracts/*"]\n')
+        for member in ("a", "b"):
+            (tmp_path / "contracts" / member).mkdir(parents=True)
+            (tmp_path / "contracts" / member / "Cargo.toml").write_text('[package]\nname = "x"\n[lib]\ncrate-type = ["cdylib"]\n')
+        builds = []
+        monkeypatch.setattr(builder, "run_optimizer", lambda contract_dir: builds.append("workspace") or True)
+        monkeypatch.setattr(builder, "build_contracts",
+                            lambda contract_dir, contracts, jobs: builds.append(contracts) or True)
+        monkeypatch.setattr(BuildCache, "put", lambda self, key, artifacts_dir: None)
+        cache = BuildCache(str(tmp_path / "cache"))
+
+        assert optimized_build(str(tmp_path), cache=cache)
+        assert optimized_build(str(tmp_path), cache=cache, parallel=True)
+        assert builds == ["workspace", [os.path.join("contracts", "a"), os.path.join("contracts", "b")]]
+
+    def test_contract_optimizer_matches_the_workspace_optimizer(self, tmp_path, monkeypatch):
+        """test that contracts built one at a time use the optimizer version
+        of the workspace's own optimize script
+        """
+        monkeypatch.setattr(builder, "is_arm", lambda: False)
+        (tmp_path / "Cargo.toml").write_text('[workspace]\nmembers = ["contracts/*"]\n'
+                                             '[workspace.metadata.scripts]\noptimize = """docker run --rm -v "$(pwd)":/code '
+                                             'cosmwasm/workspace-optimizer:0.12.6"""\n')
+        assert optimizer_image(str(tmp_path)) == "cosmwasm/workspace-optimizer:0.12.6"
+        assert contract_optimizer_image(str(tmp_path)) == "cosmwasm/rust-optimizer:0.12.6"
+        assert builder.contract_optimize_command(str(tmp_path), "contracts/a", "/out")[-2:] == [
+            "cosmwasm/rust-optimizer:0.12.6", "./contracts/a"]
+
+        (tmp_path / "Cargo.toml").write_text('[workspace]\nmembers = ["contracts/*"]\n')
+        assert contract_optimizer_image(str(tmp_path)) == "cosmwasm/rust-optimizer:0.12.5"
+
+        monkeypatch.setattr(builder, "is_arm", lambda: True)
+        assert contract_optimizer_image(str(tmp_path)) == "cosmwasm/rust-optimizer-arm64:0.12.5"
+
+    def test_failed_contract_fails_the_build(self, tmp_path, monkeypatch):
+        """test that one failing contract fails the whole build"""
+        monkeypatch.setattr(builder, "contract_optimize_command",
+                            lambda contract_dir, member, output_dir: ["sh", "-c", "exit 1" if member == "b" else "true"])
+        assert not build_contracts(str(tmp_path), ["a", "b"], jobs=2)
+
+    def test_contract_without_wasm_fails_the_build(self, tmp_path, monkeypatch, caplog):
+        """test that a contract whose optimizer run wrote no wasm fails the build by name"""
+        def fake_command(contract_dir, member, output_dir):
+            return ["sh", "-c", "true" if member == "b" else f"printf '\\0asm' > {output_dir}/{member}.wasm"]
+
+        monkeypatch.setattr(builder, "contract_optimize_command", fake_command)
+        with caplog.at_level(logging.INFO, logger="capsule"):
+            assert not build_contracts(str(tmp_path), ["a", "b"], jobs=2)
+        assert "produced no wasm for b" in caplog.text
+        assert not (tmp_path / "artifacts" / "checksums.txt").exists()
+
+    def test_default_jobs(self):
+        """test that the pool never exceeds the number of builds and has at least one slot"""
+        assert default_jobs(1) == 1
+        assert 1 <= default_jobs(64) <= 64
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+import time
+from argparse import Namespace
+
+from capsule.lib.bytecode_cache import BytecodeCache
+from capsule.lib.deployer import Deployer
+
+CODE = b"\x00asm" + b"\x01" * 96
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+class TestBytecodeCache():
+    def test_put_checksum_and_open(self, tmp_path):
+        """test that cached code comes back byte for byte through mmap
+        and its checksum is served without reading the code
+        """
+        cache = BytecodeCache(str(tmp_path))
+        assert cache.checksum("columbus-5", 3) is None
+        with cache.open("columbus-5", 3) as code:
+            assert code is None
+
+        checksum = cache.put("columbus-5", 3, CODE)
+        assert checksum == hashlib.sha256(CODE).hexdigest()
+        assert cache.checksum("columbus-5", 3) == checksum
+        assert cache.checksum("bombay-12", 3) is None
+        with cache.open("columbus-5", 3) as code:
+            assert hashlib.sha256(code).hexdigest() == checksum
+            assert code[:4] == b"\x00asm"
+
+    def test_least_recently_used_is_evicted(self, tmp_path):
+        """test that once the cache is over its size the
+        code used longest ago is evicted first
+        """
+        cache = BytecodeCache(str(tmp_path), max_bytes=len(CODE) * 2)
+        cache.put("columbus-5", 1, CODE)
+        cache.put("columbus-5", 2, CODE)
+        # Make 1 the most recently used, leaving 2 to be evicted
+        old = time.time() - 60
+        os.utime(cache._path("columbus-5", 2, ".wasm"), (old, old))
+        os.utime(cache._path("columbus-5", 1, ".wasm"), (old - 60, old - 60))
+        cache.checksum("columbus-5", 1)
+
+        cache.put("juno-1", 3, CODE)
+        assert cache.checksum("columbus-5", 1)
+        assert cache.checksum("columbus-5", 2) is None
+        assert cache.checksum("juno-1", 3)
+
+    def test_forget(self, tmp_path):
+        """test that a forgotten code object is gone"""
+        cache = BytecodeCache(str(tmp_path))
+        cache.put("localterra", 1, CODE)
+        cache.forget("localterra", 1)
+        assert cache.checksum("localterra", 1) is None
+
+    def test_missing_checksum_is_rehashed(self, tmp_path):
+        """test that an entry which lost its sha256 is hashed again
+        from the cached code instead of being downloaded again
+        """
+        cache = BytecodeCache(str(tmp_path))
+        checksum = cache.put("localterra", 1, CODE)
+        os.remove(cache._path("localterra", 1, ".sha256"))
+
+        assert cache.checksum("localterra", 1) == checksum
+        with open(cache._path("localterra", 1, ".sha256")) as file:
+            assert file.read().strip() == checksum
+
+    def test_deployer_reads_code_back_from_cache(self, tmp_path):
+        """test that query_code_bytes only downloads a code object once"""
+        downloads = []
+
+        class FakeChain():
+            async def code_bytes(self, code_id):
+                downloads.append(code_id)
+                return CODE
+
+            async def close(self):
+                pass
+
+        async def run():
+            client = Namespace(url="http://lcd", chain_id="localterra",
+                               gas_prices="0.15uluna", gas_adjustment=1.5)
+            deployer = Deployer(client=client, mnemonic=TEST_MNEMONIC,
+                                bytecode_cache=BytecodeCache(str(tmp_path)))
+            deployer.chain = FakeChain()
+            assert await deployer.query_code_bytes(7) == CODE
+            assert await deployer.query_code_bytes(7) == CODE
+            assert await deployer.code_checksum(7) == hashlib.sha256(CODE).hexdigest()
+
+        asyncio.run(run())
+        assert downloads == [7]
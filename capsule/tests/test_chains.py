@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import json
+import socket
+import struct
+from argparse import Namespace
+
+import pytest
+from grpclib.server import Server
+from terra_proto.cosmos.base.abci.v1beta1 import TxResponse
+from terra_proto.cosmos.tx.v1beta1 import (BroadcastMode,
+                                           BroadcastTxResponse,
+                                           ServiceBase)
+from terra_proto.cosmwasm.wasm.v1 import (AccessConfig, AccessType,
+                                          CodeInfoResponse, QueryBase,
+                                          QueryCodeResponse,
+                                          QueryCodesResponse,
+                                          QuerySmartContractStateResponse)
+from terra_sdk.core import Coins
+from terra_sdk.core.fee import Fee
+from terra_sdk.core.tx import AuthInfo, Tx, TxBody
+
+from capsule.lib.chains import (SupportedChains, chain_family,
+                                make_chain_adapter)
+from capsule.lib.chains.grpc_adapter import GrpcAdapter, parse_grpc_url
+from capsule.lib.chains.lcd_adapter import LcdAdapter, TerraLcdAdapter
+from capsule.lib.deployer import Deployer
+
+WASM = b"\x00asm code"
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+class FakeTransport():
+    """Serves code from memory, by the path it was asked for.
+    Only code ids 5 and 9 are stored, as on a chain whose ids have gaps
+    """
+
+    async def get_json(self, url, params=None):
+        if url.endswith("/terra/wasm/v1beta1/codes/5/byte_code"):
+            return {"byte_code": base64.b64encode(WASM).decode()}
+        if url.endswith("/terra/wasm/v1beta1/codes/5"):
+            return {"code_info": {"code_id": "5", "code_hash": base64.b64encode(bytes.fromhex("ab" * 32)).decode(), "creator": "terra1creator"}}
+        if url.endswith("/cosmwasm/wasm/v1/code/5"):
+            return {"code_info": {"code_id": "5"}, "data": base64.b64encode(WASM).decode()}
+        if url.endswith("/cosmwasm/wasm/v1/code") and params.get("pagination.limit") == "1":
+            # Listings seek to the first stored code at or after the key
+            start = struct.unpack(">Q", base64.b64decode(params["pagination.key"]))[0]
+            code_ids = [code_id for code_id in (5, 9) if code_id >= start][:1]
+            return {"code_infos": [{"code_id": str(code_id), "creator": "juno1creator"} for code_id in code_ids]}
+        return {"code": 5, "message": "not found"}
+
+
+class FakeQuery(QueryBase):
+    async def smart_contract_state(self, request):
+        query = json.loads(request.query_data)
+        return QuerySmartContractStateResponse(data=json.dumps({"address": request.address, "query": query}).encode())
+
+    async def codes(self, request):
+        code_id = struct.unpack(">Q", request.pagination.key)[0]
+        permission = AccessConfig(permission=AccessType.ACCESS_TYPE_ONLY_ADDRESS, address="terra1creator")
+        return QueryCodesResponse(code_infos=[CodeInfoResponse(code_id=code_id, creator="terra1creator", data_hash=bytes.fromhex("ab" * 32),
+                                                               instantiate_permission=permission)])
+
+    async def code(self, request):
+        return QueryCodeResponse(code_info=CodeInfoResponse(code_id=request.code_id), data=WASM)
+
+
+class FakeTxService(ServiceBase):
+    def __init__(self):
+        self.broadcasts = []
+
+    async def broadcast_tx(self, request):
+        self.broadcasts.append((Tx.from_bytes(request.tx_bytes).body.memo, request.mode))
+        return BroadcastTxResponse(tx_response=TxResponse(txhash="ABC", code=0, raw_log="[]"))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_client():
+    # Code downloads only need the LCD's url
+    return Namespace(url="http://lcd", chain_id="localterra")
+
+
+class TestChains():
+    def test_chain_family(self):
+        """test that a network's family comes from its config
+        or else its name, defaulting to Terra
+        """
+        assert chain_family("juno-1") == SupportedChains.JUNO
+        assert chain_family("uni-5") == SupportedChains.JUNO
+        assert chain_family("osmo-test-4") == SupportedChains.OSMOSIS
+        assert chain_family("columbus-5") == SupportedChains.TERRA
+        assert chain_family("mainnet", {"chain_family": "Osmosis"}) == SupportedChains.OSMOSIS
+        with pytest.raises(ValueError, match="unknown chain_family"):
+            chain_family("mainnet", {"chain_family": "solana"})
+
+    def test_make_chain_adapter(self):
+        """test that each family gets its LCD adapter
+        unless the network has a gRPC endpoint
+        """
+        client = make_client()
+        assert type(make_chain_adapter(SupportedChains.TERRA, client, FakeTransport())) is TerraLcdAdapter
+        assert type(make_chain_adapter(SupportedChains.JUNO, client, FakeTransport())) is LcdAdapter
+        assert isinstance(make_chain_adapter(SupportedChains.JUNO, client, FakeTransport(), grpc_url="localhost:9090"), GrpcAdapter)
+
+    def test_lcd_code_bytes(self):
+        """test that Terra's byte_code endpoint and the cosmwasm
+        code endpoint both give back the raw wasm
+        """
+        client = make_client()
+        assert asyncio.run(TerraLcdAdapter(client, FakeTransport()).code_bytes(5)) == WASM
+        assert asyncio.run(LcdAdapter(client, FakeTransport()).code_bytes(5)) == WASM
+        with pytest.raises(Exception, match="not found"):
+            asyncio.run(LcdAdapter(client, FakeTransport()).code_bytes(6))
+
+    def test_lcd_code_info(self):
+        """test that code info is looked up by seeking to the code id, even where code ids
+        have gaps, and that Terra's is read from the same API version as its code
+        """
+        client = make_client()
+        adapter = LcdAdapter(client, FakeTransport())
+        assert asyncio.run(adapter.code_info(9)) == {"code_id": "9", "creator": "juno1creator"}
+        assert asyncio.run(adapter.code_info(7)) is None
+        assert asyncio.run(TerraLcdAdapter(client, FakeTransport()).code_info(5)) == {
+            "code_id": "5", "creator": "terra1creator", "data_hash": "AB" * 32, "instantiate_permission": {"permission": "Everybody"}}
+        assert asyncio.run(TerraLcdAdapter(client, FakeTransport()).code_info(6)) is None
+
+    def test_deprecated_code_queries(self):
+        """test that the Deployer's old code queries keep their signatures
+        and results on top of the chain adapters
+        """
+        async def run():
+            client = Namespace(url="http://lcd", chain_id="localterra", gas_prices="0.15uluna", gas_adjustment=1.5)
+            deployer = Deployer(client, mnemonic=TEST_MNEMONIC)
+            deployer.chain = TerraLcdAdapter(make_client(), FakeTransport())
+            try:
+                with pytest.warns(DeprecationWarning):
+                    byte_code = await deployer.query_code_bytecode("http://lcd", 5, target_chain=SupportedChains.TERRA)
+                with pytest.warns(DeprecationWarning):
+                    code_details = await deployer.query_code_id("http://lcd", 5)
+                return byte_code, code_details, await deployer.query_code_bytes(5)
+            finally:
+                await deployer.close()
+
+        byte_code, code_details, code = asyncio.run(run())
+        assert base64.b64decode(byte_code["byte_code"]) == code == WASM
+        assert code_details == {"result": {"code_id": 5, "code_hash": "AB" * 32, "creator": "terra1creator"}}
+
+    def test_parse_grpc_url(self):
+        """test that TLS and the port are worked out from the endpoint"""
+        assert parse_grpc_url("grpcs://grpc.juno.example") == ("grpc.juno.example", 443, True)
+        assert parse_grpc_url("https://grpc.juno.example:12690") == ("grpc.juno.example", 12690, True)
+        assert parse_grpc_url("grpc://localhost:9091") == ("localhost", 9091, False)
+        assert parse_grpc_url("localhost") == ("localhost", 9090, False)
+        with pytest.raises(ValueError):
+            parse_grpc_url("ws://localhost:26657")
+
+    def test_grpc_round_trip(self):
+        """test that smart queries, code info, code downloads and
+        broadcasts all work over one gRPC channel
+        """
+        tx_service = FakeTxService()
+        port = free_port()
+        tx = Tx(body=TxBody(messages=[], memo="capsule"), auth_info=AuthInfo(signer_infos=[], fee=Fee(0, Coins())), signatures=[])
+
+        async def run():
+            server = Server([FakeQuery(), tx_service])
+            await server.start("127.0.0.1", port)
+            adapter = GrpcAdapter(f"grpc://127.0.0.1:{port}")
+            try:
+                queries = await asyncio.gather(*[adapter.query_smart("terra1contract", {"count": {"n": n}}) for n in range(3)])
+                return (queries, await adapter.code_info(7), await adapter.code_bytes(7),
+                        await adapter.broadcast_sync(tx), await adapter.broadcast_async(tx))
+            finally:
+                await adapter.close()
+                server.close()
+                await server.wait_closed()
+
+        queries, code_info, code, sync_result, async_result = asyncio.run(run())
+        assert queries[2] == {"address": "terra1contract", "query": {"count": {"n": 2}}}
+        assert code_info == {"code_id": "7", "creator": "terra1creator", "data_hash": "AB" * 32,
+                             "instantiate_permission": {"permission": "ACCESS_TYPE_ONLY_ADDRESS", "address": "terra1creator", "addresses": []}}
+        assert code == WASM
+        assert (sync_result.txhash, sync_result.code) == ("ABC", 0)
+        assert async_result.txhash == "ABC"
+        assert tx_service.broadcasts == [("capsule", BroadcastMode.BROADCAST_MODE_SYNC), ("capsule", BroadcastMode.BROADCAST_MODE_ASYNC)]
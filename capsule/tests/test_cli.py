@@ -0,0 +1,67 @@
+import subprocess
+import sys
+
+import pytest
+
+from capsule.cli import selected_command
+from capsule.cmds import AVAILABLE_COMMANDS, get_command
+
+# Modules which make up most of capsule's import time, none are needed to list the commands
+HEAVY_MODULES = ["terra_sdk", "terra_proto", "aiohttp", "requests", "git", "toml"]
+
+
+def loaded_modules(code):
+    """Run code in a fresh interpreter and report which of the heavy modules it imported"""
+    script = code + f"\nimport sys\nprint('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    loaded = result.stdout.rsplit("loaded:", 1)[1].strip()
+    return loaded.split(",") if loaded else []
+
+
+class TestLazyCommands():
+    def test_descriptors_match_commands(self):
+        """test that each descriptor lists the same name and help
+        as the command it loads
+        """
+        for descriptor in AVAILABLE_COMMANDS:
+            cmd = descriptor.load()
+            assert cmd.CMD_NAME == descriptor.name
+            assert cmd.CMD_HELP == descriptor.help
+
+    def test_get_command(self):
+        """test that commands are found by name"""
+        assert get_command("deploy").class_name == "DeployCmd"
+        assert get_command("nope") is None
+        assert get_command(None) is None
+
+    def test_selected_command(self):
+        """test that the subcommand is the first argument which isn't an option"""
+        assert selected_command(["-h"]) is None
+        assert selected_command(["deploy", "-p", "x.wasm"]) == "deploy"
+        assert selected_command([]) is None
+
+    def test_import_does_not_load_commands(self):
+        """test that importing the cli doesn't import the heavy modules
+        the commands depend on
+        """
+        assert loaded_modules("import capsule.cli") == []
+
+    def test_help_does_not_load_commands(self):
+        """test that listing the commands doesn't import any of them"""
+        code = ("import sys\nsys.argv = ['capsule', '-h']\nfrom capsule.cli import main\n"
+                "try:\n    main()\nexcept SystemExit:\n    pass")
+        assert loaded_modules(code) == []
+
+    def test_forwarding_commands_do_not_load_the_sdk(self):
+        """test that query and execute can hand their work to a daemon
+        without importing the SDK first
+        """
+        loaded = loaded_modules("import capsule.cmds.query, capsule.cmds.execute")
+        assert not {"terra_sdk", "terra_proto", "aiohttp"} & set(loaded)
+
+    def test_lazy_class_import(self):
+        """test that command classes can still be imported from capsule.cmds"""
+        from capsule.cmds import DeployCmd
+        assert DeployCmd.CMD_NAME == "deploy"
+        with pytest.raises(ImportError):
+            from capsule.cmds import MissingCmd
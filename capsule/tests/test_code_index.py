@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import hashlib
+import struct
+
+from capsule.lib.code_index import CodeIndex, code_pagination_key
+
+
+def data_hash(code_id):
+    # Every third code is the same wasm
+    return hashlib.sha256(b"wasm%d" % (code_id % 3)).hexdigest().upper()
+
+
+class FakeClient():
+    chain_id = "columbus-5"
+
+
+class FakeDeployer():
+    def __init__(self, codes):
+        self.codes = codes
+        self.async_client = FakeClient()
+        self.requests = []
+
+    async def query_code_infos(self, pagination_key, limit):
+        start = struct.unpack(">Q", base64.b64decode(pagination_key))[0]
+        self.requests.append(start)
+        page = [{"code_id": str(code_id), "data_hash": data_hash(code_id), "creator": "terra1x"}
+                for code_id in range(start, min(start + limit, self.codes + 1))]
+        more = start + limit <= self.codes
+        return page, code_pagination_key(start + limit) if more else None
+
+
+class TestCodeIndex():
+    def test_crawl_resumes_from_last_code_id(self, tmp_path):
+        """test that a crawl pages through every code and
+        a later crawl only asks for codes stored since
+        """
+        index = CodeIndex(str(tmp_path / "codes.sqlite"))
+        deployer = FakeDeployer(codes=25)
+
+        assert asyncio.run(index.crawl(deployer, page_size=10)) == 25
+        assert deployer.requests == [1, 11, 21]
+        assert index.last_code_id("columbus-5") == 25
+
+        deployer.codes = 32
+        deployer.requests = []
+        assert asyncio.run(index.crawl(deployer, page_size=10)) == 7
+        assert deployer.requests == [26]
+        index.close()
+
+    def test_find_by_checksum(self, tmp_path):
+        """test that every code id holding a wasm is found, per chain and case insensitively"""
+        path = str(tmp_path / "codes.sqlite")
+        index = CodeIndex(path)
+        asyncio.run(index.crawl(FakeDeployer(codes=10)))
+        index.close()
+
+        index = CodeIndex(path)
+        assert index.find("columbus-5", data_hash(1).lower()) == [1, 4, 7, 10]
+        assert index.find("phoenix-1", data_hash(1)) == []
+        assert index.last_code_id("phoenix-1") == 0
+        index.close()
+
+    def test_pagination_key(self):
+        """test that the key is the code id as a big endian uint64"""
+        assert base64.b64decode(code_pagination_key(258)) == b"\x00\x00\x00\x00\x00\x00\x01\x02"
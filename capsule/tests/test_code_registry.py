@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import hashlib
+from argparse import Namespace
+
+from capsule.lib.code_registry import (CodeRegistry, can_instantiate,
+                                      normalise_checksum)
+from capsule.lib.deployer import Deployer
+
+CHECKSUM = hashlib.sha256(b"wasm").hexdigest()
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+class FakeChain():
+    """Reports one stored code, uploaded with the given permission"""
+
+    def __init__(self, permission):
+        self.permission = permission
+
+    async def code_info(self, code_id):
+        return {"code_id": str(code_id), "creator": "terra1other", "data_hash": CHECKSUM.upper(),
+                "instantiate_permission": self.permission}
+
+    async def close(self):
+        pass
+
+
+class TestCodeRegistry():
+    def test_record_and_get_per_chain(self, tmp_path):
+        """test that code ids are remembered per chain and survive a reload"""
+        path = str(tmp_path / "code_registry.json")
+        registry = CodeRegistry(path)
+        registry.record("columbus-5", CHECKSUM, "42")
+
+        reloaded = CodeRegistry(path)
+        assert reloaded.get("columbus-5", CHECKSUM) == 42
+        assert reloaded.get("bombay-12", CHECKSUM) is None
+
+    def test_forget(self, tmp_path):
+        """test that a forgotten artifact is no longer found"""
+        registry = CodeRegistry(str(tmp_path / "code_registry.json"))
+        registry.record("localterra", CHECKSUM, 1)
+        registry.forget("localterra", CHECKSUM)
+        assert CodeRegistry(registry.path).get("localterra", CHECKSUM) is None
+
+    def test_normalise_checksum(self):
+        """test that hex of any case and base64 hashes compare equal"""
+        digest = hashlib.sha256(b"wasm").digest()
+        assert normalise_checksum(CHECKSUM.upper()) == CHECKSUM
+        assert normalise_checksum(base64.b64encode(digest).decode()) == CHECKSUM
+
+    def test_can_instantiate(self):
+        """test that the instantiate permission decides who may reuse a code,
+        falling back to its creator when the chain reports none
+        """
+        only_me = {"creator": "terra1me", "instantiate_permission": {"permission": "OnlyAddress", "address": "terra1me"}}
+        assert can_instantiate(only_me, "terra1me")
+        assert not can_instantiate(only_me, "terra1you")
+        assert can_instantiate({"creator": "terra1me", "instantiate_permission": {"permission": "ACCESS_TYPE_EVERYBODY"}}, "terra1you")
+        assert can_instantiate({"instantiate_permission": {"permission": "AnyOfAddresses", "addresses": ["terra1you"]}}, "terra1you")
+        assert not can_instantiate({"creator": "terra1me", "instantiate_permission": {"permission": "Nobody"}}, "terra1me")
+        assert can_instantiate({"creator": "terra1me"}, "terra1me")
+        assert not can_instantiate({"creator": "terra1me"}, "terra1you")
+
+    def test_stored_code_is_only_reused_when_instantiable(self, tmp_path):
+        """test that a registered code is reused as a str code id only
+        when the deployer's account may instantiate it
+        """
+        registry = CodeRegistry(str(tmp_path / "code_registry.json"))
+        registry.record("localterra", CHECKSUM, 42)
+
+        async def find(permission):
+            client = Namespace(url="http://lcd", chain_id="localterra", gas_prices="0.15uluna", gas_adjustment=1.5)
+            deployer = Deployer(client, mnemonic=TEST_MNEMONIC, code_registry=registry)
+            deployer.chain = FakeChain(permission)
+            try:
+                return await deployer.find_stored_code(CHECKSUM)
+            finally:
+                await deployer.close()
+
+        assert asyncio.run(find({"permission": "Everybody"})) == "42"
+        assert asyncio.run(find({"permission": "OnlyAddress", "address": "terra1other"})) is None
+        # The entry is still good for the key which uploaded it
+        assert registry.get("localterra", CHECKSUM) == 42
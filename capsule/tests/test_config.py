@@ -3,9 +3,13 @@ import os
 
 import mock
 import pytest
+import toml
 
 from capsule.lib.config_handler import (DEFAULT_CONFIG_FILE_ENV_VAR,
-                                        get_config, get_config_file)
+                                        get_config, get_config_file,
+                                        get_networks, load_config,
+                                        network_urls, validate_network)
+from capsule.lib.credential_handler import read_mnemonic
 
 TEST_CONFIG_FILE_RELATIVE_PATH = "./capsule/lib/settings/config.toml"
 TEST_CONFIG_FILE_LOCATION = os.path.abspath(
@@ -49,4 +53,76 @@ class TestConfigHandler():
         """
         assert asyncio.run(get_config())
         assert 'networks' in asyncio.run(get_config())
-        
\ No newline at end of file
+
+    def test_config_is_parsed_once(self, tmp_path):
+        """test that loading an unchanged config hands back
+        the same parsed config without parsing the file again
+        """
+        config_file = tmp_path / "config.toml"
+        config_file.write_text('[networks.local]\nchain_url = "http://localhost:1317"\n')
+        with mock.patch("capsule.lib.config_handler.toml.load", wraps=toml.load) as load:
+            first = asyncio.run(get_config(str(config_file)))
+            assert asyncio.run(get_networks(str(config_file))) is first["networks"]
+            assert load.call_count == 1
+
+    def test_changed_config_is_parsed_again(self, tmp_path):
+        """test that a config is parsed again once the file changes"""
+        config_file = tmp_path / "config.toml"
+        config_file.write_text('[networks.local]\nchain_url = "http://localhost:1317"\n')
+        assert load_config(str(config_file))["networks"]["local"]["chain_url"] == "http://localhost:1317"
+        config_file.write_text('[networks.local]\nchain_url = "http://localhost:26657"\n')
+        assert load_config(str(config_file))["networks"]["local"]["chain_url"] == "http://localhost:26657"
+
+    def test_config_is_read_only(self, tmp_path):
+        """test that nobody handed the shared config can change it"""
+        config_file = tmp_path / "config.toml"
+        config_file.write_text('[networks.local]\nchain_url = "http://localhost:1317"\ngas_prices = { uluna = "0.15" }\n')
+        config = load_config(str(config_file))
+        with pytest.raises(TypeError):
+            config["networks"]["local"]["chain_url"] = "http://elsewhere"
+        with pytest.raises(TypeError):
+            config["networks"]["local"]["gas_prices"]["uluna"] = "0"
+
+    @pytest.mark.parametrize("network", [
+        'chain_url = 1317',
+        'chain_url = "localhost:1317"',
+        'chain_url = "http://localhost:1317"\ngas_adjustment = "lots"',
+        'chain_urls = ["http://localhost:1317", "localhost:1318"]',
+        'chain_url = "http://localhost:1317"\nchain_fcd_urls = ["ws://localhost:3060"]',
+        'chain_url = "http://localhost:1317"\nhedge_reads = "yes"',
+    ])
+    def test_bad_networks_fail_fast(self, tmp_path, network):
+        """test that a network entry without a usable chain_url or
+        with a field of the wrong type fails as the config is loaded
+        """
+        config_file = tmp_path / "config.toml"
+        config_file.write_text(f"[networks.local]\n{network}\n")
+        with pytest.raises(ValueError, match="local"):
+            load_config(str(config_file))
+
+    def test_networks_without_endpoints_only_fail_when_used(self, tmp_path):
+        """test that a network naming no endpoint loads with the rest of the config,
+        so other networks and the mnemonic can still be used, and only fails once selected
+        """
+        config_file = tmp_path / "config.toml"
+        config_file.write_text('[deploy_info]\nmnemonic = "words"\n'
+                               '[networks.local]\nchain_url = "http://localhost:1317"\n'
+                               '[networks.planned]\nchain_id = "planned-1"\n')
+        networks = load_config(str(config_file))["networks"]
+        with mock.patch.dict(os.environ, {DEFAULT_CONFIG_FILE_ENV_VAR: str(config_file)}, clear=True):
+            assert read_mnemonic() == "words"
+        validate_network("local", networks["local"])
+        with pytest.raises(ValueError, match="'planned' .* missing 'chain_url'"):
+            validate_network("planned", networks["planned"])
+
+    def test_network_urls(self, tmp_path):
+        """test that a network may list several endpoints,
+        its single url coming first and duplicates being dropped
+        """
+        config_file = tmp_path / "config.toml"
+        config_file.write_text('[networks.local]\nchain_urls = ["http://a:1317", "http://b:1317"]\nhedge_reads = true\n'
+                               '[networks.both]\nchain_url = "http://b:1317"\nchain_urls = ["http://a:1317", "http://b:1317"]\n')
+        networks = load_config(str(config_file))["networks"]
+        assert network_urls(networks["local"]) == ("http://a:1317", "http://b:1317")
+        assert network_urls(networks["both"]) == ("http://b:1317", "http://a:1317")
+        assert network_urls(networks["both"], "chain_fcd_url") == ()
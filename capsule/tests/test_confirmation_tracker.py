@@ -0,0 +1,134 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from capsule.lib.confirmation_tracker import (ConfirmationTracker,
+                                              block_tx_hashes)
+
+
+def tx_bytes(name):
+    return base64.b64encode(name.encode()).decode()
+
+
+def tx_hash(name):
+    return hashlib.sha256(name.encode()).hexdigest().upper()
+
+
+class FakeChain():
+    """A transport serving blocks and txs from memory, counting each request"""
+
+    def __init__(self, with_block_txs=True):
+        self.blocks = {10: []}
+        self.with_block_txs = with_block_txs
+        self.block_requests = 0
+        self.tx_requests = []
+
+    def produce_block(self, *names):
+        self.blocks[max(self.blocks) + 1] = list(names)
+
+    def block(self, height):
+        block = {"block": {"header": {"height": str(height)}}}
+        if self.with_block_txs:
+            block["block"]["data"] = {"txs": [tx_bytes(name) for name in self.blocks[height]]}
+        return block
+
+    async def get_json(self, url, params=None):
+        path = url.split("/cosmos/")[1]
+        if path.startswith("base/tendermint/v1beta1/blocks/"):
+            self.block_requests += 1
+            height = path.rsplit("/", 1)[1]
+            return self.block(max(self.blocks) if height == "latest" else int(height))
+        txhash = path.rsplit("/", 1)[1]
+        self.tx_requests.append(txhash)
+        for height, names in self.blocks.items():
+            if any(tx_hash(name) == txhash for name in names):
+                return {"tx_response": {"height": str(height), "txhash": txhash, "code": 0, "logs": []}}
+        return {"code": 5, "message": "tx not found"}
+
+
+def make_tracker(chain, **kwargs):
+    kwargs.setdefault("min_poll_interval", 0.01)
+    kwargs.setdefault("max_poll_interval", 0.02)
+    return ConfirmationTracker("http://lcd", transport=chain, **kwargs)
+
+
+class TestConfirmationTracker():
+    def test_block_tx_hashes(self):
+        """test that block txs are hashed the way tx hashes are
+        reported and a block without its txs is told apart from an empty one
+        """
+        block = {"block": {"header": {"height": "3"}, "data": {"txs": [tx_bytes("a")]}}}
+        assert block_tx_hashes(block) == {tx_hash("a")}
+        assert block_tx_hashes({"block": {"data": {"txs": []}}}) == set()
+        assert block_tx_hashes({"block": {"header": {"height": "3"}}}) is None
+
+    def test_many_txs_share_one_poller(self):
+        """test that txs are confirmed from the blocks they land in,
+        looking up each tx only when it is new or was seen in a block
+        """
+        chain = FakeChain()
+        tracker = make_tracker(chain)
+
+        async def run():
+            confirmations = [tracker.track(tx_hash(name)) for name in "abcd"]
+            await asyncio.sleep(0.05)
+            chain.produce_block("a", "b")
+            chain.produce_block()
+            chain.produce_block("c")
+            chain.produce_block("d")
+            results = await asyncio.gather(*confirmations)
+            assert tracker.pending == 0
+            return results
+
+        results = asyncio.run(run())
+        assert [result.txhash for result in results] == [tx_hash(name) for name in "abcd"]
+        assert [result.height for result in results] == [11, 11, 13, 14]
+        # One direct lookup when tracked, then one once found in a block
+        assert sorted(chain.tx_requests) == sorted([tx_hash(name) for name in "abcd"] * 2)
+
+    def test_blocks_without_txs_fall_back_to_lookups(self):
+        """test that txs are still confirmed when the node's
+        blocks leave out their txs
+        """
+        chain = FakeChain(with_block_txs=False)
+        tracker = make_tracker(chain)
+
+        async def run():
+            tracker.track(tx_hash("a"))
+            await asyncio.sleep(0.05)
+            chain.produce_block("a")
+            return await tracker.wait(tx_hash("a"))
+
+        assert asyncio.run(run()).height == 11
+
+    def test_timeout_and_backoff(self):
+        """test that a tx which never lands times out
+        and polls back off while no new block is produced
+        """
+        chain = FakeChain()
+        tracker = make_tracker(chain, min_poll_interval=0.01, max_poll_interval=0.1, poll_backoff=2)
+
+        async def run():
+            await tracker.wait(tx_hash("a"), timeout=0.4)
+
+        with pytest.raises(TimeoutError):
+            asyncio.run(run())
+        # Without backoff 40 polls would fit in the timeout
+        assert chain.block_requests < 10
+        assert chain.tx_requests == [tx_hash("a")]
+
+    def test_close_cancels_pending(self):
+        """test that closing the tracker cancels the futures of
+        txs still pending and stops polling
+        """
+        tracker = make_tracker(FakeChain())
+
+        async def run():
+            confirmation = tracker.track(tx_hash("a"))
+            await tracker.close()
+            return confirmation
+
+        assert asyncio.run(run()).cancelled()
+        assert tracker.pending == 0
@@ -0,0 +1,33 @@
+import mock
+
+from terra_sdk.key.mnemonic import MnemonicKey
+
+from capsule.lib.credential_handler import KeyProvider
+
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+class TestKeyProvider():
+    def test_key_is_derived_once(self):
+        """test that asking for the same account again
+        hands back the key derived the first time
+        """
+        provider = KeyProvider()
+        with mock.patch("capsule.lib.credential_handler.MnemonicKey", wraps=MnemonicKey) as derive:
+            first = provider.get_key(TEST_MNEMONIC, index=1)
+            assert provider.get_key(TEST_MNEMONIC, index=1) is first
+            assert derive.call_count == 1
+
+    def test_keys_match_mnemonic_key(self):
+        """test that each index gets the same key MnemonicKey derives for it"""
+        provider = KeyProvider()
+        for index in (0, 2):
+            assert provider.get_key(TEST_MNEMONIC, index=index).acc_address == MnemonicKey(TEST_MNEMONIC, index=index).acc_address
+        assert provider.get_key(TEST_MNEMONIC).acc_address != provider.get_key(TEST_MNEMONIC, index=2).acc_address
+
+    def test_clear(self):
+        """test that clearing the provider derives keys again"""
+        provider = KeyProvider()
+        first = provider.get_key(TEST_MNEMONIC)
+        provider.clear()
+        assert provider.get_key(TEST_MNEMONIC) is not first
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import socket
+import threading
+from argparse import Namespace
+
+import pytest
+
+from capsule.lib import daemon as daemon_module
+from capsule.lib.daemon import (INVALID_PARAMS_CODE, METHOD_NOT_FOUND_CODE,
+                                SERVER_ERROR_CODE, CapsuleDaemon)
+from capsule.lib.daemon_client import (IDENTITY_MISMATCH_CODE, DaemonClient,
+                                       DaemonError, forward_to_daemon,
+                                       get_identity)
+
+
+class FakeDeployer(object):
+    """A deployer which answers queries from memory"""
+    async def query_contract(self, address, query, max_staleness=None):
+        if address == "broken":
+            raise Exception("contract not found")
+        if max_staleness is not None:
+            return {"address": address, "query": query, "max_staleness": max_staleness}
+        return {"address": address, "query": query}
+
+
+class WarmDeployer(FakeDeployer):
+    """A deployer which records being closed, and whose queries can be held open"""
+
+    def __init__(self, release=None):
+        self.endpoint_router = Namespace(urls=("http://lcd",), hedge_reads=False)
+        self.release = release
+        self.closed = False
+
+    async def query_contract(self, address, query, max_staleness=None):
+        if self.release is not None:
+            await self.release.wait()
+        return {"address": address, "query": query}
+
+    async def close(self, close_transport=True):
+        self.closed = True
+
+
+def make_daemon(tmp_path):
+    daemon = CapsuleDaemon(str(tmp_path / "capsule.sock"))
+
+    async def get_deployer(chain):
+        return FakeDeployer()
+    daemon.get_deployer = get_deployer
+    return daemon
+
+
+class TestCapsuleDaemon():
+    def test_dispatch(self, tmp_path):
+        """test that requests are routed to their method and failures
+        are replied to with JSON-RPC errors
+        """
+        daemon = make_daemon(tmp_path)
+
+        def dispatch(method, **params):
+            return asyncio.run(daemon.dispatch({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}))
+
+        reply = dispatch("query", chain="local", address="terra1", query={"count": {}})
+        assert reply == {"jsonrpc": "2.0", "id": 1, "result": {"address": "terra1", "query": {"count": {}}}}
+        reply = dispatch("query", chain="local", address="terra1", query={}, max_staleness=5)
+        assert reply["result"]["max_staleness"] == 5
+        assert dispatch("nope")["error"]["code"] == METHOD_NOT_FOUND_CODE
+        assert dispatch("query", chain="local")["error"]["code"] == INVALID_PARAMS_CODE
+        assert dispatch("query", chain="local", address="broken", query={})["error"] == {"code": SERVER_ERROR_CODE, "message": "contract not found"}
+
+    def test_identity_must_match(self, tmp_path):
+        """test that the daemon refuses requests made with another config or mnemonic"""
+        daemon = make_daemon(tmp_path)
+        request = {"id": 1, "method": "query", "params": {"chain": "local", "address": "terra1", "query": {}}}
+
+        request["params"]["identity"] = dict(get_identity(), mnemonic_sha256="someone else")
+        assert asyncio.run(daemon.dispatch(request))["error"]["code"] == IDENTITY_MISMATCH_CODE
+
+        request["params"]["identity"] = get_identity()
+        assert "result" in asyncio.run(daemon.dispatch(request))
+
+    def test_forwarding_over_the_socket(self, tmp_path):
+        """test that a command's work is forwarded to a running daemon
+        and that without one nothing is forwarded
+        """
+        daemon = make_daemon(tmp_path)
+        socket_path = daemon.socket_path
+        assert forward_to_daemon("query", socket_path=socket_path, chain="local", address="terra1", query={}) == (False, None)
+
+        async def scenario():
+            serving = asyncio.ensure_future(daemon.serve())
+            while not os.path.exists(socket_path):
+                await asyncio.sleep(0.01)
+            loop = asyncio.get_running_loop()
+            forwarded = await loop.run_in_executor(None, lambda: forward_to_daemon(
+                "query", socket_path=socket_path, chain="local", address="terra1", query={"count": {}}))
+            assert await loop.run_in_executor(None, DaemonClient(socket_path).call, "shutdown")
+            await serving
+            return forwarded
+
+        assert asyncio.run(scenario()) == (True, {"address": "terra1", "query": {"count": {}}})
+        # The socket is removed once the daemon stops
+        assert not os.path.exists(socket_path)
+        assert not DaemonClient(socket_path).is_running()
+
+    def test_deployers_are_built_once_and_closed_when_replaced(self, tmp_path, monkeypatch):
+        """test that concurrent first requests share one Deployer, and that a
+        replaced Deployer is only closed once its last request is done
+        """
+        daemon = CapsuleDaemon(str(tmp_path / "capsule.sock"))
+        networks = {"local": {"chain_url": "http://lcd"}}
+        built = []
+
+        async def get_networks():
+            return networks
+
+        async def open_session(chain, **kwargs):
+            await asyncio.sleep(0.01)
+            built.append(WarmDeployer(release=asyncio.Event() if len(built) == 0 else None))
+            return Namespace(deployer=built[-1])
+
+        monkeypatch.setattr(daemon_module, "get_networks", get_networks)
+        monkeypatch.setattr(daemon_module.DeploySession, "open", open_session)
+
+        async def scenario():
+            first = await asyncio.gather(*[daemon.get_deployer("local") for _ in range(5)])
+            assert len(built) == 1 and all(deployer is built[0] for deployer in first)
+
+            # A request is still using the first Deployer when the config changes
+            pending = asyncio.ensure_future(daemon.rpc_query("local", "terra1", {}))
+            await asyncio.sleep(0)
+            networks["local"] = {"chain_url": "http://lcd"}
+            assert await daemon.get_deployer("local") is built[1]
+            assert not built[0].closed
+
+            built[0].release.set()
+            assert await pending == {"address": "terra1", "query": {}}
+            assert built[0].closed and not built[1].closed
+            await daemon.close()
+            assert built[1].closed
+
+        asyncio.run(scenario())
+
+
+class TestDaemonClient():
+    def test_timeout_is_a_daemon_error(self, tmp_path):
+        """test that a daemon which never replies fails the call with a DaemonError"""
+        socket_path = str(tmp_path / "capsule.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(socket_path)
+            server.listen(1)
+            accepted = []
+            threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+            with pytest.raises(DaemonError, match="did not reply to query within 0.1s"):
+                DaemonClient(socket_path, timeout=0.1).call("query")
+            for connection, _ in accepted:
+                connection.close()
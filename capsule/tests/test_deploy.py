@@ -0,0 +1,119 @@
+import asyncio
+import time
+from argparse import Namespace
+
+import pytest
+
+import capsule.cmds.deploy as deploy
+from capsule.cmds.deploy import (chain_results_table, deploy_to_chains,
+                                 parse_chains)
+
+
+class FakeDeployer():
+    def __init__(self, chain, fail):
+        self.chain = chain
+        self.fail = fail
+
+    async def store_contract(self, contract_name, contract_path):
+        await asyncio.sleep(0.1)
+        return f"{len(self.chain)}"
+
+    async def instantiate_contract(self, code_id, init_msg, label):
+        if self.chain in self.fail:
+            raise Exception("out of gas")
+        return f"{self.chain}1contract"
+
+
+def fake_sessions(monkeypatch, networks, fail=(), configs=None):
+    """Deploy against fake networks, returning the kwargs each session was opened with"""
+    opened = {}
+
+    class FakeSession():
+        def __init__(self, network, **kwargs):
+            opened[network] = kwargs
+            self.network = network
+
+        async def __aenter__(self):
+            return FakeDeployer(self.network, fail)
+
+        async def __aexit__(self, *exc_info):
+            pass
+
+    async def get_networks():
+        return {name: {"chain_url": "http://localhost", **(configs or {}).get(name, {})} for name in networks}
+
+    monkeypatch.setattr(deploy, "DeploySession", FakeSession)
+    monkeypatch.setattr(deploy, "get_networks", get_networks)
+    monkeypatch.setattr(deploy, "CodeRegistry", lambda: object())
+    return opened
+
+
+def make_args(**kwargs):
+    defaults = {"package": "artifacts/token.wasm", "codeid": "", "initmsg": "{}", "label": "", "uploadonly": "", "forcestore": False}
+    defaults.update(kwargs)
+    return Namespace(**defaults)
+
+
+class TestMultiChainDeploy():
+    def test_parse_chains(self):
+        """test that a comma separated list of chains is split
+        in order with blanks and repeats dropped
+        """
+        assert parse_chains("columbus-5, bombay-12,,localterra,bombay-12") == ["columbus-5", "bombay-12", "localterra"]
+
+    def test_chains_deploy_concurrently(self, monkeypatch):
+        """test that every chain is deployed to at once, sharing one
+        code registry and transport, and a failed chain keeps what it got done
+        """
+        chains = ["columbus-5", "bombay-12", "localterra"]
+        opened = fake_sessions(monkeypatch, chains, fail=("bombay-12",))
+
+        started = time.monotonic()
+        outcomes = asyncio.run(deploy_to_chains(chains, make_args()))
+        assert time.monotonic() - started < 0.25
+
+        assert outcomes["columbus-5"] == ({"code_id": "10", "address": "columbus-51contract"}, None)
+        result, error = outcomes["bombay-12"]
+        assert result == {"code_id": "9"}
+        assert str(error) == "out of gas"
+        registries = {id(kwargs["code_registry"]) for kwargs in opened.values()}
+        transports = {id(kwargs["transport"]) for kwargs in opened.values()}
+        assert len(registries) == 1 and len(transports) == 1
+
+        lines = chain_results_table(outcomes).splitlines()
+        assert lines[3].split() == ["bombay-12", "9", "-", "FAILED", "out", "of", "gas"]
+        assert lines[4].split() == ["localterra", "10", "localterra1contract", "OK"]
+
+    def test_unknown_chain_deploys_nothing(self, monkeypatch):
+        """test that a chain missing from the config fails the
+        deploy before any chain is deployed to
+        """
+        opened = fake_sessions(monkeypatch, ["columbus-5"])
+        with pytest.raises(ValueError, match="'juno-2'"):
+            asyncio.run(deploy_to_chains(["columbus-5", "juno-2"], make_args()))
+        assert opened == {}
+
+    def test_other_chain_families_deploy_nothing(self, monkeypatch):
+        """test that a chain of a family other than Terra, by name or by its
+        config's chain_family, fails the deploy before any chain is deployed to
+        """
+        opened = fake_sessions(monkeypatch, ["columbus-5", "juno-1", "devnet"], configs={"devnet": {"chain_family": "osmosis"}})
+        with pytest.raises(ValueError, match="can't sign for 'juno-1'$"):
+            asyncio.run(deploy_to_chains(["columbus-5", "juno-1"], make_args()))
+        with pytest.raises(ValueError, match="can't sign for 'devnet'$"):
+            asyncio.run(deploy_to_chains(["columbus-5", "devnet"], make_args()))
+        assert opened == {}
+
+    def test_manifest_results_table(self):
+        """test that a manifest's per contract failures are listed
+        against their chain
+        """
+        outcomes = {
+            "columbus-5": ({"token": {"code_id": 1, "address": "terra1"}}, None),
+            "juno-1": ({"token": {"code_id": 2}, "pair": {"error": "out of gas"}}, None),
+            "osmosis-1": ({}, ConnectionError("lcd down")),
+        }
+        lines = chain_results_table(outcomes, manifest=True).splitlines()
+        assert lines[2].split() == ["columbus-5", "1/1", "OK"]
+        assert lines[3].split() == ["juno-1", "1/2", "FAILED", "pair:", "out", "of", "gas"]
+        assert lines[4].split() == ["osmosis-1", "0/0", "FAILED", "lcd", "down"]
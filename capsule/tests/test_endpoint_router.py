@@ -0,0 +1,235 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from capsule.lib.endpoint_router import EndpointRouter, RoutedLCDClient
+from capsule.lib.transport import AsyncTransport
+
+
+class FakeEndpoints():
+    """Answers requests by endpoint url, after each endpoint's delay,
+    raising any error set for an endpoint instead
+    """
+
+    def __init__(self, delays=None, errors=None):
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.requests = []
+        self.cancelled = []
+
+    async def request(self, url):
+        self.requests.append(url)
+        try:
+            await asyncio.sleep(self.delays.get(url, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(url)
+            raise
+        if url in self.errors:
+            raise self.errors[url]
+        return url
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestEndpointRouter():
+    def test_reads_go_to_the_fastest_endpoint(self):
+        """test that once each endpoint has been tried
+        reads settle on the one with the lowest latency
+        """
+        endpoints = FakeEndpoints(delays={"http://a": 0.08, "http://b": 0.001, "http://c": 0.04})
+        router = EndpointRouter(["http://a", "http://b", "http://c"])
+
+        async def read_many():
+            for _ in range(6):
+                await router.read(endpoints.request)
+
+        asyncio.run(read_many())
+        assert endpoints.requests[:3] == ["http://a", "http://b", "http://c"]
+        assert endpoints.requests[3:] == ["http://b"] * 3
+        assert [endpoint.url for endpoint in router.ranked()] == ["http://b", "http://c", "http://a"]
+
+    def test_failing_endpoints_are_failed_over_and_skipped(self):
+        """test that a read failing on an endpoint is retried on the next,
+        the failing endpoint being skipped until its cooldown passes
+        """
+        endpoints = FakeEndpoints(errors={"http://a": aiohttp.ServerDisconnectedError()})
+        router = EndpointRouter(["http://a", "http://b"], cooldown=60)
+
+        async def read_many():
+            return [await router.read(endpoints.request) for _ in range(3)]
+
+        assert asyncio.run(read_many()) == ["http://b"] * 3
+        assert endpoints.requests == ["http://a", "http://b", "http://a", "http://b", "http://b"]
+        assert [endpoint.url for endpoint in router.ranked()] == ["http://b", "http://a"]
+
+        router.cooldown = 0
+        assert router.ranked()[0].url == "http://a"
+
+    def test_bad_requests_are_not_failed_over(self):
+        """test that an error any endpoint would give is raised
+        straight away, as is the last error once every endpoint failed
+        """
+        endpoints = FakeEndpoints(errors={"http://a": KeyError("bad query")})
+        router = EndpointRouter(["http://a", "http://b"])
+        with pytest.raises(KeyError):
+            asyncio.run(router.read(endpoints.request))
+        assert endpoints.requests == ["http://a"]
+
+        endpoints = FakeEndpoints(errors={"http://a": asyncio.TimeoutError(), "http://b": ConnectionResetError()})
+        with pytest.raises(ConnectionResetError):
+            asyncio.run(EndpointRouter(["http://a", "http://b"]).read(endpoints.request))
+
+    def test_slow_reads_are_hedged(self):
+        """test that a read outlasting the hedge delay is also sent to the
+        next endpoint, the first answer winning and the slow read being cancelled
+        """
+        endpoints = FakeEndpoints(delays={"http://a": 5, "http://b": 0.01})
+        router = EndpointRouter(["http://a", "http://b"], hedge_reads=True, hedge_delay=0.05)
+
+        async def hedged_read():
+            result = await router.read(endpoints.request)
+            # Let the cancelled read unwind
+            await asyncio.sleep(0)
+            return result
+
+        assert asyncio.run(hedged_read()) == "http://b"
+        assert router.hedged == 1
+        assert endpoints.cancelled == ["http://a"]
+        # The slow endpoint is charged at least the time it was given
+        assert router.endpoints[0].latency >= 0.05
+        assert router.ranked()[0].url == "http://b"
+
+        endpoints = FakeEndpoints(delays={"http://a": 0.1, "http://b": 0.01})
+        router = EndpointRouter(["http://a", "http://b"], hedge_delay=0.05)
+        assert asyncio.run(router.read(endpoints.request)) == "http://a"
+        assert router.hedged == 0
+
+    def test_hedge_delay_follows_read_latencies(self):
+        """test that reads are hedged after the p95 of recent
+        read latencies once enough of them are known
+        """
+        router = EndpointRouter(["http://a"], hedge_delay=0.5)
+        router.latencies.extend([0.01] * 10)
+        assert router.hedge_delay() == 0.5
+        router.latencies.extend([0.01] * 85 + [0.2] * 5)
+        assert router.hedge_delay() == 0.2
+
+    def test_only_hedgeable_reads_are_timed(self):
+        """test that slow reads which opt out of hedging, such as code downloads,
+        neither rank the endpoints nor move the hedge delay
+        """
+        endpoints = FakeEndpoints(delays={"http://a": 0.05}, errors={"http://b": aiohttp.ServerDisconnectedError()})
+        router = EndpointRouter(["http://a", "http://b"], hedge_reads=True)
+
+        async def download():
+            return await router.read(endpoints.request, hedge=False)
+
+        assert asyncio.run(download()) == "http://a"
+        assert router.endpoints[0].latency is None
+        assert list(router.latencies) == []
+
+        # Their failures still count against the endpoint
+        router = EndpointRouter(["http://b", "http://a"], hedge_reads=True)
+        assert asyncio.run(download()) == "http://a"
+        assert router.endpoints[0].error_rate > 0
+
+        endpoints.delays = {}
+        assert asyncio.run(router.read(endpoints.request)) == "http://a"
+        assert len(router.latencies) == 1 and router.endpoints[1].latency is not None
+
+    def test_writes_only_fail_over_without_a_connection(self):
+        """test that a write which reached an endpoint is never sent to another"""
+        refused = aiohttp.ClientConnectorError(None, ConnectionRefusedError(111, "Connection refused"))
+        endpoints = FakeEndpoints(errors={"http://a": refused})
+        assert asyncio.run(EndpointRouter(["http://a", "http://b"]).write(endpoints.request)) == "http://b"
+
+        endpoints = FakeEndpoints(errors={"http://a": asyncio.TimeoutError()})
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(EndpointRouter(["http://a", "http://b"]).write(endpoints.request))
+        assert endpoints.requests == ["http://a"]
+
+    def test_routed_lcd_client(self):
+        """test that an LCD client's queries fail over from endpoints
+        which are rate limiting or behind a proxy's page to one which answers
+        """
+        async def rate_limited(request):
+            return web.Response(status=429, text="Too Many Requests")
+
+        async def proxy_page(request):
+            return web.Response(status=200, text="<html>Under maintenance</html>", content_type="text/html")
+
+        async def contract_query(request):
+            return web.json_response({"data": {"count": 7}})
+
+        ports = [free_port(), free_port(), free_port()]
+
+        async def scenario():
+            runners = []
+            for port, handler in zip(ports, [rate_limited, proxy_page, contract_query]):
+                app = web.Application()
+                app.router.add_get("/cosmwasm/wasm/v1/contract/{address}/smart/{query}", handler)
+                runner = web.AppRunner(app)
+                await runner.setup()
+                await web.TCPSite(runner, "127.0.0.1", port).start()
+                runners.append(runner)
+
+            transport = AsyncTransport()
+            router = EndpointRouter([f"http://127.0.0.1:{port}" for port in ports])
+            client = RoutedLCDClient(router, chain_id="localterra", _create_session=False)
+            client.session = await transport.get_session()
+            try:
+                return await client.wasm.contract_query("terra1contract", {"count": {}}), router
+            finally:
+                await transport.close()
+                for runner in runners:
+                    await runner.cleanup()
+
+        result, router = asyncio.run(scenario())
+        assert result == {"count": 7}
+        assert [endpoint.error_rate > 0 for endpoint in router.endpoints] == [True, True, False]
+
+    def test_routed_tx_search(self):
+        """test that tx searches, which the LCD client builds from its own url,
+        are routed and fail over like any other read
+        """
+        searches = []
+
+        async def rate_limited(request):
+            return web.Response(status=429, text="Too Many Requests")
+
+        async def txs(request):
+            searches.append(request.query.getall("events"))
+            return web.json_response({"tx_responses": [], "pagination": None})
+
+        ports = [free_port(), free_port()]
+
+        async def scenario():
+            runners = []
+            for port, handler in zip(ports, [rate_limited, txs]):
+                app = web.Application()
+                app.router.add_get("/cosmos/tx/v1beta1/txs", handler)
+                runner = web.AppRunner(app)
+                await runner.setup()
+                await web.TCPSite(runner, "127.0.0.1", port).start()
+                runners.append(runner)
+
+            transport = AsyncTransport()
+            router = EndpointRouter([f"http://127.0.0.1:{port}" for port in ports])
+            client = RoutedLCDClient(router, chain_id="localterra", _create_session=False)
+            client.session = await transport.get_session()
+            try:
+                return await client._search([["message.sender", "terra1abc"], ["tx.height", 5]])
+            finally:
+                await transport.close()
+                for runner in runners:
+                    await runner.cleanup()
+
+        assert asyncio.run(scenario()) == {"tx_responses": [], "pagination": None}
+        assert searches == [["message.sender='terra1abc'", "tx.height=5"]]
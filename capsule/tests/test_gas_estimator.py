@@ -0,0 +1,79 @@
+from capsule.lib.gas_estimator import (DEFAULT_GAS_ADJUSTMENT,
+                                       MIN_GAS_ADJUSTMENT,
+                                       MIN_SAMPLES_TO_SKIP_SIMULATION,
+                                       GasCache, GasEstimator)
+
+
+class FakeMsg():
+    pass
+
+
+class OtherFakeMsg():
+    pass
+
+
+class FakeTxResult():
+    def __init__(self, gas_used, code=0):
+        self.txhash = "ABC"
+        self.gas_used = gas_used
+        self.code = code
+
+
+class TestGasEstimator():
+    def get_estimator(self, tmp_path):
+        return GasEstimator(chain_id="testnet", gas_prices="0.15uluna",
+                            cache=GasCache(path=str(tmp_path / "gas_cache.json")))
+
+    def test_unseen_msgs_use_the_default_adjustment(self, tmp_path):
+        """test that a variant with no history is padded with
+        the default adjustment and can not skip simulation
+        """
+        estimator = self.get_estimator(tmp_path)
+        assert estimator.cached_gas([FakeMsg()]) is None
+        assert estimator.gas_from_simulation([FakeMsg()], 100000) == 100000 * DEFAULT_GAS_ADJUSTMENT
+
+    def test_adjustment_tightens_and_simulation_is_skipped(self, tmp_path):
+        """test that once a variant has confirmed txs behind it
+        the adjustment tightens and enough samples skip simulation
+        """
+        estimator = self.get_estimator(tmp_path)
+        for _ in range(MIN_SAMPLES_TO_SKIP_SIMULATION):
+            assert estimator.cached_gas([FakeMsg()]) is None
+            estimator.gas_from_simulation([FakeMsg()], 100000)
+            estimator.record_result([FakeMsg()], FakeTxResult(gas_used=90000))
+
+        assert estimator.gas_from_simulation([FakeMsg()], 100000) == round(100000 * MIN_GAS_ADJUSTMENT)
+        assert estimator.cached_gas([FakeMsg(), FakeMsg()]) == round(2 * 90000 * MIN_GAS_ADJUSTMENT)
+
+    def test_cache_persists_and_resets_on_out_of_gas(self, tmp_path):
+        """test that what was learned is read back by a new estimator
+        and an out of gas failure forgets it
+        """
+        estimator = self.get_estimator(tmp_path)
+        for _ in range(MIN_SAMPLES_TO_SKIP_SIMULATION):
+            estimator.gas_from_simulation([FakeMsg()], 100000)
+            estimator.record_result([FakeMsg()], FakeTxResult(gas_used=90000))
+
+        estimator = self.get_estimator(tmp_path)
+        assert estimator.cached_gas([FakeMsg()]) is not None
+
+        estimator.record_result([FakeMsg()], FakeTxResult(gas_used=99000, code=11))
+        assert estimator.cached_gas([FakeMsg()]) is None
+
+    def test_mixed_txs_dont_overwrite_learned_simulations(self, tmp_path):
+        """test that simulating a tx mixing variants leaves each variant's
+        learned simulation alone, so a later confirmation compares against it
+        """
+        estimator = self.get_estimator(tmp_path)
+        estimator.gas_from_simulation([FakeMsg()], 100000)
+        estimator.gas_from_simulation([FakeMsg(), OtherFakeMsg()], 500000)
+        assert estimator.cache.get("testnet||FakeMsg")["simulated"] == 100000
+        assert estimator.cache.get("testnet||OtherFakeMsg") is None
+
+        estimator.record_result([FakeMsg()], FakeTxResult(gas_used=90000))
+        assert estimator.cache.get("testnet||FakeMsg")["peak_ratio"] == 0.9
+
+    def test_fee_is_priced_with_gas_prices(self, tmp_path):
+        """test that the fee amount is the gas limit times the gas price, rounded up"""
+        fee = self.get_estimator(tmp_path).fee_for(100001)
+        assert fee.amount.to_data() == [{"denom": "uluna", "amount": "15001"}]
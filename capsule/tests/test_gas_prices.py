@@ -0,0 +1,98 @@
+import json
+import time
+
+import pytest
+import requests
+from terra_sdk.core import Coins
+
+import capsule.lib.gas_prices as gas_prices_module
+from capsule.lib.config_handler import read_only
+from capsule.lib.gas_prices import GasPriceOracle
+
+
+class FakeResponse():
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def json(self):
+        return self.body
+
+
+class CountingOracle(GasPriceOracle):
+    """An oracle which never touches the network"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = 0
+
+    def refresh(self):
+        self.fetches += 1
+        self._write_cache({"uluna": "0.2"})
+        return {"uluna": "0.2"}
+
+
+class TestGasPriceOracle():
+    def test_fresh_cache_is_used_without_fetching(self, tmp_path):
+        """test that prices cached within the ttl
+        are handed out with no fetch at all
+        """
+        oracle = CountingOracle("testnet", fcd_url="http://fcd", cache_dir=str(tmp_path))
+        oracle._write_cache({"uluna": "0.1"})
+        assert oracle.get_gas_prices() == {"uluna": "0.1"}
+        assert oracle.fetches == 0
+
+    def test_stale_cache_is_used_while_refreshing(self, tmp_path):
+        """test that stale prices are returned immediately
+        and refreshed in the background
+        """
+        oracle = CountingOracle("testnet", fcd_url="http://fcd", cache_dir=str(tmp_path), ttl=60)
+        (tmp_path / "testnet.json").write_text(json.dumps({"fetched_at": time.time() - 120, "gas_prices": {"uluna": "0.1"}}))
+        assert oracle.get_gas_prices() == {"uluna": "0.1"}
+        oracle.refresh_in_background().join()
+        assert oracle.get_gas_prices() == {"uluna": "0.2"}
+
+    def test_fallback_prices_from_config(self, tmp_path):
+        """test that static prices from the network config are used when
+        nothing is cached and that cached_only never fetches
+        """
+        oracle = CountingOracle.from_network("testnet", {"gas_prices": "0.15uluna"}, cache_dir=str(tmp_path))
+        assert Coins(oracle.get_gas_prices()) == Coins.from_str("0.15uluna")
+
+        # Tables of a loaded config are read only mappings
+        oracle = CountingOracle.from_network("testnet", read_only({"gas_prices": {"uluna": "0.15"}}), cache_dir=str(tmp_path))
+        assert Coins(oracle.fallback) == Coins.from_str("0.15uluna")
+
+        oracle = CountingOracle("testnet", fcd_url="http://fcd", cache_dir=str(tmp_path / "empty"))
+        assert oracle.get_gas_prices(cached_only=True) is None
+        assert oracle.fetches == 0
+
+    def test_nothing_local_fetches_synchronously(self, tmp_path):
+        """test that with no cache and no fallback the prices are fetched and cached"""
+        oracle = CountingOracle("testnet", fcd_url="http://fcd", cache_dir=str(tmp_path))
+        assert oracle.get_gas_prices() == {"uluna": "0.2"}
+        assert oracle.get_gas_prices() == {"uluna": "0.2"}
+        assert oracle.fetches == 1
+
+    def test_error_bodies_are_never_cached(self, tmp_path, monkeypatch):
+        """test that an FCD answering with an error or anything other than
+        prices is skipped for the next FCD rather than cached as gas prices
+        """
+        responses = {
+            "http://limited/v1/txs/gas_prices": FakeResponse(429, {"message": "rate limited"}),
+            "http://broken/v1/txs/gas_prices": FakeResponse(200, {"code": 5, "message": "not found"}),
+            "http://fcd/v1/txs/gas_prices": FakeResponse(200, {"uluna": "0.15", "uusd": 0.2}),
+        }
+        monkeypatch.setattr(gas_prices_module.requests, "get", lambda url, timeout: responses[url])
+
+        oracle = GasPriceOracle("testnet", fcd_urls=["http://limited", "http://broken", "http://fcd"], cache_dir=str(tmp_path))
+        assert oracle.refresh() == {"uluna": "0.15", "uusd": 0.2}
+        assert oracle.get_gas_prices(cached_only=True) == {"uluna": "0.15", "uusd": 0.2}
+
+        oracle = GasPriceOracle("testnet", fcd_urls=["http://limited", "http://broken"], cache_dir=str(tmp_path / "empty"))
+        with pytest.raises(ValueError, match="something other than gas prices"):
+            oracle.refresh()
+        assert oracle.get_gas_prices(cached_only=True) is None
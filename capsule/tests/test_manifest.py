@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from capsule.lib.manifest import (deploy_manifest, deploy_order,
+                                  find_references, load_manifest,
+                                  resolve_references)
+
+MANIFEST = """
+[contracts.token]
+package = "artifacts/token.wasm"
+init_msg = { name = "Token" }
+
+[contracts.nft]
+package = "artifacts/token.wasm"
+
+[contracts.pair]
+code_id = 5
+init_msg = '{"token": "${token.address}", "token_code_id": "${token.code_id}"}'
+
+[contracts.router]
+code_id = 6
+init_msg = { pairs = ["${pair.address}"] }
+depends_on = ["nft"]
+"""
+
+
+class FakeDeployer():
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.stored = []
+        self.events = []
+
+    async def store_contract(self, contract_name, contract_path):
+        self.stored.append(contract_path)
+        await asyncio.sleep(0.01)
+        return "10"
+
+    async def instantiate_contract(self, code_id, init_msg, label):
+        self.events.append(("start", label))
+        await asyncio.sleep(0.01)
+        self.events.append(("end", label))
+        if label in self.fail:
+            raise Exception("out of gas")
+        return f"terra1{label}"
+
+
+def write_manifest(tmp_path, content=MANIFEST):
+    path = tmp_path / "deploy.toml"
+    path.write_text(content)
+    return str(path)
+
+
+class TestManifest():
+    def test_references(self):
+        """test that references are found anywhere in an init msg and resolved,
+        with a bare code id reference becoming an int
+        """
+        init_msg = {"a": ["${x.address}", {"b": "id ${y.code_id}"}], "c": "${y.code_id}", "d": 1}
+        assert find_references(init_msg) == {"x", "y"}
+        deployed = {"x": {"address": "terra1x", "code_id": 1}, "y": {"address": "terra1y", "code_id": 2}}
+        assert resolve_references(init_msg, deployed) == {"a": ["terra1x", {"b": "id 2"}], "c": 2, "d": 1}
+
+    def test_load_manifest(self, tmp_path):
+        """test that dependencies come from references and depends_on
+        and that the contracts are grouped into waves
+        """
+        contracts = load_manifest(write_manifest(tmp_path))
+        assert contracts["pair"]["dependencies"] == {"token"}
+        assert contracts["router"]["dependencies"] == {"pair", "nft"}
+        assert contracts["token"]["package"] == str(tmp_path / "artifacts" / "token.wasm")
+        assert deploy_order(contracts) == [["nft", "token"], ["pair"], ["router"]]
+
+    def test_bad_manifests_fail_fast(self, tmp_path):
+        """test that cycles, unknown dependencies and contracts
+        without code are refused before anything is deployed
+        """
+        cycle = '[contracts.a]\ncode_id = 1\ndepends_on = ["b"]\n[contracts.b]\ncode_id = 1\ndepends_on = ["a"]\n'
+        unknown = '[contracts.a]\ncode_id = 1\ninit_msg = \'{"x": "${missing.address}"}\'\n'
+        no_code = '[contracts.a]\ninit_msg = {}\n'
+        for content in (cycle, unknown, no_code):
+            with pytest.raises(ValueError):
+                load_manifest(write_manifest(tmp_path, content))
+
+    def test_deploy_manifest(self, tmp_path):
+        """test that independent contracts are instantiated concurrently,
+        dependents only after their prerequisites, references are resolved
+        and a shared package is stored once
+        """
+        deployer = FakeDeployer()
+        contracts = load_manifest(write_manifest(tmp_path))
+        address_map = asyncio.run(deploy_manifest(deployer, contracts))
+
+        assert address_map["pair"] == {"code_id": 5, "address": "terra1pair deployed with Capsule"}
+        assert len(deployer.stored) == 1
+        # token and nft overlap, pair waits on token and router on pair
+        assert deployer.events[:2] == [("start", "token deployed with Capsule"), ("start", "nft deployed with Capsule")]
+        assert deployer.events.index(("start", "pair deployed with Capsule")) > deployer.events.index(("end", "token deployed with Capsule"))
+        assert deployer.events[-1] == ("end", "router deployed with Capsule")
+
+    def test_failures_stop_only_dependents(self, tmp_path):
+        """test that a failed contract fails its dependents
+        and leaves independent contracts deployed
+        """
+        deployer = FakeDeployer(fail=("token deployed with Capsule",))
+        address_map = asyncio.run(deploy_manifest(deployer, load_manifest(write_manifest(tmp_path))))
+
+        assert "error" in address_map["token"]
+        assert "error" in address_map["pair"]
+        assert "error" in address_map["router"]
+        assert address_map["nft"]["address"] == "terra1nft deployed with Capsule"
@@ -0,0 +1,95 @@
+import asyncio
+
+from capsule.lib.query_cache import QueryCache, canonical_query
+
+
+class TestQueryCache():
+    def test_canonical_query_ignores_key_order(self):
+        """test that equivalent queries written differently share a key"""
+        assert canonical_query({"b": 1, "a": {"y": 2, "x": 1}}) == canonical_query('{"a": {"x": 1, "y": 2}, "b": 1}')
+
+    def test_entries_are_dropped_on_a_new_height(self):
+        """test that a result is only served at the height it was read at"""
+        cache = QueryCache()
+        cache.set_height(10)
+        cache.put("testnet", "terra1abc", {"config": {}}, {"owner": "me"})
+        assert cache.get("testnet", "terra1abc", {"config": {}}) == (True, {"owner": "me"})
+
+        cache.set_height(11)
+        assert cache.get("testnet", "terra1abc", {"config": {}}) == (False, None)
+
+    def test_results_are_copied(self):
+        """test that mutating a result, before or after caching it, doesn't change the cached copy"""
+        cache = QueryCache()
+        cache.set_height(10)
+        result = {"owners": ["me"]}
+        cache.put("testnet", "terra1abc", {"config": {}}, result)
+        result["owners"].append("you")
+        _, cached = cache.get("testnet", "terra1abc", {"config": {}})
+        cached["owners"].append("them")
+        assert cache.get("testnet", "terra1abc", {"config": {}}) == (True, {"owners": ["me"]})
+
+    def test_lru_bound(self):
+        """test that the least recently used entry is evicted past max_entries"""
+        cache = QueryCache(max_entries=2)
+        cache.set_height(1)
+        cache.put("testnet", "terra1abc", {"a": {}}, 1)
+        cache.put("testnet", "terra1abc", {"b": {}}, 2)
+        cache.get("testnet", "terra1abc", {"a": {}})
+        cache.put("testnet", "terra1abc", {"c": {}}, 3)
+        assert cache.get("testnet", "terra1abc", {"b": {}})[0] is False
+        assert cache.get("testnet", "terra1abc", {"a": {}})[0] is True
+
+    def test_height_is_fetched_once_within_max_staleness(self):
+        """test that concurrent callers share one height fetch and
+        that the height is trusted until max_staleness passes
+        """
+        fetches = []
+
+        async def fetch_height():
+            fetches.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def run(cache):
+            await asyncio.gather(*[cache.ensure_height(fetch_height) for _ in range(5)])
+            await cache.ensure_height(fetch_height)
+
+        cache = QueryCache(max_staleness=60)
+        asyncio.run(run(cache))
+        assert cache.height == 42
+        assert len(fetches) == 1
+
+        # With no staleness allowed the height is checked on every call
+        asyncio.run(run(QueryCache(max_staleness=0)))
+        assert len(fetches) == 3
+
+    def test_results_are_stored_at_the_height_they_were_read_at(self):
+        """test that a result read before the chain moved on is
+        dropped instead of being served at the new height
+        """
+        cache = QueryCache()
+        cache.set_height(10)
+        cache.set_height(11)
+        cache.put("testnet", "terra1abc", {"config": {}}, {"owner": "old"}, height=10)
+        assert cache.get("testnet", "terra1abc", {"config": {}}) == (False, None)
+
+        cache.put("testnet", "terra1abc", {"config": {}}, {"owner": "new"}, height=11)
+        assert cache.get("testnet", "terra1abc", {"config": {}}) == (True, {"owner": "new"})
+
+    def test_per_query_staleness(self):
+        """test that a bound given with a query overrides the cache's own"""
+        fetches = []
+
+        async def fetch_height():
+            fetches.append(1)
+            return 42
+
+        async def run():
+            cache = QueryCache(max_staleness=None)
+            await cache.ensure_height(fetch_height, max_staleness=60)
+            await cache.ensure_height(fetch_height, max_staleness=60)
+            await cache.ensure_height(fetch_height, max_staleness=0)
+
+        asyncio.run(run())
+        assert len(fetches) == 2
@@ -0,0 +1,65 @@
+import asyncio
+
+from capsule.lib.sequence_manager import (SequenceManager,
+                                          parse_sequence_mismatch)
+
+
+class FakeWallet():
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.fetches = 0
+
+    async def account_number_and_sequence(self):
+        self.fetches += 1
+        return {"account_number": 7, "sequence": self.sequence}
+
+
+class TestSequenceManager():
+    def test_sequences_are_handed_out_locally(self):
+        """test that the account is fetched once and
+        each reservation then gets the next sequence
+        """
+        wallet = FakeWallet(sequence=4)
+        manager = SequenceManager(wallet)
+
+        async def reserve_three():
+            async with manager.lock():
+                return [await manager.reserve() for _ in range(3)]
+
+        assert asyncio.run(reserve_three()) == [(7, 4), (7, 5), (7, 6)]
+        assert wallet.fetches == 1
+
+    def test_release_and_resync(self):
+        """test that a released sequence is reused and a resync
+        uses the sequence the node said it expected
+        """
+        manager = SequenceManager(FakeWallet(sequence=0))
+
+        async def run():
+            async with manager.lock():
+                _, sequence = await manager.reserve()
+                manager.release(sequence)
+                assert (await manager.reserve())[1] == sequence
+                await manager.resync(expected_sequence=12)
+                return await manager.reserve()
+
+        assert asyncio.run(run()) == (7, 12)
+
+    def test_peek_does_not_reserve(self):
+        """test that peeking gives the next sequence without using it up"""
+        manager = SequenceManager(FakeWallet(sequence=3))
+
+        async def run():
+            async with manager.lock():
+                peeked = await manager.peek()
+                return peeked, await manager.reserve(), await manager.peek()
+
+        assert asyncio.run(run()) == ((7, 3), (7, 3), (7, 4))
+
+    def test_parse_sequence_mismatch(self):
+        """test that the expected sequence is pulled out of
+        an sdk mismatch error and other errors are ignored
+        """
+        assert parse_sequence_mismatch("account sequence mismatch, expected 9, got 11: incorrect account sequence") == 9
+        assert parse_sequence_mismatch("out of gas in location: WriteFlat") is None
+        assert parse_sequence_mismatch(None) is None
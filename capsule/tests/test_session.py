@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from capsule.lib.session import DeploySession
+from capsule.lib.transport import AsyncTransport
+
+TEST_MNEMONIC = "notice oak worry limit wrap speak medal online prefer cluster roof addict wrist behave treat actual wasp year salad speed social layer crew genius"
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text(f"""
+[deploy_info]
+mnemonic = "{TEST_MNEMONIC}"
+[networks.localterra]
+chain_url = "http://localhost:1317"
+gas_prices = "0.15uluna"
+""")
+    return str(path)
+
+
+class TestDeploySession():
+    def test_session_inside_a_running_loop(self, config_path):
+        """test that a Deployer is built from the config within a running loop
+        and its connections are released once the session ends
+        """
+        async def scenario():
+            async with DeploySession("localterra", config_path=config_path, cached_gas_prices=True) as deployer:
+                client = await deployer.get_async_client()
+                assert client.url == "http://localhost:1317"
+                assert client.chain_id == "localterra"
+                assert deployer.mnemonic == TEST_MNEMONIC
+                return client.session
+
+        session = asyncio.run(scenario())
+        assert session.closed
+
+    def test_concurrent_sessions(self, config_path):
+        """test that sessions can be opened concurrently, sharing a transport which stays open"""
+        transport = AsyncTransport()
+
+        async def scenario():
+            sessions = await asyncio.gather(*[
+                DeploySession.open("localterra", config_path=config_path, cached_gas_prices=True,
+                                   transport=transport, close_transport=False)
+                for _ in range(3)])
+            http = await transport.get_session()
+            for session in sessions:
+                await session.close()
+            assert not http.closed
+            await transport.close()
+            return sessions
+
+        sessions = asyncio.run(scenario())
+        assert len({id(session.deployer) for session in sessions}) == 3
+
+    def test_unknown_network(self, config_path):
+        """test that a network missing from the config fails with the configured networks listed"""
+        async def scenario():
+            async with DeploySession("mainnet", config_path=config_path):
+                pass
+
+        with pytest.raises(ValueError, match="localterra"):
+            asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+from capsule.lib.transport import AsyncTransport
+
+
+class TestAsyncTransport():
+    def test_session_is_shared_within_a_loop(self):
+        """test that every caller on the same event loop
+        is handed the same pooled session so connections are reused
+        """
+        transport = AsyncTransport()
+
+        async def get_sessions():
+            sessions = await asyncio.gather(*[transport.get_session() for _ in range(5)])
+            await transport.close()
+            return sessions
+
+        sessions = asyncio.run(get_sessions())
+        assert all(session is sessions[0] for session in sessions)
+
+    def test_session_is_recreated_for_a_new_loop(self):
+        """test that a session bound to a finished loop
+        is not handed out to a new loop
+        """
+        transport = AsyncTransport()
+        first = asyncio.run(transport.get_session())
+
+        async def get_and_close():
+            session = await transport.get_session()
+            await transport.close()
+            return session
+
+        second = asyncio.run(get_and_close())
+        assert first is not second
+
+    def test_session_is_closed_with_its_loop(self):
+        """test that a session nobody closed is closed as its loop shuts
+        down, and that one outliving its loop is closed once replaced
+        """
+        transport = AsyncTransport()
+        assert asyncio.run(transport.get_session()).closed
+
+        loop = asyncio.new_event_loop()
+        stale = loop.run_until_complete(transport.get_session())
+        transport._closer.cancel()
+        loop.close()
+
+        async def replace_and_close():
+            session = await transport.get_session()
+            await transport.close()
+            return session
+
+        assert asyncio.run(replace_and_close()) is not stale
+        assert stale.closed
+
+    def test_connection_limits_are_applied(self):
+        """test that the pool is configured with the
+        requested total and per-host connection limits
+        """
+        transport = AsyncTransport(limit=20, limit_per_host=4)
+
+        async def get_connector():
+            session = await transport.get_session()
+            connector = session.connector
+            await transport.close()
+            return connector
+
+        connector = asyncio.run(get_connector())
+        assert connector.limit == 20
+        assert connector.limit_per_host == 4
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+from argparse import Namespace
+
+import pytest
+
+from capsule.cmds import verify
+from capsule.lib.logging_handler import format_table
+from capsule.lib.verification import (parse_code_ids, read_checksums,
+                                      verify_code_ids)
+
+
+class FakeDeployer():
+    def __init__(self, codes):
+        self.codes = codes
+
+    async def code_checksum(self, code_id):
+        await asyncio.sleep(0)
+        return hashlib.sha256(self.codes[code_id]).hexdigest()
+
+
+class TestVerification():
+    def test_parse_code_ids(self):
+        """test that single ids and inclusive ranges are expanded in order without duplicates"""
+        assert parse_code_ids("12,15,88-91") == [12, 15, 88, 89, 90, 91]
+        assert parse_code_ids(" 3, 1-3 ,") == [3, 1, 2]
+        for bad in ("1,x", "9-3", "1-2-3"):
+            with pytest.raises(ValueError):
+                parse_code_ids(bad)
+
+    def test_read_checksums(self, tmp_path):
+        """test that checksums are indexed by hash, keeping every artifact sharing a hash"""
+        path = tmp_path / "checksums.txt"
+        path.write_text("ABC123  token.wasm\nabc123  token_copy.wasm\n\ndef456  pair.wasm\n")
+        assert read_checksums(str(path)) == {"abc123": ["token.wasm", "token_copy.wasm"], "def456": ["pair.wasm"]}
+
+    def test_verify_code_ids(self):
+        """test that each code id is matched against the index
+        and a failed download is reported rather than raised
+        """
+        token = b"\x00asm token"
+        checksums = {hashlib.sha256(token).hexdigest(): ["token.wasm"]}
+        deployer = FakeDeployer({1: token, 2: b"\x00asm other"})
+
+        results = asyncio.run(verify_code_ids(deployer, [1, 2, 3], checksums))
+        assert [result["code_id"] for result in results] == [1, 2, 3]
+        assert results[0]["artifacts"] == ["token.wasm"]
+        assert results[1]["artifacts"] == [] and results[1]["error"] is None
+        assert results[2]["checksum"] is None and results[2]["error"]
+
+    def test_format_table(self):
+        """test that columns are padded to their widest cell"""
+        assert format_table(["ID", "RESULT"], [[1, "MATCH"], [100, "MISMATCH"]]).splitlines() == [
+            "ID   RESULT",
+            "---  --------",
+            "1    MATCH",
+            "100  MISMATCH",
+        ]
+
+    def test_failed_build_stops_verification(self, monkeypatch, tmp_path):
+        """test that a failed optimized build ends the command with an error
+        rather than comparing the code ids against stale artifacts
+        """
+        verified = []
+        monkeypatch.setattr(verify, "DeploySession", lambda *args, **kwargs: None)
+        monkeypatch.setattr(verify, "optimized_build", lambda *args, **kwargs: False)
+        monkeypatch.setattr(verify, "verify_in_session", lambda *args: verified.append(args))
+        args = Namespace(find="", codeids="", codeid=3, chain="bombay-12", nocache=True,
+                         package=str(tmp_path), nobuild=False, rebuild=False, parallel=False, jobs=0)
+        with pytest.raises(SystemExit) as exit_info:
+            verify.VerifyCmd.run_command(verify.VerifyCmd, args)
+        assert exit_info.value.code == 1
+        assert verified == []
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from terra_sdk.core import Coins
+
+from capsule.lib.wallet_pool import WalletPool
+
+
+class FakeKey():
+    def __init__(self, key_index):
+        self.acc_address = f"terra1lane{key_index}"
+
+
+class FakeWallet():
+    def __init__(self, key_index):
+        self.key = FakeKey(key_index)
+
+
+class FakeBank():
+    def __init__(self, balances):
+        self.balances = balances
+
+    async def balance(self, address):
+        return Coins(self.balances.get(address, {})), None
+
+
+class FakeClient():
+    def __init__(self, balances):
+        self.bank = FakeBank(balances)
+
+
+class FakeDeployer():
+    def __init__(self, key_index=0, balances=None, sent=None):
+        self.key_index = key_index
+        self.deployer = FakeWallet(key_index)
+        self.balances = balances if balances is not None else {}
+        self.sent = sent if sent is not None else []
+        self.batches = []
+
+    def for_key_index(self, key_index):
+        return FakeDeployer(key_index, self.balances, self.sent)
+
+    async def get_async_client(self):
+        return FakeClient(self.balances)
+
+    async def send_msgs(self, msgs):
+        self.sent.append(msgs)
+        return "funded"
+
+    async def execute_batch(self, executions, **kwargs):
+        self.batches.append(executions)
+        await asyncio.sleep(0)
+        return [{"index": index, "msg": execution["msg"], "success": True} for index, execution in enumerate(executions)]
+
+
+class TestWalletPool():
+    def test_lanes_are_derived_after_the_main_account(self):
+        """test that lanes use HD indexes 1..N and are handed out round-robin"""
+        pool = WalletPool(FakeDeployer(), lanes=3)
+        assert [lane.key_index for lane in pool.lanes] == [1, 2, 3]
+        assert [pool.next_lane().key_index for _ in range(4)] == [1, 2, 3, 1]
+
+    def test_at_least_one_lane(self):
+        """test that an empty pool is refused"""
+        with pytest.raises(ValueError):
+            WalletPool(FakeDeployer(), lanes=0)
+
+    def test_batch_is_spread_and_merged_in_order(self):
+        """test that executions are dealt across the lanes and
+        the results come back in the order the executions were given
+        """
+        pool = WalletPool(FakeDeployer(), lanes=2)
+        executions = [{"address": "terra1contract", "msg": {"n": n}} for n in range(5)]
+
+        results = asyncio.run(pool.execute_batch(executions))
+        assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+        assert [result["msg"]["n"] for result in results] == [0, 1, 2, 3, 4]
+        assert [result["lane"] for result in results] == [1, 2, 1, 2, 1]
+        assert [len(lane.batches[0]) for lane in pool.lanes] == [3, 2]
+
+    def test_fund_only_tops_up_short_lanes(self):
+        """test that funding sends one tx with a transfer of the
+        shortfall to each lane below the target balance
+        """
+        balances = {"terra1lane1": {"uluna": 100}, "terra1lane2": {"uluna": 30}}
+        main = FakeDeployer(balances=balances)
+        pool = WalletPool(main, lanes=3)
+
+        assert asyncio.run(pool.fund("100uluna")) == "funded"
+        assert len(main.sent) == 1
+        transfers = {msg.to_address: msg.amount for msg in main.sent[0]}
+        assert transfers == {"terra1lane2": Coins("70uluna"), "terra1lane3": Coins("100uluna")}
+
+        balances.update({"terra1lane2": {"uluna": 100}, "terra1lane3": {"uluna": 100}})
+        assert asyncio.run(pool.fund("100uluna")) is None
@@ -29,6 +29,7 @@ setup(
     long_description=long_description,
     long_description_content_type='text/markdown',
     install_requires=[
+        'aiohttp',
         'argparse',
         'requests',
         'terra_sdk',